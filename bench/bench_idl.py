@@ -0,0 +1,238 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+#
+# Benchmark suite for the IDL path: extracting synthetic reflection schemas
+# (read_reflection_schema), writing the JSON output and generating from the
+# extracted schema with a Jinja2 template, at several scales.
+#
+# Synthetic schemas are built with the FlatBuffers Builder (no flatc needed).
+# Results are written as JSON (tagged with the git commit), and can be compared
+# against the results of a previous run to track regressions across commits.
+#
+# Usage:
+#
+#   python bench/bench_idl.py --scales small,medium -o bench-new.json
+#   python bench/bench_idl.py --scales small,medium --compare bench-old.json
+#
+
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+from jinja2 import Environment
+
+from cbsh.idl.loader import read_reflection_schema, write_schema_json
+from cbsh.idl.synthetic import build_schema
+
+# synthetic schema parameters (see cbsh.idl.synthetic.build_schema)
+SCALES = {
+    'small': {
+        'enums': 10,
+        'tables': 100,
+        'fields': 10,
+        'services': 10,
+        'slots': 10
+    },
+    'medium': {
+        'enums': 50,
+        'tables': 1000,
+        'fields': 20,
+        'services': 50,
+        'slots': 20
+    },
+    'large': {
+        'enums': 100,
+        'tables': 5000,
+        'fields': 30,
+        'services': 100,
+        'slots': 50
+    },
+}
+
+# a minimal documentation template walking all definitions
+TEMPLATE = """
+{%- for name, t in schema.types.items() %}
+{{ name }}
+{{ '=' * name|length }}
+{{ t.docs|join('\\n')|rst }}
+
+{%- if t.type in ('table', 'struct') %}{% for f in t.fields.values() %}
+* ``{{ f.name }}``: {{ f.base_type }}{% if f.ref_type %} ({{ f.ref_type }}){% endif %}
+{%- endfor %}{% elif t.type == 'enum' %}{% for v in t['values'].values() %}
+* ``{{ v.name }}``
+{%- endfor %}{% elif t.type == 'interface' %}{% for s in t.slots.values() %}
+* {{ s.type }} ``{{ s.name }}``: {{ s.in }} -> {{ s.out }}
+{%- endfor %}{% endif %}
+{% endfor %}
+"""
+
+
+def _git_commit():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+        dirty = bool(
+            subprocess.check_output(
+                ['git', 'status', '--porcelain', '--untracked-files=no'],
+                stderr=subprocess.DEVNULL).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def _best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        duration = time.perf_counter() - started
+        best = duration if best is None else min(best, duration)
+    return best, result
+
+
+def bench_scale(scale, params, repeat, rst):
+    buf = build_schema(**params)
+
+    read_time, schema = _best(lambda: read_reflection_schema(buf), repeat)
+
+    def write_json():
+        f = io.StringIO()
+        write_schema_json(f, schema['meta'], schema['types'].values())
+        return len(f.getvalue().encode('utf8'))
+
+    json_time, json_size = _best(write_json, repeat)
+
+    env = Environment()
+    if rst:
+        from cbsh.idl import generator
+        from cbsh.idl.rst import RstRenderer
+
+        env.filters['rst'] = generator.rst_filter
+
+        def generate():
+            # start from an empty reST cache on every run
+            generator._rst_renderer = RstRenderer()
+            generator.prerender_docs(schema)
+            return tmpl.render(schema=schema)
+    else:
+        env.filters['rst'] = lambda text: text
+
+        def generate():
+            return tmpl.render(schema=schema)
+
+    tmpl = env.from_string(TEMPLATE)
+
+    generate_time, contents = _best(generate, repeat)
+
+    return {
+        'scale': scale,
+        'params': params,
+        'bfbs_size': len(buf),
+        'defs': len(schema['types']),
+        'read_ms': round(1000. * read_time, 2),
+        'json_ms': round(1000. * json_time, 2),
+        'json_size': json_size,
+        'generate_ms': round(1000. * generate_time, 2),
+        'generate_size': len(contents),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--scales',
+        default='small,medium',
+        help='Comma separated list of scales ({}).'.format(', '.join(
+            sorted(SCALES.keys()))))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--rst',
+        action='store_true',
+        help='Render docs with the reStructuredText filter when generating.')
+    parser.add_argument('-o', '--outfile', help='Write results to this file.')
+    parser.add_argument(
+        '--compare', help='Compare against results of a previous run.')
+    options = parser.parse_args()
+
+    commit, dirty = _git_commit()
+
+    results = []
+    for scale in options.scales.split(','):
+        result = bench_scale(scale, SCALES[scale], options.repeat, options.rst)
+        results.append(result)
+        print('{:<8}: {:>10} bytes, {:>6} defs, read {:>9.1f} ms, '
+              'json {:>9.1f} ms, generate {:>9.1f} ms'.format(
+                  scale, result['bfbs_size'], result['defs'],
+                  result['read_ms'], result['json_ms'],
+                  result['generate_ms']))
+
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': '{} {}'.format(platform.python_implementation(),
+                                 platform.python_version()),
+        'platform': platform.platform(),
+        'repeat': options.repeat,
+        'rst': options.rst,
+        'results': results,
+    }
+
+    if options.outfile:
+        with open(options.outfile, 'w') as f:
+            json.dump(report, f, indent=4, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        print('Compared to {} (commit {}):'.format(options.compare,
+                                                   baseline['commit']))
+        old_results = {r['scale']: r for r in baseline['results']}
+        for result in results:
+            old = old_results.get(result['scale'], None)
+            if old is None or old['params'] != result['params']:
+                continue
+            print('{:<8}: '.format(result['scale']) + ', '.join(
+                '{} {:>5.2f}x'.format(key[:-3], old[key] / result[key])
+                for key in ['read_ms', 'json_ms', 'generate_ms']
+                if result[key]))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
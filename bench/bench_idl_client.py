@@ -0,0 +1,151 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+#
+# Benchmark: call throughput of the async WAMP client proxies generated from
+# the "client.meta" templates (cbsh.idl.templates) for the AccelStorage
+# interface of tests/idl/example.fbs, vs calls with the slot URI built and
+# the dict arguments marshalled (JSON, the default WAMP serializer) on every
+# call. Calls run against the in-process router stand-in
+# (cbsh.idl.loopback), so only client and endpoint side costs are measured.
+#
+# Needs flatc (from the FLATC environment variable, or on the PATH).
+#
+# Usage:
+#
+#   python bench/bench_idl_client.py --calls 20000
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import importlib
+import subprocess
+
+from cbsh.idl.loader import read_reflection_schema_file
+from cbsh.idl.generator import BUILTIN_TEMPLATE_PATH, process
+from cbsh.idl.loopback import LoopbackRouter
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'idl', 'example.fbs')
+
+PREFIX = 'com.example.accelstorage.'
+
+SERIES = {
+    'sample_start': 1500000000,
+    'sample_period': 10,
+    'samples': [{'x': .5 * i, 'y': -.25 * i, 'z': 9.75} for i in range(16)],
+}
+
+
+def generate(workdir):
+    flatc = os.environ.get('FLATC', None) or shutil.which('flatc')
+    if not flatc:
+        raise Exception('flatc not found')
+    subprocess.check_call([flatc, '-o', workdir, '--binary', '--schema', '--bfbs-builtins', SCHEMA],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    schema = read_reflection_schema_file(os.path.join(workdir, 'example.bfbs'))
+    package = os.path.join(workdir, 'bench_client')
+    os.makedirs(package)
+    open(os.path.join(package, '__init__.py'), 'w').close()
+    process(schema, [BUILTIN_TEMPLATE_PATH], outdir=package,
+            meta_template='client.meta', max_workers=1, bytecode_cache=False)
+
+    sys.path.insert(0, workdir)
+    return importlib.import_module('bench_client.client')
+
+
+def _time_range(series):
+    start = series['sample_start']
+    return {'start': start, 'endof': start + series['sample_period'] * len(series['samples'])}
+
+
+async def bench_generated(client, calls):
+    codec = client.codec
+    router = LoopbackRouter()
+
+    def store(payload):
+        series = codec.decode_accelstorage_AccelSeries(payload)
+        return codec.encode_accelstorage_TimeRange(_time_range(series))
+
+    await router.session().register(store, PREFIX + 'store')
+    proxy = client.accelstorage_AccelStorageClient(router.session(), PREFIX)
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        result = await proxy.store(SERIES)
+    return time.perf_counter() - started, result
+
+
+async def bench_dynamic(calls):
+    router = LoopbackRouter()
+
+    def store(payload):
+        series = json.loads(payload)
+        return json.dumps(_time_range(series))
+
+    await router.session().register(store, PREFIX + 'store')
+    session = router.session()
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        result = json.loads(await session.call('{}{}'.format(PREFIX, 'store'), json.dumps(SERIES)))
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cbsh-bench-')
+    try:
+        client = generate(workdir)
+        for name, bench in [('dynamic (JSON)', lambda: bench_dynamic(options.calls)),
+                            ('generated', lambda: bench_generated(client, options.calls))]:
+            best = None
+            for _ in range(options.repeat):
+                duration, result = asyncio.run(bench())
+                best = duration if best is None else min(best, duration)
+            assert result['endof'] == SERIES['sample_start'] + 160
+            print('{:<16}: {:>9.0f} calls/s ({:>6.2f} us/call)'.format(
+                name, options.calls / best, 1e6 * best / options.calls))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+#
+# Benchmark: per-message encode/decode cost of tables from tests/idl/example.fbs
+# with the plain flatbuffers package (Builder and the classes generated by
+# flatc), vs the serializers and deserializers generated from the
+# "codec.meta" templates (cbsh.idl.templates).
+#
+# Decoding reads all fields into a dict. The generated decoders are measured
+# on their own output (precomputed vtable, fast path) and on the output of the
+# Builder (generic vtable lookups).
+#
+# Needs flatc (from the FLATC environment variable, or on the PATH).
+#
+# Usage:
+#
+#   python bench/bench_idl_codec.py --count 20000
+#
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import subprocess
+
+import flatbuffers
+
+from cbsh.idl.loader import read_reflection_schema_file
+from cbsh.idl.generator import BUILTIN_TEMPLATE_PATH, process
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'idl', 'example.fbs')
+
+TIME_RANGE = {'foo': 1, 'start': 1500000000, 'endof': 1500003600, 'bar': 2}
+
+SERIES = {
+    'sample_start': 1500000000,
+    'sample_period': 10,
+    'samples': [{'x': .1 * i, 'y': -.2 * i, 'z': 9.81} for i in range(16)],
+}
+
+BATCH = {'series': [SERIES] * 4, 'test': 23}
+
+
+def generate(workdir):
+    flatc = os.environ.get('FLATC', None) or shutil.which('flatc')
+    if not flatc:
+        raise Exception('flatc not found')
+    for args in [['--python'], ['--binary', '--schema', '--bfbs-builtins']]:
+        subprocess.check_call([flatc, '-o', workdir] + args + [SCHEMA],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    schema = read_reflection_schema_file(os.path.join(workdir, 'example.bfbs'))
+    process(schema, [BUILTIN_TEMPLATE_PATH], outdir=workdir,
+            meta_template='codec.meta', max_workers=1, bytecode_cache=False)
+
+    sys.path.insert(0, workdir)
+    modules = {}
+    for name in ['TimeRange', 'AccelSeries', 'AccelSample', 'AccelBatch']:
+        modules[name] = importlib.import_module('accelstorage.' + name)
+    return modules, importlib.import_module('codec')
+
+
+def builder_codecs(fb):
+    TimeRange, AccelSeries, AccelSample, AccelBatch = (
+        fb['TimeRange'], fb['AccelSeries'], fb['AccelSample'], fb['AccelBatch'])
+
+    def encode_time_range(obj):
+        builder = flatbuffers.Builder(64)
+        TimeRange.Start(builder)
+        TimeRange.AddFoo(builder, obj['foo'])
+        TimeRange.AddStart(builder, obj['start'])
+        TimeRange.AddEndof(builder, obj['endof'])
+        TimeRange.AddBar(builder, obj['bar'])
+        builder.Finish(TimeRange.End(builder))
+        return builder.Output()
+
+    def _series(builder, obj):
+        samples = obj['samples']
+        AccelSeries.StartSamplesVector(builder, len(samples))
+        for sample in reversed(samples):
+            AccelSample.CreateAccelSample(builder, sample['x'], sample['y'], sample['z'])
+        vec = builder.EndVector()
+        AccelSeries.Start(builder)
+        AccelSeries.AddSampleStart(builder, obj['sample_start'])
+        AccelSeries.AddSamplePeriod(builder, obj['sample_period'])
+        AccelSeries.AddSamples(builder, vec)
+        return AccelSeries.End(builder)
+
+    def encode_series(obj):
+        builder = flatbuffers.Builder(256)
+        builder.Finish(_series(builder, obj))
+        return builder.Output()
+
+    def encode_batch(obj):
+        builder = flatbuffers.Builder(1024)
+        series = [_series(builder, item) for item in obj['series']]
+        AccelBatch.StartSeriesVector(builder, len(series))
+        for offset in reversed(series):
+            builder.PrependUOffsetTRelative(offset)
+        vec = builder.EndVector()
+        AccelBatch.Start(builder)
+        AccelBatch.AddSeries(builder, vec)
+        AccelBatch.AddTest(builder, obj['test'])
+        builder.Finish(AccelBatch.End(builder))
+        return builder.Output()
+
+    def decode_time_range(buf):
+        t = TimeRange.TimeRange.GetRootAs(buf, 0)
+        return {'foo': t.Foo(), 'start': t.Start(), 'endof': t.Endof(), 'bar': t.Bar()}
+
+    def _decode_series(s):
+        samples = []
+        for i in range(s.SamplesLength()):
+            sample = s.Samples(i)
+            samples.append({'x': sample.X(), 'y': sample.Y(), 'z': sample.Z()})
+        return {'sample_start': s.SampleStart(), 'sample_period': s.SamplePeriod(),
+                'samples': samples}
+
+    def decode_series(buf):
+        return _decode_series(AccelSeries.AccelSeries.GetRootAs(buf, 0))
+
+    def decode_batch(buf):
+        b = AccelBatch.AccelBatch.GetRootAs(buf, 0)
+        return {'series': [_decode_series(b.Series(i)) for i in range(b.SeriesLength())],
+                'test': b.Test()}
+
+    return {
+        'TimeRange': (encode_time_range, decode_time_range),
+        'AccelSeries': (encode_series, decode_series),
+        'AccelBatch': (encode_batch, decode_batch),
+    }
+
+
+def _best(func, arg, count, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(count):
+            func(arg)
+        duration = (time.perf_counter() - started) / count
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cbsh-bench-')
+    try:
+        fb, codec = generate(workdir)
+        plain = builder_codecs(fb)
+
+        for name, obj in [('TimeRange', TIME_RANGE), ('AccelSeries', SERIES), ('AccelBatch', BATCH)]:
+            count = max(1, options.count // (1 + len(str(obj)) // 100))
+            fb_encode, fb_decode = plain[name]
+            buf = bytearray(codec.INITIAL_SIZE)
+            encode = getattr(codec, 'encode_accelstorage_' + name)
+            decode = getattr(codec, 'decode_accelstorage_' + name)
+
+            fb_data = bytes(fb_encode(obj))
+            data = encode(obj, buf)
+            assert fb_decode(data) == fb_decode(fb_data)
+            assert decode(fb_data) == decode(data)
+
+            results = [
+                _best(fb_encode, obj, count, options.repeat),
+                _best(lambda o: encode(o, buf), obj, count, options.repeat),
+                _best(fb_decode, fb_data, count, options.repeat),
+                _best(decode, data, count, options.repeat),
+                _best(decode, fb_data, count, options.repeat),
+            ]
+            print('{:<12}: {:>4} bytes (Builder {:>4} bytes)'.format(name, len(data), len(fb_data)))
+            print('    encode: Builder {:>8.2f} us, generated {:>8.2f} us ({:>5.1f}x)'.format(
+                1e6 * results[0], 1e6 * results[1], results[0] / results[1]))
+            print('    decode: flatc   {:>8.2f} us, generated {:>8.2f} us ({:>5.1f}x), '
+                  'generated on Builder output {:>8.2f} us ({:>5.1f}x)'.format(
+                      1e6 * results[2], 1e6 * results[3], results[2] / results[3],
+                      1e6 * results[4], results[2] / results[4]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
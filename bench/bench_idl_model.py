@@ -0,0 +1,97 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+#
+# Benchmark: memory held by an extracted schema as nested dicts
+# (read_reflection_schema) vs the compact __slots__ schema model
+# (cbsh.idl.model.read_schema_model), for synthetic schemas with tens of
+# thousands of fields.
+#
+# Memory is measured with tracemalloc as the size of all allocations still
+# alive after extraction (ie the size of the result, not the transient peak).
+#
+# Usage:
+#
+#   python bench/bench_idl_model.py --tables 2000 --fields 25
+#
+
+import gc
+import time
+import argparse
+import tracemalloc
+
+from cbsh.idl.loader import read_reflection_schema
+from cbsh.idl.model import read_schema_model
+from cbsh.idl.synthetic import build_schema
+
+
+def measure(func, buf):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(buf)
+    duration = time.perf_counter() - started
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size, duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--fields', type=int, default=25)
+    parser.add_argument('--services', type=int, default=50)
+    parser.add_argument('--slots', type=int, default=20)
+    options = parser.parse_args()
+
+    buf = build_schema(
+        enums=50,
+        tables=options.tables,
+        fields=options.fields,
+        services=options.services,
+        slots=options.slots)
+    print('Schema: {} bytes, {} fields, {} slots'.format(
+        len(buf), options.tables * options.fields,
+        options.services * options.slots))
+
+    baseline = None
+    for name, func in [('dict', read_reflection_schema),
+                       ('model', read_schema_model)]:
+        size, duration = measure(func, buf)
+        baseline = baseline or size
+        print('{:<6}: {:>8.1f} MiB ({:>5.1f}%), {:>8.1f} ms'.format(
+            name, size / 2**20, 100. * size / baseline, 1000. * duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+#
+# Benchmark: processing a vector of structs (AccelSeries.samples from
+# tests/idl/example.fbs) element by element through the classes generated by
+# flatc, vs through the zero-copy NumPy view generated from the "numpy.meta"
+# templates (cbsh.idl.templates).
+#
+# Needs flatc (from the FLATC environment variable, or on the PATH) and NumPy.
+#
+# Usage:
+#
+#   python bench/bench_idl_npview.py --samples 100,10000,1000000
+#
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import subprocess
+
+import flatbuffers
+import numpy as np
+
+from cbsh.idl.loader import read_reflection_schema_file
+from cbsh.idl.generator import BUILTIN_TEMPLATE_PATH, process
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'idl', 'example.fbs')
+
+
+def _best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        duration = time.perf_counter() - started
+        best = duration if best is None else min(best, duration)
+    return best, result
+
+
+def generate(workdir):
+    flatc = os.environ.get('FLATC', None) or shutil.which('flatc')
+    if not flatc:
+        raise Exception('flatc not found')
+    for args in [['--python'], ['--binary', '--schema', '--bfbs-builtins']]:
+        subprocess.check_call([flatc, '-o', workdir] + args + [SCHEMA],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    schema = read_reflection_schema_file(os.path.join(workdir, 'example.bfbs'))
+    process(schema, [BUILTIN_TEMPLATE_PATH], outdir=workdir,
+            meta_template='numpy.meta', max_workers=1, bytecode_cache=False)
+
+    sys.path.insert(0, workdir)
+    return (importlib.import_module('accelstorage.AccelSeries'),
+            importlib.import_module('accelstorage.AccelSample'),
+            importlib.import_module('npview'))
+
+
+def build_series(AccelSeries, AccelSample, count):
+    builder = flatbuffers.Builder(0)
+    AccelSeries.StartSamplesVector(builder, count)
+    for i in reversed(range(count)):
+        AccelSample.CreateAccelSample(builder, .1 * i, -.2 * i, 9.81)
+    samples = builder.EndVector()
+    AccelSeries.Start(builder)
+    AccelSeries.AddSampleStart(builder, 1500000000)
+    AccelSeries.AddSamplePeriod(builder, 10)
+    AccelSeries.AddSamples(builder, samples)
+    builder.Finish(AccelSeries.End(builder))
+    return bytes(builder.Output())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', default='100,10000,1000000',
+                        help='Comma separated list of vector lengths.')
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cbsh-bench-')
+    try:
+        AccelSeries, AccelSample, npview = generate(workdir)
+
+        for count in [int(x) for x in options.samples.split(',')]:
+            buf = build_series(AccelSeries, AccelSample, count)
+
+            def per_element():
+                # mean magnitude of the acceleration vectors
+                series = AccelSeries.AccelSeries.GetRootAs(buf, 0)
+                total = 0.
+                for i in range(series.SamplesLength()):
+                    sample = series.Samples(i)
+                    x, y, z = sample.X(), sample.Y(), sample.Z()
+                    total += (x * x + y * y + z * z)**.5
+                return total / count
+
+            def vectorized():
+                view = npview.accelstorage_AccelSeries_samples(buf)
+                x, y, z = view['x'], view['y'], view['z']
+                return float(np.sqrt(x * x + y * y + z * z).mean())
+
+            def view_only():
+                return npview.accelstorage_AccelSeries_samples(buf)
+
+            element_time, expected = _best(per_element, options.repeat)
+            numpy_time, result = _best(vectorized, options.repeat)
+            view_time, _ = _best(view_only, options.repeat)
+            assert abs(result - expected) <= 1e-4 * abs(expected)
+
+            print('{:>8} samples: per element {:>10.2f} ms, numpy {:>8.3f} ms '
+                  '({:>7.1f}x), view only {:>6.1f} us'.format(
+                      count, 1000. * element_time, 1000. * numpy_time,
+                      element_time / numpy_time, 1e6 * view_time))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
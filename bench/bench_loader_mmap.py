@@ -0,0 +1,161 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+#
+# Benchmark: peak RSS and load time of read_reflection_schema() when reading
+# the .bfbs file into memory vs memory-mapping it (zero-copy).
+#
+# Synthetic schemas of the requested sizes are generated first (no flatc needed).
+# Every measurement runs in a fresh Python process, since the peak RSS of a
+# process can only go up.
+#
+# Usage:
+#
+#   python bench/bench_loader_mmap.py --sizes 10,30,100
+#
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# bytes per synthetic table with 50 fields and one doc line per definition
+_BYTES_PER_TABLE = 6650
+
+
+def _maxrss():
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss = rss // 1024
+    return rss
+
+
+def _rss_split():
+    # current anonymous vs file-backed resident memory (Linux only): pages of
+    # a memory-mapped file count as RssFile and can be dropped by the kernel
+    # at any time, while a copy read into memory counts as RssAnon
+    res = {'RssAnon': None, 'RssFile': None}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key = line.split(':')[0]
+                if key in res:
+                    res[key] = int(line.split()[1])
+    except IOError:
+        pass
+    return res
+
+
+def run_one(mode, filename):
+    import txaio
+    txaio.use_asyncio()
+
+    from cbsh.idl.loader import schema_buffer, read_reflection_schema
+
+    log = txaio.make_logger()
+    rss_before = _maxrss()
+    anon_before = _rss_split()['RssAnon']
+    started = time.perf_counter()
+    with schema_buffer(filename, use_mmap=(mode == 'mmap')) as buf:
+        schema = read_reflection_schema(buf, log=log)
+        rss_split = _rss_split()
+    duration = time.perf_counter() - started
+    print(
+        json.dumps({
+            'mode': mode,
+            'duration': duration,
+            'maxrss_before_kb': rss_before,
+            'maxrss_kb': _maxrss(),
+            'anon_before_kb': anon_before,
+            'anon_kb': rss_split['RssAnon'],
+            'file_kb': rss_split['RssFile'],
+            'types': len(schema['types']),
+        }))
+
+
+def make_schema(workdir, size_mb):
+    from cbsh.idl.synthetic import build_schema
+
+    filename = os.path.join(workdir, 'synth-{}mb.bfbs'.format(size_mb))
+    if not os.path.exists(filename):
+        tables = max(1, int(size_mb * 1000000 / _BYTES_PER_TABLE))
+        buf = build_schema(
+            enums=100, tables=tables, fields=50, services=100, slots=10)
+        with open(filename, 'wb') as f:
+            f.write(buf)
+    return filename
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--sizes',
+        default='10,30,100',
+        help='Comma separated list of schema sizes (MB) to benchmark.')
+    parser.add_argument(
+        '--workdir',
+        default=os.path.join(tempfile.gettempdir(), 'cbsh-bench'),
+        help='Directory for the generated schema files.')
+    parser.add_argument(
+        '--run-one', nargs=2, metavar=('MODE', 'FILE'), help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.run_one:
+        run_one(*options.run_one)
+        return
+
+    if not os.path.isdir(options.workdir):
+        os.makedirs(options.workdir)
+
+    print('{:>10} {:>6} {:>10} {:>14} {:>14}'.format(
+        'size [MB]', 'mode', 'time [s]', 'peak RSS [MB]', 'anon RSS [MB]'))
+    for size_mb in [int(x) for x in options.sizes.split(',')]:
+        filename = make_schema(options.workdir, size_mb)
+        for mode in ['read', 'mmap']:
+            out = subprocess.check_output(
+                [sys.executable, __file__, '--run-one', mode, filename])
+            res = json.loads(out.decode('utf8').strip().splitlines()[-1])
+            if res['anon_kb'] is not None:
+                anon = '{:.1f}'.format(
+                    (res['anon_kb'] - res['anon_before_kb']) / 1024.)
+            else:
+                anon = 'n.a.'
+            print('{:>10} {:>6} {:>10.2f} {:>14.1f} {:>14}'.format(
+                size_mb, mode, res['duration'],
+                (res['maxrss_kb'] - res['maxrss_before_kb']) / 1024., anon))
+
+
+if __name__ == '__main__':
+    main()
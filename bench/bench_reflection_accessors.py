@@ -0,0 +1,120 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+#
+# Micro-benchmark: walking a reflection schema with the generated FlatBuffers
+# classes (cbsh.reflection) vs the fast accessors (cbsh.idl.accessor), with
+# indexed access and with flyweight iterators.
+#
+# Usage:
+#
+#   python bench/bench_reflection_accessors.py --tables 1000 --fields 50
+#
+
+import time
+import argparse
+
+from cbsh import reflection
+from cbsh.idl import accessor
+from cbsh.idl.synthetic import build_schema
+
+
+def walk_indexed(schema):
+    # the access pattern of the (original) schema loader
+    cnt = 0
+    for i in range(schema.ObjectsLength()):
+        obj = schema.Objects(i)
+        obj.Name()
+        for j in range(obj.FieldsLength()):
+            field = obj.Fields(j)
+            field.Name()
+            _type = field.Type()
+            _type.BaseType()
+            _type.Element()
+            _type.Index()
+            field.Id()
+            field.Offset()
+            for k in range(field.DocumentationLength()):
+                field.Documentation(k)
+            for k in range(field.AttributesLength()):
+                field.Attributes(k).Key()
+            cnt += 1
+    return cnt
+
+
+def walk_flyweight(schema):
+    cnt = 0
+    for obj in schema.IterObjects():
+        obj.Name()
+        for field in obj.IterFields():
+            field.Name()
+            field.TypeInfo()
+            field.Id()
+            field.Offset()
+            for _ in field.IterDocumentation():
+                pass
+            for attr in field.IterAttributes():
+                attr.Key()
+            cnt += 1
+    return cnt
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tables', type=int, default=1000)
+    parser.add_argument('--fields', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args()
+
+    buf = build_schema(
+        enums=10, tables=options.tables, fields=options.fields, services=0)
+    print('Schema: {} bytes, {} tables with {} fields each'.format(
+        len(buf), options.tables, options.fields))
+
+    cases = [
+        ('generated (indexed)', reflection.Schema, walk_indexed),
+        ('accessor (indexed)', accessor.Schema, walk_indexed),
+        ('accessor (flyweight)', accessor.Schema, walk_flyweight),
+    ]
+    baseline = None
+    for name, klass, walk in cases:
+        best = None
+        for _ in range(options.repeat):
+            started = time.perf_counter()
+            cnt = walk(klass.GetRootAsSchema(buf, 0))
+            duration = time.perf_counter() - started
+            best = duration if best is None else min(best, duration)
+        baseline = baseline or best
+        print('{:<22}: {:>8.1f} ms, {:>8.0f} fields/s, {:>5.2f}x'.format(
+            name, 1000. * best, cnt / best, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -52,6 +52,9 @@ from autobahn.asyncio.wamp import ApplicationRunner
 from cbsh.util import (style_crossbar, style_finished_line, style_error,
                        style_ok, localnow)
 from cbsh import client, repl, config, key, __version__
+from cbsh.command import CmdBatchResult, CmdFanOutResult
+from cbsh.cache import CallCache, CachingSession
+from cbsh.mirror import FabricMirror, TopologySnapshot
 
 _DEFAULT_CFC_URL = u'wss://fabric.crossbario.com/ws'
 
@@ -144,6 +147,13 @@ class Application(object):
         self.current_resource_type = None  # type: str
         self.current_resource = None
         self.session = None
+
+        # results of read-only commands
+        self.cache = CallCache()
+
+        # topology of the management realm (kept current in the shell)
+        self.mirror = FabricMirror()
+
         self._history = FileHistory('.cbsh-history')
         self._output_format = Application.OUTPUT_FORMAT_JSON_COLORED
         self._output_verbosity = Application.OUTPUT_VERBOSITY_NORMAL
@@ -260,13 +270,91 @@ class Application(object):
         return u'Application(current_resource_type={}, current_resource={})'.format(
             self.current_resource_type, self.current_resource)
 
-    async def run_command(self, cmd):
+    def print_row(self, row):
+        """
+        Output a row of a fan-out listing as soon as it arrives (see
+        :class:`cbsh.command.CmdListAll`): one line of JSON, one item of a
+        YAML list, or the plain row.
+
+        :param row: The row.
+        :type row: dict
+        """
+        if self._output_verbosity == Application.OUTPUT_VERBOSITY_SILENT:
+            return
+
+        if self._output_format in [
+                Application.OUTPUT_FORMAT_JSON,
+                Application.OUTPUT_FORMAT_JSON_COLORED
+        ]:
+            row_str = json.dumps(
+                row, separators=(', ', ': '), sort_keys=True,
+                ensure_ascii=False)
+            if self._output_format == Application.OUTPUT_FORMAT_JSON_COLORED:
+                row_str = highlight(
+                    row_str,
+                    lexers.JsonLexer(),
+                    formatters.Terminal256Formatter(style=self._output_style))
+
+        elif self._output_format in [
+                Application.OUTPUT_FORMAT_YAML,
+                Application.OUTPUT_FORMAT_YAML_COLORED
+        ]:
+            row_str = yaml.safe_dump([row])
+            if self._output_format == Application.OUTPUT_FORMAT_YAML_COLORED:
+                row_str = highlight(
+                    row_str,
+                    lexers.YamlLexer(),
+                    formatters.Terminal256Formatter(style=self._output_style))
+
+        else:
+            row_str = u'{}'.format(row)
+
+        click.echo(row_str.rstrip(u'\n'))
+
+    async def run_command(self, cmd, fresh=False):
+        """
+        Run a command and output its result.
+
+        :param cmd: The command to run.
+        :type cmd: :class:`cbsh.command.Cmd`
+        :param fresh: Do not answer the calls of the command from the cache.
+        :type fresh: bool
+        """
+        session = self.session
+        if session and cmd.CACHE_TTL:
+            session = CachingSession(
+                session, self.cache, cmd.CACHE_TTL, fresh=fresh)
+
+        # list and show commands are answered from the (synced) fabric mirror
+        result = None if fresh else self.mirror.run(cmd)
+
+        # the rows of fan-out listings run remotely are output as they arrive
+        streamed = False
+
         try:
-            result = await cmd.run(self.session)
+            if result is None:
+                if not (self.session and self.session.is_attached()):
+                    raise Exception(
+                        'not connected (yet): only list and show commands '
+                        'answered from a recent topology snapshot can be run')
+                streamed = getattr(cmd, 'on_row', None) is not None
+                result = await cmd.run(session)
         except Exception as e:
             print(e)
 
-        if self._output_format in [
+        # drop cached results made stale, and refresh the parts of the fabric
+        # mirror changed (also when the command failed, as it might have been
+        # applied partially)
+        for procedure, args in cmd.invalidates():
+            self.cache.invalidate(procedure, args)
+            self.mirror.invalidate(procedure, args)
+
+        if streamed:
+
+            # the rows were output already
+            console_str = None
+
+        elif self._output_format in [
                 Application.OUTPUT_FORMAT_JSON,
                 Application.OUTPUT_FORMAT_JSON_COLORED
         ]:
@@ -316,7 +404,13 @@ class Application(object):
             pass
         else:
             # output result of command
-            click.echo(console_str)
+            if console_str is not None:
+                click.echo(console_str)
+
+            # batches and fan-outs run to completion, even when some calls fail
+            if isinstance(result, (CmdBatchResult, CmdFanOutResult)):
+                for line in result.format_errors():
+                    click.echo(style_error(line))
 
             if self._output_verbosity == Application.OUTPUT_VERBOSITY_RESULT_ONLY or self._output_format == Application.OUTPUT_FORMAT_PLAIN:
                 pass
@@ -342,8 +436,10 @@ class Application(object):
                 raise Exception('internal error')
 
     def _get_bottom_toolbar_tokens(self, cli):
-        toolbar_str = ' Current resource path: {}'.format(
-            self.format_selected())
+        toolbar_str = ' Current resource path: {} | cache: {} hits, {} misses'.format(
+            self.format_selected().strip(), self.cache.hits, self.cache.misses)
+        if self.mirror.restored:
+            toolbar_str += ' | last known topology (not yet reconciled)'
         return [
             (Token.Toolbar, toolbar_str),
         ]
@@ -411,6 +507,13 @@ class Application(object):
             u'done': ready
         }
 
+        # the shell keeps a mirror of the fabric topology, restored from the
+        # last known topology right away, and reconciled once joined
+        if ctx.command.name == u'shell':
+            self.mirror = FabricMirror(snapshot=TopologySnapshot(
+                cfg.profile or u'default', realm))
+            extra[u'mirror'] = self.mirror
+
         # for the "auth" command, forward additional command line options
         if ctx.command.name == u'auth':
             # user provides authentication code to verify
@@ -421,6 +524,7 @@ class Application(object):
 
         # this is the WAMP ApplicationSession that connects the CLI to Crossbar.io Fabric
         self.session = client.ShellClient(ComponentConfig(realm, extra))
+        self.cache.clear()
 
         loop = asyncio.get_event_loop()
         runner = ApplicationRunner(url, realm)
@@ -435,16 +539,47 @@ class Application(object):
             loop.close()
             sys.exit(1)
 
+        # with a restored topology, the (interactive) shell is usable right
+        # away: arguments are completed (and, if the snapshot is younger than
+        # the mirror's maximum age, list and show commands answered) from the
+        # mirror, while the session joins and the mirror is reconciled in the
+        # background
+        shell_task = None
+        if cmd == u'shell' and self.mirror.restored and sys.stdin.isatty():
+            click.clear()
+            click.echo(self.WELCOME)
+            click.echo('    Connecting to {} (using the last known topology until joined) ..\n'.format(url))
+            shell_task = self._create_shell_task(ctx, loop)
+
         exit_code = 0
         try:
             # "connected" will complete when the WAMP session to Fabric
             # has been established and is ready
             click.echo('Entering event loop ..')
-            transport, protocol = loop.run_until_complete(_res)
-            # click.echo('transport, protocol: {} {}'.format(transport, protocol))
-            # loop.run_forever()
-            session_details = loop.run_until_complete(ready)
-            # click.echo('SessionDetails: {}'.format(session_details))
+            if shell_task:
+                joined = asyncio.gather(_res, ready)
+                loop.run_until_complete(
+                    asyncio.wait([joined, shell_task],
+                                 return_when=asyncio.FIRST_COMPLETED))
+                if shell_task.done():
+                    # the shell was left before joining
+                    joined.cancel()
+                    loop.run_until_complete(
+                        asyncio.gather(joined, return_exceptions=True))
+                    return
+                try:
+                    _, session_details = joined.result()
+                except Exception:
+                    shell_task.cancel()
+                    loop.run_until_complete(
+                        asyncio.gather(shell_task, return_exceptions=True))
+                    raise
+            else:
+                transport, protocol = loop.run_until_complete(_res)
+                # click.echo('transport, protocol: {} {}'.format(transport, protocol))
+                # loop.run_forever()
+                session_details = loop.run_until_complete(ready)
+                # click.echo('SessionDetails: {}'.format(session_details))
 
         except ApplicationError as e:
 
@@ -549,24 +684,14 @@ class Application(object):
 
             elif cmd == 'shell':
 
-                click.clear()
-                try:
-                    self._print_welcome(url, session_details)
-                except Exception as e:
-                    click.echo('err: {}'.format(e))
-
-                prompt_kwargs = {
-                    'history': self._history,
-                }
-
-                shell_task = loop.create_task(
-                    repl.repl(
-                        ctx,
-                        get_bottom_toolbar_tokens=self.
-                        _get_bottom_toolbar_tokens,
-                        # get_prompt_tokens=self._get_prompt_tokens,
-                        style=self._style,
-                        prompt_kwargs=prompt_kwargs))
+                if not shell_task:
+                    click.clear()
+                    try:
+                        self._print_welcome(url, session_details)
+                    except Exception as e:
+                        click.echo('err: {}'.format(e))
+
+                    shell_task = self._create_shell_task(ctx, loop)
 
                 loop.run_until_complete(shell_task)
 
@@ -578,6 +703,20 @@ class Application(object):
             loop.close()
             sys.exit(exit_code)
 
+    def _create_shell_task(self, ctx, loop):
+        prompt_kwargs = {
+            'history': self._history,
+        }
+
+        return loop.create_task(
+            repl.repl(
+                ctx,
+                get_bottom_toolbar_tokens=self._get_bottom_toolbar_tokens,
+                # get_prompt_tokens=self._get_prompt_tokens,
+                style=self._style,
+                prompt_kwargs=prompt_kwargs,
+                complete_argument=self.mirror.complete))
+
     def _print_welcome(self, url, session_details):
         click.echo(self.WELCOME)
         click.echo(
@@ -0,0 +1,183 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+import time
+import collections
+
+__all__ = ('CallCache', 'CachingSession')
+
+
+class CallCache(object):
+    """
+    Client-side cache of the results of read-only calls, keyed by the
+    procedure URI and the call arguments.
+
+    Every entry expires after the time-to-live given when it was stored. The
+    number of entries is bounded: when exceeded, the least recently used
+    entries are evicted. Cached results are shared, and must not be modified.
+    """
+
+    DEFAULT_MAX_SIZE = 1024
+
+    def __init__(self, max_size=None, clock=None):
+        """
+
+        :param max_size: Maximum number of entries.
+        :type max_size: int
+        :param clock: Function returning the current time in seconds
+            (default: :func:`time.monotonic`).
+        :type clock: callable
+        """
+        self._max_size = max_size or self.DEFAULT_MAX_SIZE
+        self._clock = clock or time.monotonic
+
+        # (procedure, args, kwargs) -> (expires, result), in LRU order
+        self._entries = collections.OrderedDict()  # type: collections.OrderedDict
+
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return u'CallCache(entries={}, max_size={}, hits={}, misses={})'.format(
+            len(self._entries), self._max_size, self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(procedure, args=(), kwargs=None):
+        """
+        Get the cache key of a call.
+
+        :returns: The key, or ``None`` if the call arguments are not hashable
+            (and the call hence cannot be cached).
+        :rtype: tuple or None
+        """
+        key = (procedure, tuple(args), tuple(sorted((kwargs or {}).items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        """
+        Lookup a call result.
+
+        :returns: A pair ``(found, result)``.
+        :rtype: tuple
+        """
+        entry = self._entries.get(key, None)
+        if entry is not None:
+            if entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            del self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, result, ttl):
+        """
+        Store a call result, evicting the least recently used entries as needed.
+
+        :param ttl: Time-to-live of the entry in seconds.
+        :type ttl: float
+        """
+        self._entries[key] = (self._clock() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, procedure=None, args=()):
+        """
+        Remove the entries of all calls of a procedure (or of any procedure
+        when ``None``) with positional arguments starting with ``args``.
+
+        :returns: Number of entries removed.
+        :rtype: int
+        """
+        args = tuple(args)
+
+        def matches(key):
+            if procedure is not None and key[0] != procedure:
+                return False
+            return key[1][:len(args)] == args
+
+        stale = [key for key in self._entries if matches(key)]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        """
+        Remove all entries (the hit and miss counters are kept).
+        """
+        self._entries.clear()
+
+
+class CachingSession(object):
+    """
+    Wraps a WAMP session to answer calls from a :class:`CallCache` (while
+    everything else is forwarded to the session).
+    """
+
+    def __init__(self, session, cache, ttl, fresh=False):
+        """
+
+        :param session: The session to wrap.
+        :param cache: The cache to use.
+        :type cache: :class:`CallCache`
+        :param ttl: Time-to-live of the call results stored in seconds.
+        :type ttl: float
+        :param fresh: Do not answer calls from the cache (but still store
+            the results).
+        :type fresh: bool
+        """
+        self._session = session
+        self._cache = cache
+        self._ttl = ttl
+        self._fresh = fresh
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    async def call(self, procedure, *args, **kwargs):
+        key = self._cache.key(procedure, args, kwargs)
+        if key is None:
+            return await self._session.call(procedure, *args, **kwargs)
+        if not self._fresh:
+            found, result = self._cache.get(key)
+            if found:
+                return result
+        result = await self._session.call(procedure, *args, **kwargs)
+        self._cache.put(key, result, self._ttl)
+        return result
@@ -463,6 +463,14 @@ async def cmd_start_container_component(
     await cfg.app.run_command(cmd)
 
 
+# read-only commands are answered from the result cache (see cbsh.cache)
+_fresh_option = click.option(
+    '--fresh',
+    is_flag=True,
+    default=False,
+    help='bypass the result cache (and refresh it)')
+
+
 @cli.group(name='list', help='list resources')
 @click.pass_obj
 def cmd_list(cfg):
@@ -470,25 +478,76 @@ def cmd_list(cfg):
 
 
 @cmd_list.command(name='management-realms', help='list management realms')
+@_fresh_option
 @click.pass_obj
-async def cmd_list_management_realms(cfg):
+async def cmd_list_management_realms(cfg, fresh):
     cmd = command.CmdListManagementRealms()
-    await cfg.app.run_command(cmd)
+    await cfg.app.run_command(cmd, fresh=fresh)
 
 
 @cmd_list.command(name='nodes', help='list nodes')
+@_fresh_option
 @click.pass_obj
-async def cmd_list_nodes(cfg):
+async def cmd_list_nodes(cfg, fresh):
     cmd = command.CmdListNodes()
-    await cfg.app.run_command(cmd)
+    await cfg.app.run_command(cmd, fresh=fresh)
 
 
 @cmd_list.command(name='workers', help='list workers')
-@click.argument('node')
-@click.pass_obj
-async def cmd_list_workers(cfg, node):
-    cmd = command.CmdListWorkers(node)
-    await cfg.app.run_command(cmd)
+@_fresh_option
+@click.option(
+    '--all',
+    'all_nodes',
+    is_flag=True,
+    default=False,
+    help='list the workers (with details) of all nodes')
+@click.argument('node', required=False)
+@click.pass_obj
+async def cmd_list_workers(cfg, node, all_nodes, fresh):
+    if all_nodes:
+        cmd = command.CmdListAllWorkers(on_row=cfg.app.print_row)
+    elif node:
+        cmd = command.CmdListWorkers(node)
+    else:
+        raise click.UsageError('either NODE or --all is required')
+    await cfg.app.run_command(cmd, fresh=fresh)
+
+
+def _make_list_worker_resources(name, help, cmd_class, cmd_all_class):
+    @cmd_list.command(name=name, help=help)
+    @_fresh_option
+    @click.option(
+        '--all',
+        'all_nodes',
+        is_flag=True,
+        default=False,
+        help='list the {} of all workers of all nodes'.format(name))
+    @click.argument('node', required=False)
+    @click.argument('worker', required=False)
+    @click.pass_obj
+    async def f(cfg, node, worker, all_nodes, fresh):
+        if all_nodes:
+            cmd = cmd_all_class(on_row=cfg.app.print_row)
+        elif node and worker:
+            cmd = cmd_class(node, worker)
+        else:
+            raise click.UsageError('either NODE and WORKER or --all is required')
+        await cfg.app.run_command(cmd, fresh=fresh)
+
+    return f
+
+
+_make_list_worker_resources(
+    'components', 'list components (of container and router workers)',
+    command.CmdListComponents, command.CmdListAllComponents)
+
+_make_list_worker_resources('transports',
+                            'list transports (of router workers)',
+                            command.CmdListTransports,
+                            command.CmdListAllTransports)
+
+_make_list_worker_resources('realms', 'list realms (of router workers)',
+                            command.CmdListRealms, command.CmdListAllRealms)
 
 
 @cli.group(name='show', help='show resources')
@@ -498,58 +557,171 @@ def cmd_show(cfg):
 
 
 @cmd_show.command(name='fabric', help='show fabric')
+@_fresh_option
 @click.pass_obj
-async def cmd_show_fabric(cfg):
+async def cmd_show_fabric(cfg, fresh):
     cmd = command.CmdShowFabric()
-    await cfg.app.run_command(cmd)
+    await cfg.app.run_command(cmd, fresh=fresh)
 
 
 @cmd_show.command(name='node', help='show node')
+@_fresh_option
 @click.argument('node')
 @click.pass_obj
-async def cmd_show_node(cfg, node):
+async def cmd_show_node(cfg, node, fresh):
     cmd = command.CmdShowNode(node)
-    await cfg.app.run_command(cmd)
+    await cfg.app.run_command(cmd, fresh=fresh)
 
 
 @cmd_show.command(name='worker', help='show worker')
+@_fresh_option
 @click.argument('node')
 @click.argument('worker')
 @click.pass_obj
-async def cmd_show_worker(cfg, node, worker):
+async def cmd_show_worker(cfg, node, worker, fresh):
     cmd = command.CmdShowWorker(node, worker)
-    await cfg.app.run_command(cmd)
+    await cfg.app.run_command(cmd, fresh=fresh)
 
 
 @cmd_show.command(name='transport', help='show transport (for router workers)')
+@_fresh_option
 @click.argument('node')
 @click.argument('worker')
 @click.argument('transport')
 @click.pass_obj
-async def cmd_show_transport(cfg, node, worker, transport):
+async def cmd_show_transport(cfg, node, worker, transport, fresh):
     cmd = command.CmdShowTransport(node, worker, transport)
-    await cfg.app.run_command(cmd)
+    await cfg.app.run_command(cmd, fresh=fresh)
 
 
 @cmd_show.command(name='realm', help='show realm (for router workers)')
+@_fresh_option
 @click.argument('node')
 @click.argument('worker')
 @click.argument('realm')
 @click.pass_obj
-async def cmd_show_realm(cfg, node, worker, realm):
+async def cmd_show_realm(cfg, node, worker, realm, fresh):
     cmd = command.CmdShowRealm(node, worker, realm)
-    await cfg.app.run_command(cmd)
+    await cfg.app.run_command(cmd, fresh=fresh)
 
 
 @cmd_show.command(
     name='component', help='show component (for container and router workers)')
+@_fresh_option
 @click.argument('node')
 @click.argument('worker')
 @click.argument('component')
 @click.pass_obj
-async def cmd_show_component(cfg, node, worker, component):
+async def cmd_show_component(cfg, node, worker, component, fresh):
     cmd = command.CmdShowComponent(node, worker, component)
-    await cfg.app.run_command(cmd)
+    await cfg.app.run_command(cmd, fresh=fresh)
+
+
+@cli.group(name='schema', help='FlatBuffers schema tools')
+@click.pass_obj
+def cmd_schema(cfg):
+    pass
+
+
+@cmd_schema.command(
+    name='diff', help='compare two binary FlatBuffers schemas (.bfbs)')
+@click.option(
+    '--no-cache',
+    is_flag=True,
+    default=False,
+    help="Do not use (or update) the schema cache",
+)
+@click.option(
+    '--exit-code',
+    is_flag=True,
+    default=False,
+    help="Exit with status 1 if there are differences (0 otherwise)",
+)
+@click.argument('old', type=click.Path(exists=True, dir_okay=False))
+@click.argument('new', type=click.Path(exists=True, dir_okay=False))
+@click.pass_context
+def cmd_schema_diff(ctx, old, new, no_cache, exit_code):
+    # the schema tools are only imported when needed (startup time)
+    from cbsh.idl.cache import SchemaCache
+    from cbsh.idl.diff import diff_schema_files, format_schema_diff
+
+    cache = None if no_cache else SchemaCache()
+    diff = diff_schema_files(old, new, cache=cache)
+
+    colors = {'+': 'green', '-': 'red', '~': 'yellow'}
+    for line in format_schema_diff(diff):
+        click.echo(click.style(line, fg=colors[line.lstrip()[0]]))
+
+    if exit_code and (diff['added'] or diff['removed'] or diff['changed']):
+        ctx.exit(1)
+
+
+@cli.group(name='idl', help='XBR/FlatBuffers IDL tools')
+@click.pass_obj
+def cmd_idl(cfg):
+    pass
+
+
+@cmd_idl.command(
+    name='watch',
+    help='watch FlatBuffers schemas (.fbs, .bfbs) and templates, and '
+    'regenerate on changes')
+@click.option(
+    '-t',
+    '--templates',
+    multiple=True,
+    type=click.Path(exists=True, file_okay=False),
+    help="Template directory (can be given multiple times)",
+)
+@click.option(
+    '-o',
+    '--outdir',
+    default='.',
+    type=click.Path(file_okay=False),
+    help="Output directory",
+)
+@click.option(
+    '--meta',
+    default=None,
+    help="Meta template computing the target files",
+)
+@click.option(
+    '--poll',
+    is_flag=True,
+    default=False,
+    help="Poll for changes (instead of using inotify)",
+)
+@click.option(
+    '--debounce',
+    type=float,
+    default=0.2,
+    help="Wait for this many seconds without changes before rebuilding",
+)
+@click.option(
+    '--no-cache',
+    is_flag=True,
+    default=False,
+    help="Do not use (or update) the schema cache",
+)
+@click.argument('schemas', type=click.Path(exists=True, file_okay=False))
+@click.pass_obj
+def cmd_idl_watch(cfg, schemas, templates, outdir, meta, poll, debounce,
+                  no_cache):
+    # the IDL tools are only imported when needed (startup time)
+    from cbsh.idl.watch import IdlWatch
+
+    watch = IdlWatch(
+        schemas,
+        template_paths=list(templates),
+        outdir=outdir,
+        meta_template=meta,
+        use_cache=not no_cache,
+        poll=poll,
+        debounce=debounce)
+    try:
+        watch.run()
+    except KeyboardInterrupt:
+        pass
 
 
 @cli.command(name='current', help='currently selected resource')
@@ -129,15 +129,35 @@ class _ShellClientMixin(object):
 
         await self.subscribe(on_tick, u'crossbarfabriccenter.tick')
 
+        # (re)seed the fabric mirror in the background: the session is
+        # ready for commands (which are answered from a restored snapshot,
+        # or run remotely, until seeded) right away
+        mirror = self.config.extra.get(u'mirror', None)
+        if mirror:
+            asyncio.ensure_future(self._attach_mirror(mirror))
+
         done = self.config.extra.get(u'done', None)
         if done and not done.done():
             done.set_result(details)
 
         self.log.debug("session ready!")
 
+    async def _attach_mirror(self, mirror):
+        try:
+            await mirror.attach(self)
+        except Exception as e:
+            self.log.warn(
+                "fabric mirror could not be seeded: {error}", error=e)
+        else:
+            self.log.debug("fabric mirror seeded: {mirror}", mirror=mirror)
+
     def onLeave(self, details):  # noqa: N802
         self.log.debug("session closed: {details}", details=details)
 
+        mirror = self.config.extra.get(u'mirror', None)
+        if mirror:
+            mirror.detach()
+
         # reason=<wamp.error.authentication_failed>
         if details.reason != u'wamp.close.normal':
             done = self.config.extra.get(u'done', None)
@@ -28,6 +28,8 @@
 #
 #####################################################################################
 
+import asyncio
+
 from autobahn.util import rtime
 
 
@@ -42,9 +44,24 @@ class CmdRunResult(object):
 
 
 class Cmd(object):
+
+    # time-to-live (in seconds) of cached call results for read-only
+    # commands (None: results are not cached)
+    CACHE_TTL = None  # type: float
+
     def __init__(self):
         self._started = None
 
+    def invalidates(self):
+        """
+        Cached call results made stale by running this command (see
+        :meth:`cbsh.cache.CallCache.invalidate`).
+
+        :returns: List of ``(procedure, args)`` patterns.
+        :rtype: list
+        """
+        return []
+
     def _pre(self, session):
         if not session:
             raise Exception('not connected')
@@ -56,6 +73,103 @@ class Cmd(object):
         return CmdRunResult(result, duration)
 
 
+class CmdBatchResult(CmdRunResult):
+    """
+    Result of running a batch of commands (see :class:`CmdBatch`).
+
+    ``result`` is the list of the command results in the order of the batch,
+    with ``None`` for every command that failed, and ``duration`` is the
+    (wall clock) time it took to run the whole batch.
+    """
+
+    def __init__(self, runs, errors, duration=None):
+        """
+
+        :param runs: The run result of every command, or ``None`` if failed.
+        :type runs: list of :class:`CmdRunResult`
+        :param errors: The errors of the failed commands, by batch index.
+        :type errors: dict
+        """
+        CmdRunResult.__init__(
+            self, [run.result if run else None for run in runs], duration)
+        self.runs = runs
+        self.errors = errors
+
+    def __str__(self):
+        return u'CmdBatchResult(commands={}, errors={}, duration={})'.format(
+            len(self.runs), len(self.errors), self.duration)
+
+    def format_errors(self):
+        """
+        Format the errors of the failed commands for display.
+
+        :returns: One line of text per failed command.
+        :rtype: list of str
+        """
+        return [
+            u'Command {} of batch failed: {}'.format(i, self.errors[i])
+            for i in sorted(self.errors)
+        ]
+
+
+class CmdBatch(Cmd):
+    """
+    Run many commands concurrently over the same session.
+
+    At most ``concurrency`` commands are running at any time. A failing
+    command does not abort the batch: its error is collected, and all other
+    commands run to completion. Every command of a batch must be a separate
+    instance.
+    """
+
+    DEFAULT_CONCURRENCY = 64
+
+    def __init__(self, cmds=None, concurrency=None, on_result=None):
+        """
+
+        :param cmds: The commands to run.
+        :type cmds: list of :class:`Cmd`
+        :param concurrency: Maximum number of commands running at a time.
+        :type concurrency: int
+        :param on_result: Optional callback fired with ``(index, cmd, run,
+            error)`` as each command finishes, where either the run result or
+            the error is ``None``.
+        :type on_result: callable
+        """
+        Cmd.__init__(self)
+        self.cmds = list(cmds or [])
+        self.concurrency = concurrency or self.DEFAULT_CONCURRENCY
+        self.on_result = on_result
+
+    def add(self, cmd):
+        self.cmds.append(cmd)
+
+    def invalidates(self):
+        return [pattern for cmd in self.cmds for pattern in cmd.invalidates()]
+
+    async def run(self, session):
+        self._pre(session)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        runs = [None] * len(self.cmds)
+        errors = {}
+
+        async def run_one(i, cmd):
+            async with semaphore:
+                try:
+                    runs[i] = await cmd.run(session)
+                except Exception as e:
+                    errors[i] = e
+            if self.on_result:
+                self.on_result(i, cmd, runs[i], errors.get(i, None))
+
+        await asyncio.gather(
+            *[run_one(i, cmd) for i, cmd in enumerate(self.cmds)])
+
+        result = self._post(session, None)
+        return CmdBatchResult(runs, errors, result.duration)
+
+
 class CmdPair(Cmd):
     def __init__(self):
         Cmd.__init__(self)
@@ -73,6 +187,11 @@ class CmdPairNode(CmdPair):
         self.node_id = node_id
         self.authextra = authextra
 
+    def invalidates(self):
+        return [(u'crossbarfabriccenter.mrealm.get_nodes', ()),
+                (u'crossbarfabriccenter.show_fabric', ()),
+                (None, (self.node_id, ))]
+
     async def run(self, session):
         self._pre(session)
         result = await session.call(u'crossbarfabriccenter.mrealm.pair_node',
@@ -95,6 +214,9 @@ class CmdCreateManagementRealm(CmdCreate):
         CmdCreate.__init__(self)
         self.realm = realm
 
+    def invalidates(self):
+        return [(u'crossbarfabriccenter.mrealm.get_realms', ())]
+
     async def run(self, session):
         self._pre(session)
         result = await session.call(
@@ -103,6 +225,9 @@ class CmdCreateManagementRealm(CmdCreate):
 
 
 class CmdList(Cmd):
+
+    CACHE_TTL = 10.
+
     def __init__(self):
         Cmd.__init__(self)
 
@@ -112,6 +237,8 @@ class CmdListManagementRealms(CmdList):
     GLOBAL REALM: Get list of management realms.
     """
 
+    CACHE_TTL = 60.
+
     def __init__(self):
         CmdList.__init__(self)
 
@@ -126,6 +253,8 @@ class CmdListNodes(CmdList):
     GLOBAL REALM: Get list of nodes in management realms.
     """
 
+    CACHE_TTL = 30.
+
     def __init__(self):
         CmdList.__init__(self)
 
@@ -151,7 +280,242 @@ class CmdListWorkers(CmdList):
         return self._post(session, result)
 
 
+class CmdListComponents(CmdList):
+    """
+    MREALM: Get list of components on a (router or container) worker.
+    """
+
+    def __init__(self, node, worker):
+        CmdList.__init__(self)
+        self.node = node
+        self.worker = worker
+
+    async def run(self, session):
+        self._pre(session)
+        result = await session.call(u'crossbarfabriccenter.list_components',
+                                    self.node, self.worker)
+        return self._post(session, result)
+
+
+class CmdListTransports(CmdList):
+    """
+    MREALM: Get list of transports on a router worker.
+    """
+
+    def __init__(self, node, worker):
+        CmdList.__init__(self)
+        self.node = node
+        self.worker = worker
+
+    async def run(self, session):
+        self._pre(session)
+        result = await session.call(u'crossbarfabriccenter.list_transports',
+                                    self.node, self.worker)
+        return self._post(session, result)
+
+
+class CmdListRealms(CmdList):
+    """
+    MREALM: Get list of realms on a router worker.
+    """
+
+    def __init__(self, node, worker):
+        CmdList.__init__(self)
+        self.node = node
+        self.worker = worker
+
+    async def run(self, session):
+        self._pre(session)
+        result = await session.call(u'crossbarfabriccenter.list_realms',
+                                    self.node, self.worker)
+        return self._post(session, result)
+
+
+class CmdFanOutResult(CmdRunResult):
+    """
+    Result of a fabric-wide listing (see :class:`CmdListAll`).
+
+    ``result`` is the list of rows (sorted by node, worker and resource), and
+    ``errors`` maps the path (``node`` or ``node/worker``) of every resource
+    for which a call failed to the error.
+    """
+
+    def __init__(self, rows, errors, calls, duration=None):
+        CmdRunResult.__init__(self, rows, duration)
+        self.errors = errors
+        self.calls = calls
+
+    def __str__(self):
+        return u'CmdFanOutResult(rows={}, calls={}, errors={}, duration={})'.format(
+            len(self.result), self.calls, len(self.errors), self.duration)
+
+    def format_errors(self):
+        """
+        Format the errors of the failed calls for display.
+
+        :returns: One line of text per resource a call failed for.
+        :rtype: list of str
+        """
+        return [
+            u'Listing {} failed: {}'.format(path, self.errors[path])
+            for path in sorted(self.errors)
+        ]
+
+
+class CmdListAll(CmdList):
+    """
+    MREALM: Fabric-wide listing over all nodes of the management realm (or
+    the given nodes).
+
+    The nodes are fetched once, and then the workers of all nodes are listed
+    and shown concurrently (at most ``concurrency`` calls in flight at a
+    time), and - for listings of worker resources - the resources of every
+    worker of a matching type are listed. The rows are merged into one table
+    as they arrive. A failing call does not abort the listing, but only drops
+    the rows below the resource called.
+    """
+
+    # procedure listing the resources of a worker (None: list the workers)
+    LIST_PROCEDURE = None
+
+    # worker types having resources listed by LIST_PROCEDURE
+    WORKER_TYPES = ()  # type: tuple
+
+    # column of a row for the resource listed
+    COLUMN = None  # type: str
+
+    def __init__(self, concurrency=None, on_row=None, nodes=None):
+        """
+
+        :param concurrency: Maximum number of calls in flight at a time.
+        :type concurrency: int
+        :param on_row: Optional callback fired with every row as it arrives.
+        :type on_row: callable
+        :param nodes: Only list the given nodes (instead of fetching the
+            nodes of the management realm).
+        :type nodes: list of str
+        """
+        CmdList.__init__(self)
+        self.concurrency = concurrency or CmdBatch.DEFAULT_CONCURRENCY
+        self.on_row = on_row
+        self.nodes = nodes
+        self._semaphore = None
+        self._rows = None
+        self._errors = None
+        self._calls = 0
+
+    async def _call(self, session, path, procedure, *args):
+        async with self._semaphore:
+            self._calls += 1
+            try:
+                return True, await session.call(procedure, *args)
+            except Exception as e:
+                self._errors[path] = e
+                return False, None
+
+    def _add_row(self, row):
+        self._rows.append(row)
+        if self.on_row:
+            self.on_row(row)
+
+    async def _node(self, session, node):
+        ok, workers = await self._call(
+            session, node, u'crossbarfabriccenter.list_workers', node)
+        if ok:
+            await asyncio.gather(
+                *[self._worker(session, node, worker) for worker in workers])
+
+    async def _worker(self, session, node, worker):
+        path = u'{}/{}'.format(node, worker)
+        ok, details = await self._call(
+            session, path, u'crossbarfabriccenter.show_worker', node, worker)
+        if not ok:
+            return
+
+        if self.LIST_PROCEDURE is None:
+            row = dict(details) if isinstance(details, dict) else {
+                u'details': details
+            }
+            row[u'node'] = node
+            row[u'worker'] = worker
+            self._add_row(row)
+        elif isinstance(details, dict) and details.get(
+                u'type', None) in self.WORKER_TYPES:
+            ok, items = await self._call(session, path, self.LIST_PROCEDURE,
+                                         node, worker)
+            if ok:
+                for item in items:
+                    self._add_row({
+                        u'node': node,
+                        u'worker': worker,
+                        self.COLUMN: item
+                    })
+
+    def _row_key(self, row):
+        return (u'{}'.format(row[u'node']), u'{}'.format(row[u'worker']),
+                u'{}'.format(row.get(self.COLUMN, u'')))
+
+    async def run(self, session):
+        self._pre(session)
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._rows = []
+        self._errors = {}
+        if self.nodes is None:
+            self._calls = 1
+            nodes = await session.call(u'crossbarfabriccenter.mrealm.get_nodes')
+        else:
+            self._calls = 0
+            nodes = self.nodes
+        await asyncio.gather(*[self._node(session, node) for node in nodes])
+
+        rows = sorted(self._rows, key=self._row_key)
+        result = self._post(session, None)
+        return CmdFanOutResult(rows, self._errors, self._calls,
+                               result.duration)
+
+
+class CmdListAllWorkers(CmdListAll):
+    """
+    MREALM: Get list of the workers (with details) of all nodes.
+    """
+
+
+class CmdListAllComponents(CmdListAll):
+    """
+    MREALM: Get list of the components of all router and container workers
+    of all nodes.
+    """
+
+    LIST_PROCEDURE = u'crossbarfabriccenter.list_components'
+    WORKER_TYPES = (u'router', u'container')
+    COLUMN = u'component'
+
+
+class CmdListAllTransports(CmdListAll):
+    """
+    MREALM: Get list of the transports of all router workers of all nodes.
+    """
+
+    LIST_PROCEDURE = u'crossbarfabriccenter.list_transports'
+    WORKER_TYPES = (u'router', )
+    COLUMN = u'transport'
+
+
+class CmdListAllRealms(CmdListAll):
+    """
+    MREALM: Get list of the realms of all router workers of all nodes.
+    """
+
+    LIST_PROCEDURE = u'crossbarfabriccenter.list_realms'
+    WORKER_TYPES = (u'router', )
+    COLUMN = u'realm'
+
+
 class CmdShow(Cmd):
+
+    CACHE_TTL = 5.
+
     def __init__(self):
         Cmd.__init__(self)
 
@@ -237,6 +601,11 @@ class CmdStart(Cmd):
     def __init__(self):
         Cmd.__init__(self)
 
+    def invalidates(self):
+        # everything on the node started on (all start commands have a node_id)
+        return [(u'crossbarfabriccenter.show_fabric', ()),
+                (None, (self.node_id, ))]
+
 
 class CmdStartWorker(CmdStart):
     def __init__(self, node_id, worker_id, worker_type, worker_options=None):
@@ -0,0 +1,460 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+import struct
+
+#
+# Fast, read-only accessors for binary FlatBuffers reflection schemas (.bfbs).
+#
+# These mirror the API of the generated classes in cbsh.reflection (Name(),
+# FieldsLength(), Fields(j), ..), but are built for the hot loops of the
+# schema loader:
+#
+#   - all classes are bound at module level (no imports inside methods)
+#   - values are read with precompiled struct unpackers, directly from the
+#     buffer (bytes, bytearray, mmap or memoryview)
+#   - the vtable of a table is decoded once and cached by its position in the
+#     buffer (flatc deduplicates vtables, so most tables share few vtables)
+#   - IterXxx() methods are flyweight iterators, which reuse one wrapper object
+#     for all elements of a vector (do not keep references to the yielded
+#     wrappers beyond the current iteration!)
+#
+
+__all__ = (
+    'Schema',
+    'Object',
+    'Field',
+    'Type',
+    'Enum',
+    'EnumVal',
+    'Service',
+    'RPCCall',
+    'KeyValue',
+)
+
+_u16 = struct.Struct('<H').unpack_from
+_i32 = struct.Struct('<i').unpack_from
+_u32 = struct.Struct('<I').unpack_from
+_i64 = struct.Struct('<q').unpack_from
+_f64 = struct.Struct('<d').unpack_from
+_i8 = struct.Struct('<b').unpack_from
+_u8 = struct.Struct('<B').unpack_from
+
+# vtable unpackers by vtable size (in bytes)
+_VTABLE_UNPACKERS = {}
+
+
+def _vtable_unpacker(vtable_size):
+    unpack = _VTABLE_UNPACKERS.get(vtable_size, None)
+    if unpack is None:
+        unpack = struct.Struct('<{}H'.format(vtable_size // 2)).unpack_from
+        _VTABLE_UNPACKERS[vtable_size] = unpack
+    return unpack
+
+
+class _Table(object):
+
+    __slots__ = ('_buf', '_pos', '_vt', '_vtables')
+
+    def __init__(self, buf=None, pos=None, vtables=None):
+        self._vtables = {} if vtables is None else vtables
+        self._buf = buf
+        if pos is not None:
+            self._init(pos)
+
+    def Init(self, buf, pos):  # noqa: N802
+        self._buf = buf
+        self._init(pos)
+
+    def _init(self, pos):
+        self._pos = pos
+        buf = self._buf
+        vt_pos = pos - _i32(buf, pos)[0]
+        vt = self._vtables.get(vt_pos, None)
+        if vt is None:
+            # the vtable as a tuple of uint16: (vtable size, table size,
+            # offset of field 0, offset of field 1, ..)
+            vt = _vtable_unpacker(_u16(buf, vt_pos)[0])(buf, vt_pos)
+            self._vtables[vt_pos] = vt
+        self._vt = vt
+
+    def _offset(self, vtable_offset):
+        # offset of the field (at the given vtable offset) from the table start
+        i = vtable_offset >> 1
+        vt = self._vt
+        if i < len(vt):
+            return vt[i]
+        return 0
+
+    def _string(self, vtable_offset):
+        o = self._offset(vtable_offset)
+        if o:
+            buf = self._buf
+            p = self._pos + o
+            p += _u32(buf, p)[0]
+            return bytes(buf[p + 4:p + 4 + _u32(buf, p)[0]])
+        return bytes()
+
+    def _table(self, vtable_offset, klass):
+        o = self._offset(vtable_offset)
+        if o:
+            p = self._pos + o
+            return klass(self._buf, p + _u32(self._buf, p)[0], self._vtables)
+        return None
+
+    def _vector(self, vtable_offset):
+        # returns (position of first element, number of elements)
+        o = self._offset(vtable_offset)
+        if o:
+            buf = self._buf
+            p = self._pos + o
+            p += _u32(buf, p)[0]
+            return p + 4, _u32(buf, p)[0]
+        return 0, 0
+
+    def _vector_len(self, vtable_offset):
+        return self._vector(vtable_offset)[1]
+
+    def _vector_table(self, vtable_offset, j, klass):
+        start, _ = self._vector(vtable_offset)
+        if start:
+            p = start + 4 * j
+            return klass(self._buf, p + _u32(self._buf, p)[0], self._vtables)
+        return None
+
+    def _iter_vector_table(self, vtable_offset, klass):
+        start, length = self._vector(vtable_offset)
+        if length:
+            buf = self._buf
+            item = klass(buf, None, self._vtables)
+            for p in range(start, start + 4 * length, 4):
+                item._init(p + _u32(buf, p)[0])
+                yield item
+
+    def _vector_string(self, vtable_offset, j):
+        start, _ = self._vector(vtable_offset)
+        if start:
+            buf = self._buf
+            p = start + 4 * j
+            p += _u32(buf, p)[0]
+            return bytes(buf[p + 4:p + 4 + _u32(buf, p)[0]])
+        return bytes()
+
+    def _iter_vector_string(self, vtable_offset):
+        start, length = self._vector(vtable_offset)
+        buf = self._buf
+        for p in range(start, start + 4 * length, 4):
+            p += _u32(buf, p)[0]
+            yield bytes(buf[p + 4:p + 4 + _u32(buf, p)[0]])
+
+    def _scalar(self, vtable_offset, unpack, default):
+        o = self._offset(vtable_offset)
+        if o:
+            return unpack(self._buf, self._pos + o)[0]
+        return default
+
+
+class KeyValue(_Table):
+
+    __slots__ = ()
+
+    def Key(self):  # noqa: N802
+        return self._string(4)
+
+    def Value(self):  # noqa: N802
+        return self._string(6)
+
+
+class Type(_Table):
+
+    __slots__ = ()
+
+    def BaseType(self):  # noqa: N802
+        return self._scalar(4, _i8, 0)
+
+    def Element(self):  # noqa: N802
+        return self._scalar(6, _i8, 0)
+
+    def Index(self):  # noqa: N802
+        return self._scalar(8, _i32, -1)
+
+
+class _Documented(_Table):
+
+    __slots__ = ()
+
+    # vtable offset of the documentation vector
+    _DOCUMENTATION = None
+
+    def Documentation(self, j):  # noqa: N802
+        return self._vector_string(self._DOCUMENTATION, j)
+
+    def DocumentationLength(self):  # noqa: N802
+        return self._vector_len(self._DOCUMENTATION)
+
+    def IterDocumentation(self):  # noqa: N802
+        return self._iter_vector_string(self._DOCUMENTATION)
+
+
+class _Attributed(_Documented):
+
+    __slots__ = ()
+
+    # vtable offset of the attributes vector
+    _ATTRIBUTES = None
+
+    def Attributes(self, j):  # noqa: N802
+        return self._vector_table(self._ATTRIBUTES, j, KeyValue)
+
+    def AttributesLength(self):  # noqa: N802
+        return self._vector_len(self._ATTRIBUTES)
+
+    def IterAttributes(self):  # noqa: N802
+        return self._iter_vector_table(self._ATTRIBUTES, KeyValue)
+
+
+class Field(_Attributed):
+
+    __slots__ = ()
+
+    _ATTRIBUTES = 22
+    _DOCUMENTATION = 24
+
+    def Name(self):  # noqa: N802
+        return self._string(4)
+
+    def Type(self):  # noqa: N802
+        return self._table(6, Type)
+
+    def TypeInfo(self):  # noqa: N802
+        """
+        Fast path for ``(Type().BaseType(), Type().Element(), Type().Index())``.
+        """
+        o = self._offset(6)
+        if o:
+            buf = self._buf
+            p = self._pos + o
+            p += _u32(buf, p)[0]
+            vt_pos = p - _i32(buf, p)[0]
+            vt = self._vtables.get(vt_pos, None)
+            if vt is None:
+                vt = _vtable_unpacker(_u16(buf, vt_pos)[0])(buf, vt_pos)
+                self._vtables[vt_pos] = vt
+            n = len(vt)
+            o = vt[2] if n > 2 else 0
+            base_type = _i8(buf, p + o)[0] if o else 0
+            o = vt[3] if n > 3 else 0
+            element = _i8(buf, p + o)[0] if o else 0
+            o = vt[4] if n > 4 else 0
+            index = _i32(buf, p + o)[0] if o else -1
+            return base_type, element, index
+        return None
+
+    def Id(self):  # noqa: N802
+        return self._scalar(8, _u16, 0)
+
+    def Offset(self):  # noqa: N802
+        return self._scalar(10, _u16, 0)
+
+    def DefaultInteger(self):  # noqa: N802
+        return self._scalar(12, _i64, 0)
+
+    def DefaultReal(self):  # noqa: N802
+        return self._scalar(14, _f64, 0.0)
+
+    def Deprecated(self):  # noqa: N802
+        return self._scalar(16, _u8, 0)
+
+    def Required(self):  # noqa: N802
+        return self._scalar(18, _u8, 0)
+
+    def Key(self):  # noqa: N802
+        return self._scalar(20, _u8, 0)
+
+
+class Object(_Attributed):
+
+    __slots__ = ()
+
+    _ATTRIBUTES = 14
+    _DOCUMENTATION = 16
+
+    def Name(self):  # noqa: N802
+        return self._string(4)
+
+    def Fields(self, j):  # noqa: N802
+        return self._vector_table(6, j, Field)
+
+    def FieldsLength(self):  # noqa: N802
+        return self._vector_len(6)
+
+    def IterFields(self):  # noqa: N802
+        return self._iter_vector_table(6, Field)
+
+    def IsStruct(self):  # noqa: N802
+        return self._scalar(8, _u8, 0)
+
+    def Minalign(self):  # noqa: N802
+        return self._scalar(10, _i32, 0)
+
+    def Bytesize(self):  # noqa: N802
+        return self._scalar(12, _i32, 0)
+
+
+class EnumVal(_Documented):
+
+    __slots__ = ()
+
+    _DOCUMENTATION = 12
+
+    def Name(self):  # noqa: N802
+        return self._string(4)
+
+    def Value(self):  # noqa: N802
+        return self._scalar(6, _i64, 0)
+
+    def Object(self):  # noqa: N802
+        return self._table(8, Object)
+
+    def UnionType(self):  # noqa: N802
+        return self._table(10, Type)
+
+
+class Enum(_Attributed):
+
+    __slots__ = ()
+
+    _ATTRIBUTES = 12
+    _DOCUMENTATION = 14
+
+    def Name(self):  # noqa: N802
+        return self._string(4)
+
+    def Values(self, j):  # noqa: N802
+        return self._vector_table(6, j, EnumVal)
+
+    def ValuesLength(self):  # noqa: N802
+        return self._vector_len(6)
+
+    def IterValues(self):  # noqa: N802
+        return self._iter_vector_table(6, EnumVal)
+
+    def IsUnion(self):  # noqa: N802
+        return self._scalar(8, _u8, 0)
+
+    def UnderlyingType(self):  # noqa: N802
+        return self._table(10, Type)
+
+
+class RPCCall(_Attributed):
+
+    __slots__ = ()
+
+    _ATTRIBUTES = 10
+    _DOCUMENTATION = 12
+
+    def Name(self):  # noqa: N802
+        return self._string(4)
+
+    def Request(self):  # noqa: N802
+        return self._table(6, Object)
+
+    def Response(self):  # noqa: N802
+        return self._table(8, Object)
+
+
+class Service(_Attributed):
+
+    __slots__ = ()
+
+    _ATTRIBUTES = 8
+    _DOCUMENTATION = 10
+
+    def Name(self):  # noqa: N802
+        return self._string(4)
+
+    def Calls(self, j):  # noqa: N802
+        return self._vector_table(6, j, RPCCall)
+
+    def CallsLength(self):  # noqa: N802
+        return self._vector_len(6)
+
+    def IterCalls(self):  # noqa: N802
+        return self._iter_vector_table(6, RPCCall)
+
+
+class Schema(_Table):
+
+    __slots__ = ()
+
+    @classmethod
+    def GetRootAsSchema(cls, buf, offset):  # noqa: N802
+        """
+        Get the root reflection schema object from a buffer.
+
+        All objects reached from the root share one vtable cache.
+        """
+        return cls(buf, offset + _u32(buf, offset)[0])
+
+    def Objects(self, j):  # noqa: N802
+        return self._vector_table(4, j, Object)
+
+    def ObjectsLength(self):  # noqa: N802
+        return self._vector_len(4)
+
+    def IterObjects(self):  # noqa: N802
+        return self._iter_vector_table(4, Object)
+
+    def Enums(self, j):  # noqa: N802
+        return self._vector_table(6, j, Enum)
+
+    def EnumsLength(self):  # noqa: N802
+        return self._vector_len(6)
+
+    def IterEnums(self):  # noqa: N802
+        return self._iter_vector_table(6, Enum)
+
+    def FileIdent(self):  # noqa: N802
+        return self._string(8)
+
+    def FileExt(self):  # noqa: N802
+        return self._string(10)
+
+    def RootTable(self):  # noqa: N802
+        return self._table(12, Object)
+
+    def Services(self, j):  # noqa: N802
+        return self._vector_table(14, j, Service)
+
+    def ServicesLength(self):  # noqa: N802
+        return self._vector_len(14)
+
+    def IterServices(self):  # noqa: N802
+        return self._iter_vector_table(14, Service)
@@ -0,0 +1,194 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+import os
+import marshal
+import tempfile
+import importlib.util
+
+import txaio
+
+__all__ = ('SchemaCache', )
+
+# magic bytes at the start of each cache entry
+_MAGIC = b'CBSC'
+
+# bump this whenever the data extracted by the loader changes
+_FORMAT_VERSION = 5
+
+# marshal data is only guaranteed to be readable by the same Python version
+_HEADER = _MAGIC + bytes([_FORMAT_VERSION]) + importlib.util.MAGIC_NUMBER
+
+_SUFFIX = '.cache'
+
+
+class SchemaCache(object):
+    """
+    Persistent on-disk cache of extracted FlatBuffers schemas, keyed by the
+    SHA256 of the binary schema (``bfbs_sha256``).
+
+    Entries are stored one per file in a compact binary (marshal) format.
+    The total size of the cache is bounded: when exceeded, the least recently
+    used entries (by file modification time, which is bumped on every hit)
+    are evicted.
+    """
+
+    DEFAULT_CACHE_DIR = u'~/.cbf/schema-cache'
+
+    DEFAULT_MAX_SIZE = 256 * 2**20
+
+    def __init__(self, cache_dir=None, max_size=None):
+        """
+
+        :param cache_dir: Cache directory, created if it does not yet exist.
+        :type cache_dir: str
+        :param max_size: Maximum total size of all cache entries in bytes.
+        :type max_size: int
+        """
+        self.log = txaio.make_logger()
+        self._cache_dir = os.path.abspath(
+            os.path.expanduser(cache_dir or self.DEFAULT_CACHE_DIR))
+        self._max_size = max_size or self.DEFAULT_MAX_SIZE
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+    def __str__(self):
+        return u'SchemaCache(cache_dir={}, max_size={})'.format(
+            self._cache_dir, self._max_size)
+
+    def _path(self, bfbs_sha256):
+        return os.path.join(self._cache_dir, bfbs_sha256 + _SUFFIX)
+
+    def get(self, bfbs_sha256):
+        """
+        Get a cached schema.
+
+        :param bfbs_sha256: SHA256 (hex) of the binary schema.
+        :type bfbs_sha256: str
+
+        :returns: The cached schema or ``None`` when not (validly) cached.
+        :rtype: dict or None
+        """
+        path = self._path(bfbs_sha256)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            return None
+
+        schema = None
+        if data[:len(_HEADER)] == _HEADER:
+            try:
+                schema = marshal.loads(data[len(_HEADER):])
+            except (EOFError, ValueError, TypeError):
+                pass
+
+        if schema is None:
+            # entry written by another cache format or Python version
+            self.log.debug('dropping stale schema cache entry {}'.format(path))
+            self._remove(path)
+        else:
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+        return schema
+
+    def put(self, bfbs_sha256, schema):
+        """
+        Store a schema in the cache, evicting old entries as needed.
+
+        :param bfbs_sha256: SHA256 (hex) of the binary schema.
+        :type bfbs_sha256: str
+        :param schema: The extracted schema (plain dicts, lists and scalars).
+        :type schema: dict
+        """
+        data = _HEADER + marshal.dumps(schema)
+        if len(data) > self._max_size:
+            return
+
+        # write to a temporary file and rename, so readers never see
+        # partially written entries
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(bfbs_sha256))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """
+        Evict least recently used entries until the cache size is within bounds.
+
+        :returns: Number of entries evicted.
+        :rtype: int
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self._cache_dir):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self._cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        evicted = 0
+        if total > self._max_size:
+            for _, size, path in sorted(entries):
+                self._remove(path)
+                evicted += 1
+                total -= size
+                if total <= self._max_size:
+                    break
+        return evicted
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+        for name in os.listdir(self._cache_dir):
+            if name.endswith(_SUFFIX):
+                self._remove(os.path.join(self._cache_dir, name))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
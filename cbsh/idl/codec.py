@@ -0,0 +1,310 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+import math
+import struct
+
+__all__ = ('SCALAR_FORMATS', 'struct_layout', 'table_layout', 'codec_types')
+
+# struct module format characters of FlatBuffers scalars
+SCALAR_FORMATS = {
+    'utype': 'B',
+    'bool': '?',
+    'int8': 'b',
+    'uint8': 'B',
+    'int16': 'h',
+    'uint16': 'H',
+    'int32': 'i',
+    'uint32': 'I',
+    'int64': 'q',
+    'uint64': 'Q',
+    'float': 'f',
+    'double': 'd',
+}
+
+
+def _pyname(name):
+    return name.replace('.', '_')
+
+
+def _pad(fmt, offset, target):
+    # append padding to fmt to get from offset to target
+    if target > offset:
+        fmt.append('{}x'.format(target - offset))
+    return target
+
+
+def struct_layout(types, name):
+    """
+    Compute the packing layout of a FlatBuffers struct, from the struct
+    layout extracted by the schema loader (field offsets and struct byte size).
+
+    Nested structs are flattened: the struct is packed from the values of all
+    its (nested) scalar fields, in memory order.
+
+    :param types: The type registry (``schema['types']``).
+    :type types: dict
+    :param name: Qualified name of the struct.
+    :type name: str
+
+    :returns: The layout, a dict with ``name``, ``pyname``, ``size``,
+        ``align``, ``format`` (struct module format, without byte order),
+        ``paths`` (field name path of every flattened value), ``tree``
+        (nested ``(field name, value index or subtree)`` pairs) and
+        ``default`` (all zero value).
+    :rtype: dict
+    """
+    struct_ = types[name]
+    if struct_['type'] != 'struct':
+        raise Exception('"{}" is not a struct'.format(name))
+
+    fmt = []
+    paths = []
+
+    def walk(typedef, base, prefix):
+        tree = []
+        default = {}
+        offset = base
+        for field in sorted(typedef['fields'].values(), key=lambda f: f['offset']):
+            offset = _pad(fmt, offset, base + field['offset'])
+            path = prefix + (field['name'], )
+            if field['base_type'] == 'object' and field.get('ref_category', None) == 'struct':
+                nested = types[field['ref_type']]
+                subtree, default[field['name']], offset = walk(nested, offset, path)
+                tree.append((field['name'], subtree))
+            elif field['base_type'] in SCALAR_FORMATS:
+                fmt.append(SCALAR_FORMATS[field['base_type']])
+                offset += struct.calcsize('<' + fmt[-1])
+                tree.append((field['name'], len(paths)))
+                paths.append(path)
+                default[field['name']] = 0.0 if field['base_type'] in ('float', 'double') else 0
+            else:
+                raise Exception('unsupported type "{}" of struct field "{}.{}"'.format(
+                    field['base_type'], typedef['name'], field['name']))
+        offset = _pad(fmt, offset, base + typedef['bytesize'])
+        return tree, default, offset
+
+    tree, default, _ = walk(struct_, 0, ())
+
+    return {
+        'name': name,
+        'pyname': _pyname(name),
+        'size': struct_['bytesize'],
+        'align': struct_['minalign'],
+        'format': ''.join(fmt),
+        'paths': paths,
+        'tree': tree,
+        'default': default,
+    }
+
+
+def _default(base_type, value):
+    # schema default of a scalar (zero if not given)
+    if base_type in ('float', 'double'):
+        return float(value or 0)
+    elif base_type == 'bool':
+        return bool(value)
+    return int(value or 0)
+
+
+def _literal(value):
+    # Python source of a scalar value
+    if isinstance(value, float) and not math.isfinite(value):
+        return "float('{}')".format(value)
+    return repr(value)
+
+
+def _field_layout(types, table, field):
+    # kind, inline size and alignment, and extra info of a table field
+    base_type = field['base_type']
+    ref_category = field.get('ref_category', None)
+    info = {
+        'name': field['name'],
+        'id': field['id'],
+        'slot': field['offset'],
+    }
+    if field.get('ref_type', None) and ref_category in ('struct', 'table'):
+        info['ref_type'] = field['ref_type']
+    if base_type in SCALAR_FORMATS and base_type != 'utype':
+        info['kind'] = 'scalar'
+        info['format'] = SCALAR_FORMATS[base_type]
+        info['size'] = info['align'] = struct.calcsize('<' + info['format'])
+        info['default'] = _default(base_type, field.get('default', None))
+        info['default_literal'] = _literal(info['default'])
+    elif base_type == 'object' and ref_category == 'struct':
+        layout = struct_layout(types, field['ref_type'])
+        info['kind'] = 'struct'
+        info['ref'] = layout['pyname']
+        info['format'] = layout['format']
+        info['paths'] = layout['paths']
+        info['size'] = layout['size']
+        info['align'] = layout['align']
+    elif base_type in ('object', 'string', 'vector'):
+        info['size'] = info['align'] = 4
+        if base_type == 'object':
+            info['kind'] = 'table'
+            info['ref'] = _pyname(field['ref_type'])
+        elif base_type == 'string':
+            info['kind'] = 'string'
+        else:
+            element_type = field.get('element_type', None)
+            if element_type == 'string':
+                info['kind'] = 'strings'
+            elif element_type == 'object' and ref_category == 'struct':
+                layout = struct_layout(types, field['ref_type'])
+                info['kind'] = 'structs'
+                info['ref'] = layout['pyname']
+                info['element_size'] = layout['size']
+                info['element_align'] = layout['align']
+            elif element_type == 'object':
+                info['kind'] = 'tables'
+                info['ref'] = _pyname(field['ref_type'])
+            elif element_type == 'uint8':
+                info['kind'] = 'bytes'
+            elif element_type in SCALAR_FORMATS and element_type != 'utype':
+                info['kind'] = 'scalars'
+                info['element_format'] = SCALAR_FORMATS[element_type]
+                info['element_size'] = struct.calcsize('<' + info['element_format'])
+            else:
+                raise Exception('unsupported vector element type "{}" of field "{}.{}"'.format(
+                    element_type, table['name'], field['name']))
+    else:
+        raise Exception('unsupported type "{}" of field "{}.{}"'.format(
+            base_type, table['name'], field['name']))
+    return info
+
+
+def table_layout(types, name):
+    """
+    Compute the (fixed) serialization layout of a FlatBuffers table with all
+    fields present: the inline fields are packed after the vtable offset by
+    decreasing alignment, which gives one constant vtable per table.
+
+    :param types: The type registry (``schema['types']``).
+    :type types: dict
+    :param name: Qualified name of the table.
+    :type name: str
+
+    :returns: The layout, a dict with ``name``, ``pyname``, ``size`` and
+        ``align`` (of the inline table), ``vtable`` (bytes), ``encode_format``
+        and ``decode_format`` (struct module formats of the inline table, for
+        packing from all values and unpacking all but the structs), and
+        ``fields`` (in inline order, with the ``offset`` within the table, and
+        the schema ``default`` of scalars).
+    :rtype: dict
+    """
+    table = types[name]
+    if table['type'] != 'table':
+        raise Exception('"{}" is not a table'.format(name))
+
+    fields = [_field_layout(types, table, field) for field in table['fields'].values()]
+    fields.sort(key=lambda f: (-f['align'], f['id']))
+
+    encode_format = ['<i']
+    decode_format = ['<i']
+    offset = 4
+    for field in fields:
+        target = offset + (-offset % field['align'])
+        _pad(encode_format, offset, target)
+        offset = _pad(decode_format, offset, target)
+        field['offset'] = offset
+        if field['kind'] == 'scalar':
+            encode_format.append(field['format'])
+            decode_format.append(field['format'])
+        elif field['kind'] == 'struct':
+            encode_format.append(field['format'])
+            decode_format.append('{}x'.format(field['size']))
+        else:
+            encode_format.append('I')
+            decode_format.append('I')
+        offset += field['size']
+
+    slots = [0] * (max([f['id'] for f in fields] or [-1]) + 1)
+    for field in fields:
+        slots[field['id']] = field['offset']
+    vtable = struct.pack('<{}H'.format(len(slots) + 2), 4 + 2 * len(slots), offset, *slots)
+
+    return {
+        'name': name,
+        'pyname': _pyname(name),
+        'size': offset,
+        'align': max([4] + [f['align'] for f in fields]),
+        'vtable': vtable,
+        'encode_format': ''.join(encode_format),
+        'decode_format': ''.join(decode_format),
+        'fields': fields,
+    }
+
+
+def codec_types(types):
+    """
+    Compute the layouts of all tables (and the structs they use) which can be
+    serialized with generated codecs. Tables with unsupported fields (unions,
+    fixed size arrays), or referencing such tables, are skipped.
+
+    :param types: The type registry (``schema['types']``).
+    :type types: dict
+
+    :returns: A tuple ``(tables, structs, skipped)`` with the table layouts,
+        the struct layouts and the qualified names of the skipped tables.
+    :rtype: tuple
+    """
+    tables = {}
+    skipped = []
+    for name, typedef in types.items():
+        if typedef['type'] == 'table':
+            try:
+                tables[name] = table_layout(types, name)
+            except Exception:
+                skipped.append(name)
+
+    # drop tables referencing skipped tables (until nothing changes)
+    refs = {
+        name: set(f['ref_type'] for f in layout['fields']
+                  if f['kind'] in ('table', 'tables'))
+        for name, layout in tables.items()
+    }
+    while True:
+        dropped = [name for name in tables if refs[name] - set(tables)]
+        if not dropped:
+            break
+        for name in dropped:
+            del tables[name]
+            skipped.append(name)
+
+    structs = {}
+    for layout in tables.values():
+        for field in layout['fields']:
+            if field['kind'] in ('struct', 'structs') and field['ref_type'] not in structs:
+                structs[field['ref_type']] = struct_layout(types, field['ref_type'])
+
+    return ([tables[name] for name in sorted(tables)],
+            [structs[name] for name in sorted(structs)],
+            sorted(skipped))
@@ -0,0 +1,322 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+import os
+import json
+import hashlib
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from jinja2 import meta as jinja2_meta
+
+from cbsh.idl.loader import atomic_output, typedef_hash
+
+__all__ = ('TrackingMapping', 'DepsManifest', 'track_schema', 'schema_deps',
+           'template_closure')
+
+
+class TrackingMapping(Mapping):
+    """
+    Read-only view onto a dict which records the keys accessed (also keys
+    probed but missing, which are then recorded as dependencies on the key
+    being absent), and whether the set of keys itself was used (by iterating
+    or taking the length).
+    """
+
+    __slots__ = ('_data', 'accessed', 'listed')
+
+    def __init__(self, data):
+        self._data = data
+        self.accessed = set()
+        self.listed = False
+
+    def __getitem__(self, key):
+        self.accessed.add(key)
+        return self._data[key]
+
+    def get(self, key, default=None):
+        self.accessed.add(key)
+        return self._data.get(key, default)
+
+    def __contains__(self, key):
+        self.accessed.add(key)
+        return key in self._data
+
+    def __iter__(self):
+        self.listed = True
+        return iter(self._data)
+
+    def __len__(self):
+        self.listed = True
+        return len(self._data)
+
+
+def track_schema(schema):
+    """
+    Wrap a schema for rendering, so that the definitions (and metadata) used
+    by a template can be recorded, see :func:`schema_deps`.
+
+    :param schema: The schema (as returned by the schema loader).
+    :type schema: dict
+
+    :returns: The wrapped schema.
+    :rtype: dict
+    """
+    tracked = dict(schema)
+    tracked['meta'] = TrackingMapping(schema['meta'])
+    tracked['types'] = TrackingMapping(schema['types'])
+    return tracked
+
+
+def _type_hash(typedef):
+    return typedef.get('hash', None) or typedef_hash(typedef)
+
+
+def listing_hash(schema):
+    """
+    Hash of the set of qualified names of all definitions in a schema.
+    """
+    data = '\n'.join(sorted(schema['types'].keys()))
+    return hashlib.sha256(data.encode('utf8')).hexdigest()
+
+
+def schema_deps(schema, tracked, type_names=()):
+    """
+    Get the schema dependencies recorded while rendering with a tracked schema.
+
+    :param schema: The schema.
+    :type schema: dict
+    :param tracked: The tracked schema (see :func:`track_schema`) used.
+    :type tracked: dict
+    :param type_names: Further definitions used (eg passed directly).
+    :type type_names: iterable of str
+
+    :returns: The definition hashes by name (``None`` for definitions probed
+        but missing), the listing hash (or ``None`` if the set of definitions
+        was not used), and the metadata used (``None`` for missing keys).
+    :rtype: dict
+    """
+    types = tracked['types']
+    meta = tracked['meta']
+
+    names = set(types.accessed)
+    names.update(type_names)
+
+    meta_keys = meta.accessed
+    if meta.listed:
+        meta_keys = schema['meta'].keys()
+
+    return {
+        'types': {
+            name: _type_hash(schema['types'][name])
+            if name in schema['types'] else None
+            for name in sorted(names)
+        },
+        'listing': listing_hash(schema) if types.listed else None,
+        'meta': {key: schema['meta'].get(key, None)
+                 for key in sorted(meta_keys)},
+    }
+
+
+def template_closure(env, name):
+    """
+    Get the names of a template and of all templates it (statically) extends,
+    includes or imports.
+
+    :param env: The template environment.
+    :type env: :class:`jinja2.Environment`
+    :param name: Name of the template.
+    :type name: str
+
+    :returns: The names of the templates, and whether any template references
+        templates dynamically (which cannot be tracked).
+    :rtype: tuple
+    """
+    names = set()
+    dynamic = False
+    todo = [name]
+    while todo:
+        name = todo.pop()
+        if name in names:
+            continue
+        names.add(name)
+        source, _, _ = env.loader.get_source(env, name)
+        for ref in jinja2_meta.find_referenced_templates(env.parse(source)):
+            if ref is None:
+                dynamic = True
+            else:
+                todo.append(ref)
+    return names, dynamic
+
+
+class DepsManifest(object):
+    """
+    Dependency manifest of generated target files, stored in the output
+    directory.
+
+    For every target file, the manifest records the template it was rendered
+    from, the hashes of the definitions it used (see :func:`schema_deps`), and
+    the templates it depends on (see :func:`template_closure`). The templates
+    are recorded by mtime and SHA256 (which is only computed when the mtime
+    changed).
+    """
+
+    FILENAME = u'.cbsh-deps.json'
+
+    VERSION = 2
+
+    def __init__(self, outdir, config):
+        """
+
+        :param outdir: Output directory.
+        :type outdir: str
+        :param config: Generator configuration (eg template folders and meta
+            template): when it changes, all recorded targets are outdated.
+        :type config: dict
+        """
+        self.path = os.path.join(outdir, self.FILENAME)
+        self.config = config
+        self.targets = {}
+        self.templates = {}
+
+        # template state of this run, by template name
+        self._current = {}
+
+    def __str__(self):
+        return u'DepsManifest(path={}, targets={})'.format(
+            self.path, len(self.targets))
+
+    def load(self):
+        """
+        Load the manifest (when existing, and written with the same version and
+        configuration).
+        """
+        try:
+            with open(self.path, 'r', encoding='utf8') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return
+        if data.get('version', None) != self.VERSION or data.get(
+                'config', None) != self.config:
+            return
+        self.targets = data['targets']
+        self.templates = data['templates']
+
+    def save(self):
+        """
+        Write the manifest atomically.
+        """
+        with atomic_output(self.path) as f:
+            json.dump({
+                'version': self.VERSION,
+                'config': self.config,
+                'templates': self.templates,
+                'targets': self.targets,
+            }, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    def _template_state(self, env, name):
+        state = self._current.get(name, None)
+        if state is None:
+            source, filename, _ = env.loader.get_source(env, name)
+            mtime = os.path.getmtime(filename) if filename else None
+            recorded = self.templates.get(name, None)
+            if recorded and recorded['mtime'] == mtime:
+                sha256 = recorded['sha256']
+            else:
+                sha256 = hashlib.sha256(source.encode('utf8')).hexdigest()
+            state = {'mtime': mtime, 'sha256': sha256}
+            self._current[name] = state
+        return state
+
+    def _template_changed(self, env, name):
+        recorded = self.templates.get(name, None)
+        try:
+            state = self._template_state(env, name)
+        except Exception:
+            # template removed
+            return True
+        return recorded is None or recorded['sha256'] != state['sha256']
+
+    def is_outdated(self, env, schema, outdir, target, template, type_name):
+        """
+        Check whether a target file needs to be rendered.
+
+        :returns: ``True`` when the target is not recorded, its file is missing,
+            or any of its recorded dependencies changed.
+        :rtype: bool
+        """
+        entry = self.targets.get(target, None)
+        if entry is None or entry['template'] != template or entry[
+                'type'] != type_name or entry['dynamic']:
+            return True
+
+        if not os.path.exists(os.path.join(outdir, target)):
+            return True
+
+        for name in entry['templates']:
+            if self._template_changed(env, name):
+                return True
+
+        types = schema['types']
+        for name, hash in entry['types'].items():
+            typedef = types.get(name, None)
+            if (None if typedef is None else _type_hash(typedef)) != hash:
+                return True
+
+        if entry['listing'] is not None and entry['listing'] != listing_hash(
+                schema):
+            return True
+
+        meta = schema['meta']
+        for key, value in entry['meta'].items():
+            if meta.get(key, None) != value:
+                return True
+
+        return False
+
+    def record(self, env, target, template, type_name, deps):
+        """
+        Record the dependencies of a rendered target file.
+        """
+        names, dynamic = template_closure(env, template)
+        for name in names:
+            self.templates[name] = self._template_state(env, name)
+        entry = {
+            'template': template,
+            'type': type_name,
+            'templates': sorted(names),
+            'dynamic': dynamic,
+        }
+        entry.update(deps)
+        self.targets[target] = entry
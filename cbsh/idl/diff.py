@@ -0,0 +1,218 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+import hashlib
+
+from cbsh.idl.lazy import LazySchema
+from cbsh.idl.loader import read_reflection_schema, schema_buffer, typedef_hash
+
+__all__ = ('diff_schemas', 'diff_lazy_schemas', 'diff_schema_files',
+           'format_schema_diff')
+
+# members of definitions, keyed by member name
+_MEMBERS = ('fields', 'values', 'slots')
+
+
+def _hash(typedef):
+    # schemas extracted before per-definition hashes were introduced
+    # carry no hash: compute it on the fly
+    return typedef.get('hash', None) or typedef_hash(typedef)
+
+
+def _diff_members(old, new):
+    added = sorted(name for name in new if name not in old)
+    removed = sorted(name for name in old if name not in new)
+    changed = {}
+    for name, member in new.items():
+        old_member = old.get(name, None)
+        if old_member is not None and old_member != member:
+            changed[name] = {
+                key: (old_member.get(key, None), member.get(key, None))
+                for key in sorted(set(old_member) | set(member))
+                if old_member.get(key, None) != member.get(key, None)
+            }
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def _diff_typedef(old, new):
+    diff = {}
+    for key in sorted(set(old) | set(new)):
+        if key == 'hash':
+            continue
+        old_value = old.get(key, None)
+        new_value = new.get(key, None)
+        if old_value == new_value:
+            continue
+        if key in _MEMBERS and isinstance(old_value, dict) and isinstance(
+                new_value, dict):
+            diff[key] = _diff_members(old_value, new_value)
+        else:
+            diff[key] = (old_value, new_value)
+    return diff
+
+
+def diff_schemas(old, new):
+    """
+    Compare two schemas (as returned by :func:`cbsh.idl.loader.read_reflection_schema`).
+
+    Definitions are compared by their content hashes first, and only the
+    definitions with differing hashes are compared in detail.
+
+    :param old: The old schema.
+    :type old: dict
+    :param new: The new schema.
+    :type new: dict
+
+    :returns: The qualified names of the ``added`` and ``removed`` definitions,
+        and the differences for every ``changed`` definition by qualified name.
+    :rtype: dict
+    """
+    old_types = old['types']
+    new_types = new['types']
+
+    added = sorted(name for name in new_types if name not in old_types)
+    removed = sorted(name for name in old_types if name not in new_types)
+
+    changed = {}
+    for name, typedef in new_types.items():
+        old_typedef = old_types.get(name, None)
+        if old_typedef is not None and _hash(old_typedef) != _hash(typedef):
+            changed[name] = _diff_typedef(old_typedef, typedef)
+
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def diff_lazy_schemas(old, new):
+    """
+    Compare two lazy schema views, see :func:`diff_schemas`.
+
+    Definitions are compared by the hashes of their raw data (see
+    :meth:`cbsh.idl.lazy.LazySchema.raw_hash`) first, and only the definitions
+    with differing raw hashes are decoded (and compared in detail). Added and
+    removed definitions are not decoded.
+
+    :param old: The old schema.
+    :type old: :class:`cbsh.idl.lazy.LazySchema`
+    :param new: The new schema.
+    :type new: :class:`cbsh.idl.lazy.LazySchema`
+
+    :returns: The schema differences.
+    :rtype: dict
+    """
+    added = sorted(name for name in new.keys() if name not in old)
+    removed = sorted(name for name in old.keys() if name not in new)
+
+    changed = {}
+    for name in new.keys():
+        if name in old and old.raw_hash(name) != new.raw_hash(name):
+            old_typedef = old[name]
+            typedef = new[name]
+            if old_typedef['hash'] != typedef['hash']:
+                changed[name] = _diff_typedef(old_typedef, typedef)
+
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def diff_schema_files(old_filename, new_filename, use_mmap=True, cache=None):
+    """
+    Compare two binary FlatBuffers schema files (.bfbs), see :func:`diff_schemas`.
+
+    Without a schema cache, the schema files are read lazily (see
+    :func:`diff_lazy_schemas`), so that comparing two versions of a schema
+    mostly costs time proportional to the number of changed definitions.
+    With a schema cache, schemas found in the cache are compared without
+    reading them again, and schemas not yet cached are read and stored in
+    the cache (as with :func:`cbsh.idl.loader.read_reflection_schema_file`).
+
+    :param old_filename: Path of the old binary schema file.
+    :type old_filename: str
+    :param new_filename: Path of the new binary schema file.
+    :type new_filename: str
+    :param use_mmap: Memory-map the files instead of reading them.
+    :type use_mmap: bool
+    :param cache: Optional schema cache to lookup (and store) the schemas.
+    :type cache: :class:`cbsh.idl.cache.SchemaCache`
+
+    :returns: The schema differences.
+    :rtype: dict
+    """
+    with schema_buffer(old_filename, use_mmap=use_mmap) as old_buf, \
+            schema_buffer(new_filename, use_mmap=use_mmap) as new_buf:
+
+        old_sha256 = hashlib.sha256(old_buf).hexdigest()
+        new_sha256 = hashlib.sha256(new_buf).hexdigest()
+        if old_sha256 == new_sha256:
+            return {'added': [], 'removed': [], 'changed': {}}
+
+        if not cache:
+            return diff_lazy_schemas(LazySchema(old_buf), LazySchema(new_buf))
+
+        schemas = []
+        for buf, bfbs_sha256 in [(old_buf, old_sha256), (new_buf, new_sha256)]:
+            schema = cache.get(bfbs_sha256)
+            if not schema:
+                schema = read_reflection_schema(buf, bfbs_sha256=bfbs_sha256)
+                cache.put(bfbs_sha256, schema)
+            schemas.append(schema)
+
+    return diff_schemas(*schemas)
+
+
+def format_schema_diff(diff):
+    """
+    Format schema differences (see :func:`diff_schemas`) for display.
+
+    :param diff: The schema differences.
+    :type diff: dict
+
+    :returns: The lines of text (without line endings).
+    :rtype: list of str
+    """
+    lines = []
+    for name in diff['added']:
+        lines.append('+ {}'.format(name))
+    for name in diff['removed']:
+        lines.append('- {}'.format(name))
+    for name in sorted(diff['changed']):
+        lines.append('~ {}'.format(name))
+        for key, value in sorted(diff['changed'][name].items()):
+            if isinstance(value, dict):
+                for member in value['added']:
+                    lines.append('    + {} {}'.format(key, member))
+                for member in value['removed']:
+                    lines.append('    - {} {}'.format(key, member))
+                for member, changes in sorted(value['changed'].items()):
+                    lines.append('    ~ {} {}: {}'.format(
+                        key, member, ', '.join(sorted(changes.keys()))))
+            else:
+                lines.append('    ~ {}: {!r} -> {!r}'.format(
+                    key, value[0], value[1]))
+    return lines
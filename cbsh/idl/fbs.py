@@ -0,0 +1,985 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+import os
+import re
+import json
+import hashlib
+
+from typing import Dict, Any  # noqa
+
+import txaio
+
+from cbsh.idl import loader
+from cbsh.idl.loader import (INTERFACE_ATTRS, INTERFACE_MEMBER_TYPES,
+                             INTERFACE_MEMBER_STREAM_VALUES, typedef_hash)
+
+__all__ = ('FbsParser', 'parse_fbs', 'read_fbs_schema_file')
+
+# bump this whenever the syntax trees produced by parse_fbs() change
+_PARSER_VERSION = 1
+
+_KEY_PREFIX = 'cbsh-fbs-{}\0'.format(_PARSER_VERSION).encode('ascii')
+
+_TOKEN = re.compile(
+    r'(?P<doc>///[^\n]*)'
+    r'|(?P<comment>//[^\n]*|/\*.*?\*/)'
+    r'|(?P<space>\s+)'
+    r'|(?P<string>"(?:[^"\\\n]|\\.)*")'
+    r'|(?P<number>[-+]?(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+    r'|[-+](?:inf|infinity|nan)\b)'
+    r'|(?P<ident>[A-Za-z_][A-Za-z0-9_]*)'
+    r'|(?P<punct>[{}()\[\]:;,=.])', re.S)
+
+# type names built into the schema language, and their size in bytes
+_SCALAR_SIZES = {
+    'bool': 1,
+    'int8': 1,
+    'uint8': 1,
+    'int16': 2,
+    'uint16': 2,
+    'int32': 4,
+    'uint32': 4,
+    'int64': 8,
+    'uint64': 8,
+    'float': 4,
+    'double': 8,
+}
+
+_TYPE_ALIASES = {
+    'byte': 'int8',
+    'ubyte': 'uint8',
+    'short': 'int16',
+    'ushort': 'uint16',
+    'int': 'int32',
+    'uint': 'uint32',
+    'long': 'int64',
+    'ulong': 'uint64',
+    'float32': 'float',
+    'float64': 'double',
+}
+
+_INTEGER_TYPES = ('int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32',
+                  'int64', 'uint64')
+
+# attributes known to flatc, which need no "attribute" declaration
+_BUILTIN_ATTRIBUTES = frozenset([
+    'bit_flags', 'cpp_ptr_type', 'cpp_ptr_type_get', 'cpp_str_flex_ctor',
+    'cpp_str_type', 'cpp_type', 'csharp_partial', 'declaration_file',
+    'deprecated', 'flexbuffers', 'force_align', 'hash', 'id', 'idempotent',
+    'key', 'native_custom_alloc', 'native_default', 'native_inline',
+    'native_type', 'nested_flatbuffer', 'original_order', 'private',
+    'required', 'shared', 'streaming'
+])
+
+
+def _scalar(name):
+    name = _TYPE_ALIASES.get(name, name)
+    if name in _SCALAR_SIZES:
+        return name
+    return None
+
+
+def _int(text):
+    if 'x' in text or 'X' in text:
+        return int(text, 16)
+    return int(text)
+
+
+def _tokenize(text, filename):
+    # tokens are (kind, value, line, docs) with the doc comments ("///")
+    # found immediately before the token
+    tokens = []
+    docs = []
+    line = 1
+    pos = 0
+    end = len(text)
+    match = _TOKEN.match
+    while pos < end:
+        m = match(text, pos)
+        if m is None:
+            raise Exception('{}:{}: invalid character "{}"'.format(
+                filename, line, text[pos]))
+        kind = m.lastgroup
+        value = m.group()
+        if kind == 'doc':
+            docs.append(value[3:].strip())
+        elif kind != 'comment' and kind != 'space':
+            tokens.append((kind, value, line, docs))
+            docs = []
+        line += value.count('\n')
+        pos = m.end()
+    tokens.append(('eof', '', line, docs))
+    return tokens
+
+
+class _FileParser(object):
+    """
+    Recursive descent parser for one schema source file.
+    """
+
+    def __init__(self, text, filename):
+        self._filename = filename
+        self._tokens = _tokenize(text, filename)
+        self._i = 0
+        self._namespace = ''
+
+    def _error(self, msg, token=None):
+        if token is None:
+            token = self._tokens[self._i]
+        return Exception('{}:{}: {}'.format(self._filename, token[2], msg))
+
+    def _peek(self):
+        return self._tokens[self._i]
+
+    def _next(self):
+        token = self._tokens[self._i]
+        if token[0] != 'eof':
+            self._i += 1
+        return token
+
+    def _is(self, value):
+        token = self._tokens[self._i]
+        return token[1] == value and token[0] in ('punct', 'ident')
+
+    def _accept(self, value):
+        if self._is(value):
+            self._i += 1
+            return True
+        return False
+
+    def _expect(self, value):
+        if not self._is(value):
+            raise self._error('expected "{}" instead of "{}"'.format(
+                value, self._peek()[1] or 'end of file'))
+        return self._next()
+
+    def _ident(self):
+        token = self._next()
+        if token[0] != 'ident':
+            raise self._error(
+                'expected identifier instead of "{}"'.format(
+                    token[1] or 'end of file'), token)
+        return token
+
+    def _qualified(self):
+        parts = [self._ident()[1]]
+        while self._accept('.'):
+            parts.append(self._ident()[1])
+        return '.'.join(parts)
+
+    def _string(self):
+        token = self._next()
+        if token[0] != 'string':
+            raise self._error(
+                'expected string constant instead of "{}"'.format(
+                    token[1] or 'end of file'), token)
+        return self._unquote(token)
+
+    def _unquote(self, token):
+        try:
+            return json.loads(token[1])
+        except ValueError:
+            raise self._error('invalid string constant {}'.format(token[1]),
+                              token)
+
+    def parse(self):
+        tree = {
+            'includes': [],
+            'attributes': [],
+            'root_type': None,
+            'file_ident': None,
+            'file_ext': None,
+            'decls': [],
+        }  # type: Dict[str, Any]
+        decls = tree['decls']
+        while self._peek()[0] != 'eof':
+            token = self._next()
+            keyword = token[1] if token[0] == 'ident' else None
+            if keyword in ('include', 'native_include'):
+                name = self._string()
+                self._expect(';')
+                if keyword == 'include':
+                    tree['includes'].append(name)
+            elif keyword == 'namespace':
+                self._namespace = '' if self._is(';') else self._qualified()
+                self._expect(';')
+            elif keyword == 'attribute':
+                token = self._next()
+                if token[0] == 'string':
+                    tree['attributes'].append(self._unquote(token))
+                elif token[0] == 'ident':
+                    tree['attributes'].append(token[1])
+                else:
+                    raise self._error('expected attribute name', token)
+                self._expect(';')
+            elif keyword == 'root_type':
+                tree['root_type'] = (self._qualified(), self._namespace,
+                                     token[2])
+                self._expect(';')
+            elif keyword == 'file_identifier':
+                file_ident = self._string()
+                if len(file_ident.encode('utf8')) != 4:
+                    raise self._error(
+                        'file_identifier must be exactly 4 characters', token)
+                tree['file_ident'] = file_ident
+                self._expect(';')
+            elif keyword == 'file_extension':
+                tree['file_ext'] = self._string()
+                self._expect(';')
+            elif keyword in ('table', 'struct'):
+                decls.append(self._object(token))
+            elif keyword in ('enum', 'union'):
+                decls.append(self._enum(token))
+            elif keyword == 'rpc_service':
+                decls.append(self._service(token))
+            else:
+                raise self._error(
+                    'unexpected "{}" (expected a declaration)'.format(
+                        token[1]), token)
+        return tree
+
+    def _decl(self, token, name_token):
+        return {
+            'kind': token[1],
+            'name': name_token[1],
+            'namespace': self._namespace,
+            'docs': token[3],
+            'line': name_token[2],
+            'attrs': self._metadata(),
+        }
+
+    def _metadata(self):
+        # attributes as (key, value, line) in the order given, where the
+        # value of an attribute without a value is "0" (as with flatc)
+        attrs = []
+        if self._accept('('):
+            while True:
+                key = self._ident()
+                value = '0'
+                if self._accept(':'):
+                    token = self._next()
+                    if token[0] == 'string':
+                        value = self._unquote(token)
+                    elif token[0] in ('number', 'ident'):
+                        value = token[1]
+                    else:
+                        raise self._error(
+                            'expected attribute value instead of "{}"'.format(
+                                token[1] or 'end of file'), token)
+                attrs.append((key[1], value, key[2]))
+                if not self._accept(','):
+                    break
+            self._expect(')')
+        return attrs
+
+    def _type(self):
+        if self._accept('['):
+            element = self._type()
+            if self._accept(':'):
+                token = self._next()
+                if token[0] != 'number':
+                    raise self._error('expected array length', token)
+                self._expect(']')
+                return ('array', element, _int(token[1]))
+            self._expect(']')
+            return ('vector', element)
+        return ('name', self._qualified())
+
+    def _object(self, token):
+        decl = self._decl(token, self._ident())
+        fields = []
+        self._expect('{')
+        while not self._accept('}'):
+            name = self._ident()
+            self._expect(':')
+            field_type = self._type()
+            default = None
+            if self._accept('='):
+                default = self._next()[1]
+            fields.append({
+                'name': name[1],
+                'type': field_type,
+                'default': default,
+                'attrs': self._metadata(),
+                'docs': name[3],
+                'line': name[2],
+            })
+            self._expect(';')
+        decl['fields'] = fields
+        return decl
+
+    def _enum(self, token):
+        name = self._ident()
+        underlying = None
+        if token[1] == 'enum':
+            if not self._accept(':'):
+                raise self._error(
+                    'must specify the underlying integer type for enum "{}"'.
+                    format(name[1]), name)
+            underlying = self._ident()[1]
+        decl = self._decl(token, name)
+        decl['underlying'] = underlying
+        values = []
+        self._expect('{')
+        while not self._accept('}'):
+            start = self._peek()
+            if token[1] == 'union':
+                member = self._qualified()
+                if self._accept(':'):
+                    # aliased member "Alias: Type"
+                    value_name, member = member, self._qualified()
+                else:
+                    value_name = member.replace('.', '_')
+            else:
+                value_name, member = self._ident()[1], None
+            value = None
+            if self._accept('='):
+                number = self._next()
+                if number[0] != 'number':
+                    raise self._error('expected integer value', number)
+                value = number[1]
+            values.append({
+                'name': value_name,
+                'type': member,
+                'value': value,
+                'attrs': self._metadata(),
+                'docs': start[3],
+                'line': start[2],
+            })
+            if not self._accept(','):
+                self._expect('}')
+                break
+        decl['values'] = values
+        return decl
+
+    def _service(self, token):
+        decl = self._decl(token, self._ident())
+        calls = []
+        self._expect('{')
+        while not self._accept('}'):
+            name = self._ident()
+            self._expect('(')
+            request = self._qualified()
+            self._expect(')')
+            self._expect(':')
+            response = self._qualified()
+            calls.append({
+                'name': name[1],
+                'request': request,
+                'response': response,
+                'attrs': self._metadata(),
+                'docs': name[3],
+                'line': name[2],
+            })
+            self._expect(';')
+        decl['calls'] = calls
+        return decl
+
+
+def parse_fbs(text, filename='<string>'):
+    """
+    Parse a FlatBuffers schema source into its syntax tree.
+
+    The syntax tree consists of plain dicts, lists, tuples and scalars only,
+    and does not depend on any other file (includes are resolved when
+    building the schema, see :class:`FbsParser`).
+
+    :param text: The schema source.
+    :type text: str
+    :param filename: File name used in error messages.
+    :type filename: str
+
+    :returns: The syntax tree.
+    :rtype: dict
+    """
+    return _FileParser(text, filename).parse()
+
+
+def _attr_dict(attrs):
+    # as in loader.extract_attributes()
+    res = {}
+    for key, value, _ in attrs:
+        if key not in res:
+            res[key] = value if value not in ['0'] else None
+    return res
+
+
+def _attr(attrs, key):
+    # the raw value of an attribute (or None if not given)
+    for _key, value, _ in attrs:
+        if _key == key:
+            return value
+    return None
+
+
+def _align(size, align):
+    return (size + align - 1) & ~(align - 1)
+
+
+class _SchemaBuilder(object):
+    """
+    Builds the types of a schema (as in ``read_reflection_schema(buf)['types']``)
+    from the syntax trees of a schema source file and all files it includes.
+    """
+
+    def __init__(self, files):
+        self._decls = {}  # type: Dict[str, Any]
+        self._struct_layouts = {}  # type: Dict[str, Any]
+
+        attributes = set(_BUILTIN_ATTRIBUTES)
+        for _, tree in files:
+            attributes.update(tree['attributes'])
+
+        for filename, tree in files:
+            for decl in tree['decls']:
+                name = decl['name']
+                if decl['namespace']:
+                    name = decl['namespace'] + '.' + name
+                if name in self._decls:
+                    raise Exception('{}:{}: duplicate name "{}"'.format(
+                        filename, decl['line'], name))
+                self._decls[name] = (filename, decl)
+                for member in decl.get('fields', decl.get(
+                        'values', decl.get('calls', []))) + [decl]:
+                    for key, _, line in member['attrs']:
+                        if key not in attributes:
+                            raise Exception(
+                                '{}:{}: user defined attributes must be declared before use: "{}"'.
+                                format(filename, line, key))
+
+    def lookup(self, name, namespace, filename, line, kinds=None):
+        """
+        Resolve a type name used in a namespace to the qualified name of the
+        declaration, searching the namespace and then all enclosing ones.
+        """
+        parts = namespace.split('.') if namespace else []
+        for i in range(len(parts), -1, -1):
+            qualified = '.'.join(parts[:i] + [name])
+            if qualified in self._decls:
+                kind = self._decls[qualified][1]['kind']
+                if kinds and kind not in kinds:
+                    raise Exception(
+                        '{}:{}: "{}" is a {} (expected {})'.format(
+                            filename, line, qualified, kind,
+                            ' or '.join(kinds)))
+                return qualified
+        raise Exception('{}:{}: type referenced but not defined: "{}"'.format(
+            filename, line, name))
+
+    def build(self):
+        enums = []
+        objects = []
+        services = []
+        for name in sorted(self._decls):
+            kind = self._decls[name][1]['kind']
+            if kind in ('enum', 'union'):
+                enums.append(self._enum(name))
+            elif kind in ('table', 'struct'):
+                objects.append(self._object(name))
+            else:
+                services.append(self._service(name))
+
+        types = {}
+        for typedef in enums + objects + services:
+            typedef['hash'] = typedef_hash(typedef)
+            types[typedef['name']] = typedef
+        return types
+
+    def _enum_values(self, name):
+        # -> list of (value, name, docs) in declaration order
+        filename, decl = self._decls[name]
+        if decl['kind'] == 'enum':
+            underlying = _scalar(decl['underlying'])
+            if underlying not in _INTEGER_TYPES:
+                raise Exception(
+                    '{}:{}: underlying enum type must be integral: "{}"'.
+                    format(filename, decl['line'], decl['underlying']))
+            values = []
+        else:
+            values = [(0, 'NONE', [])]
+            for value in decl['values']:
+                self.lookup(value['type'], decl['namespace'], filename,
+                            value['line'], ('table', ))
+
+        bit_flags = _attr(decl['attrs'], 'bit_flags') is not None
+        next_value = len(values)
+        for value in decl['values']:
+            if value['value'] is not None:
+                next_value = _int(value['value'])
+            values.append((1 << next_value if bit_flags else next_value,
+                           value['name'], value['docs']))
+            next_value += 1
+        return values
+
+    def _enum(self, name):
+        filename, decl = self._decls[name]
+        values = self._enum_values(name)
+
+        enum = {
+            'type': 'enum',
+            'name': name,
+            'docs': decl['docs'],
+        }
+        if loader.EXTRACT_ATTRS_RAW:
+            enum['attr'] = _attr_dict(decl['attrs'])
+
+        enum_values_dict = dict()  # type: Dict[str, Any]
+        for _, value_name, docs in sorted(values, key=lambda v: v[0]):
+            if value_name in enum_values_dict:
+                raise Exception(
+                    'duplicate enum value "{}"'.format(value_name))
+            enum_values_dict[value_name] = {'docs': docs}
+        enum['values'] = enum_values_dict
+
+        return enum
+
+    def _field_type(self, field_type, namespace, filename, line):
+        # -> (base_type, element_type, ref_category, ref_type)
+        kind = field_type[0]
+        if kind == 'array':
+            raise Exception(
+                '{}:{}: fixed-length arrays are not supported'.format(
+                    filename, line))
+        elif kind == 'vector':
+            if field_type[1][0] != 'name':
+                raise Exception(
+                    '{}:{}: nested vector types not supported'.format(
+                        filename, line))
+            element, _, ref_category, ref_type = self._field_type(
+                field_type[1], namespace, filename, line)
+            return 'vector', element, ref_category, ref_type
+
+        name = field_type[1]
+        scalar = _scalar(name)
+        if scalar:
+            return scalar, None, None, None
+        elif name == 'string':
+            return 'string', None, None, None
+
+        ref_type = self.lookup(name, namespace, filename, line,
+                               ('enum', 'union', 'table', 'struct'))
+        decl = self._decls[ref_type][1]
+        if decl['kind'] == 'enum':
+            return _scalar(decl['underlying']), None, 'enum', ref_type
+        elif decl['kind'] == 'union':
+            return 'union', None, 'union', ref_type
+        else:
+            return 'object', None, decl['kind'], ref_type
+
+    def _field_default(self, field, base_type, ref_category, ref_type,
+                       filename):
+        # -> schema default of a scalar (or enum) field, or None if zero (as
+        # with the loader)
+        value = field['default']
+        if value is None or value == 'null' or base_type not in _SCALAR_SIZES:
+            return None
+        if ref_category == 'enum':
+            for enum_value, enum_value_name, _ in self._enum_values(ref_type):
+                if value == enum_value_name:
+                    return enum_value or None
+        try:
+            if base_type in ('float', 'double'):
+                return float(value) or None
+            elif base_type == 'bool' and value in ('true', 'false'):
+                return 1 if value == 'true' else None
+            return _int(value) or None
+        except ValueError:
+            raise Exception('{}:{}: invalid default value "{}" of field "{}"'.
+                            format(filename, field['line'], value,
+                                   field['name']))
+
+    def _struct_layout(self, name, stack=()):
+        # -> (minalign, bytesize, offsets of fields in declaration order)
+        layout = self._struct_layouts.get(name, None)
+        if layout is None:
+            if name in stack:
+                raise Exception('recursive struct "{}"'.format(name))
+            filename, decl = self._decls[name]
+            minalign = 1
+            bytesize = 0
+            offsets = []
+            for field in decl['fields']:
+                base_type, _, ref_category, ref_type = self._field_type(
+                    field['type'], decl['namespace'], filename, field['line'])
+                if ref_category == 'struct':
+                    align, size, _ = self._struct_layout(
+                        ref_type, stack + (name, ))
+                elif base_type in _SCALAR_SIZES:
+                    align = size = _SCALAR_SIZES[base_type]
+                else:
+                    raise Exception(
+                        '{}:{}: structs may contain only scalar or struct fields'.
+                        format(filename, field['line']))
+                bytesize = _align(bytesize, align)
+                offsets.append(bytesize)
+                bytesize += size
+                minalign = max(minalign, align)
+
+            force_align = _attr(decl['attrs'], 'force_align')
+            if force_align:
+                force_align = _int(force_align)
+                if force_align < minalign or force_align & (force_align - 1):
+                    raise Exception(
+                        '{}:{}: force_align must be a power of two not smaller than {}'.
+                        format(filename, decl['line'], minalign))
+                minalign = force_align
+
+            layout = (minalign, _align(bytesize, minalign), offsets)
+            self._struct_layouts[name] = layout
+        return layout
+
+    def _field_ids(self, decl, filename):
+        # -> list of ids in declaration order (a union field takes two: the
+        # type field "<name>_type" and the value)
+        fields = decl['fields']
+        explicit = [_attr(field['attrs'], 'id') for field in fields]
+        if not any(explicit):
+            return list(range(len(fields)))
+        if not all(explicit):
+            raise Exception(
+                '{}:{}: either all fields or no fields must have an "id" attribute'.
+                format(filename, decl['line']))
+        return [_int(field_id) for field_id in explicit]
+
+    def _object(self, name):
+        filename, decl = self._decls[name]
+        is_struct = decl['kind'] == 'struct'
+
+        obj = {
+            'type': decl['kind'],
+            'name': name,
+            'docs': decl['docs'],
+        }
+        if loader.EXTRACT_ATTRS_RAW:
+            obj['attr'] = _attr_dict(decl['attrs'])
+
+        if is_struct:
+            minalign, bytesize, offsets = self._struct_layout(name)
+            ids = list(range(len(decl['fields'])))
+        else:
+            ids = self._field_ids(decl, filename)
+
+        fields_by_name = {}
+        for j, field in enumerate(decl['fields']):
+            field_name = field['name']
+            base_type, element, ref_category, ref_type = self._field_type(
+                field['type'], decl['namespace'], filename, field['line'])
+
+            # as with the loader: unions and vectors of enums are unsupported
+            vector_of_enums = ref_category == 'enum' and base_type == 'vector'
+            if ref_category == 'union' or vector_of_enums:
+                raise Exception('unhandled field type: {} {} {} {}'.format(
+                    field_name, base_type, element, ref_type))
+
+            field_id = ids[j]
+            res = {
+                'name': field_name,
+                'id': field_id,
+                'offset': offsets[j] if is_struct else 4 + 2 * field_id,
+                'base_type': base_type,
+            }
+            if element:
+                res['element_type'] = element
+            default = self._field_default(field, base_type, ref_category,
+                                          ref_type, filename)
+            if default is not None and not is_struct:
+                res['default'] = default
+            if ref_category:
+                res['ref_category'] = ref_category
+                res['ref_type'] = ref_type
+            if field['docs']:
+                res['docs'] = field['docs']
+            if loader.EXTRACT_ATTRS_RAW:
+                attrs = _attr_dict(field['attrs'])
+                if attrs:
+                    res['attr'] = attrs
+
+            if field_name in fields_by_name:
+                raise Exception('{}:{}: field already exists: "{}"'.format(
+                    filename, field['line'], field_name))
+            fields_by_name[field_name] = res
+
+        if not is_struct and sorted(ids) != list(range(len(ids))):
+            raise Exception(
+                '{}:{}: field ids of "{}" must be consecutive from 0'.format(
+                    filename, decl['line'], name))
+
+        obj['fields'] = {k: fields_by_name[k] for k in sorted(fields_by_name)}
+
+        if is_struct:
+            obj['minalign'] = minalign
+            obj['bytesize'] = bytesize
+
+        return obj
+
+    def _decode_type(self, name, namespace, filename, line):
+        res = self.lookup(name, namespace, filename, line,
+                          ('table', 'struct'))
+        if res in ['Void', 'wamp.Void']:
+            res = None
+        return res
+
+    def _service(self, name):
+        filename, decl = self._decls[name]
+
+        service_attrs_dict = _attr_dict(decl['attrs'])
+        for attr in service_attrs_dict:
+            if attr not in INTERFACE_ATTRS:
+                raise Exception(
+                    'invalid XBR attribute  "{}" - must be one of {}'.format(
+                        attr, INTERFACE_ATTRS))
+
+        service_type = service_attrs_dict.get('type', None)
+        if service_type != 'interface':
+            raise Exception(
+                'invalid value "{}" for attribute "type" in XBR interface'.format(
+                    service_type))
+
+        service = {
+            'type': service_type,
+            'name': name,
+            'docs': decl['docs'],
+        }
+
+        if loader.EXTRACT_ATTRS_RAW:
+            service['attrs'] = service_attrs_dict
+        else:
+            service['uuid'] = service_attrs_dict.get('uuid', None)
+
+        calls_by_name = {}
+        for _call in decl['calls']:
+            call_attrs_dict = _attr_dict(_call['attrs'])
+
+            call_type = call_attrs_dict.get('type', None)
+            if call_type not in INTERFACE_MEMBER_TYPES:
+                raise Exception(
+                    'invalid XBR interface member type "{}" - must be one of {}'.
+                    format(call_type, INTERFACE_MEMBER_TYPES))
+
+            call_stream = call_attrs_dict.get('stream', None)
+            if call_stream in ['none', 'None', 'null', 'Null']:
+                call_stream = None
+
+            if call_stream not in INTERFACE_MEMBER_STREAM_VALUES:
+                raise Exception(
+                    'invalid XBR interface member stream modifier "{}" - must be one of {}'.
+                    format(call_stream, INTERFACE_MEMBER_STREAM_VALUES))
+
+            if _call['name'] in calls_by_name:
+                raise Exception('{}:{}: rpc method already exists: "{}"'.format(
+                    filename, _call['line'], _call['name']))
+
+            calls_by_name[_call['name']] = {
+                'type': call_type,
+                'name': _call['name'],
+                'in': self._decode_type(_call['request'], decl['namespace'],
+                                        filename, _call['line']),
+                'out': self._decode_type(_call['response'],
+                                         decl['namespace'], filename,
+                                         _call['line']),
+                'stream': call_stream,
+                'docs': _call['docs'],
+            }
+
+        service['slots'] = calls_by_name
+
+        return service
+
+
+class FbsParser(object):
+    """
+    Pure Python front end for FlatBuffers schema source files (.fbs), which
+    produces the same schema as compiling the file with ``flatc`` and reading
+    the binary schema with :func:`cbsh.idl.loader.read_reflection_schema`.
+
+    The syntax tree of every file read (the including and the included ones)
+    is cached by the SHA256 of the file contents, both in memory and
+    (optionally) in a :class:`cbsh.idl.cache.SchemaCache`. Reading a schema
+    again after editing one file only parses that file again, while the types
+    are always rebuilt from the syntax trees.
+    """
+
+    def __init__(self, include_paths=None, cache=None, log=None):
+        """
+
+        :param include_paths: Directories to search for included files (after
+            the directory of the including file).
+        :type include_paths: list of str
+        :param cache: Optional cache for the syntax trees.
+        :type cache: :class:`cbsh.idl.cache.SchemaCache`
+        """
+        self.log = log or txaio.make_logger()
+        self._include_paths = [
+            os.path.abspath(path) for path in (include_paths or [])
+        ]
+        self._cache = cache
+
+        # file path -> (content key, syntax tree)
+        self._trees = {}  # type: Dict[str, Any]
+
+        # file path -> paths of all files read for the schema of the file
+        self._files = {}  # type: Dict[str, Any]
+
+        # number of files actually parsed (ie not found in any cache)
+        self.parsed = 0
+
+    def __str__(self):
+        return u'FbsParser(include_paths={}, files={}, parsed={})'.format(
+            self._include_paths, len(self._trees), self.parsed)
+
+    def parse_file(self, filename):
+        """
+        Get the syntax tree of a schema source file (see :func:`parse_fbs`).
+
+        :param filename: Path of the file.
+        :type filename: str
+
+        :returns: The syntax tree.
+        :rtype: dict
+        """
+        filename = os.path.abspath(filename)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        key = 'fbs-' + hashlib.sha256(_KEY_PREFIX + data).hexdigest()
+
+        entry = self._trees.get(filename, None)
+        if entry and entry[0] == key:
+            return entry[1]
+
+        tree = None
+        if self._cache:
+            tree = self._cache.get(key)
+            if tree:
+                self.log.debug('parse cache hit for {} ({})'.format(
+                    filename, key))
+
+        if tree is None:
+            tree = parse_fbs(data.decode('utf8'), filename)
+            self.parsed += 1
+            if self._cache:
+                self._cache.put(key, tree)
+
+        self._trees[filename] = (key, tree)
+        return tree
+
+    def _find_include(self, name, includer):
+        for directory in [os.path.dirname(includer)
+                          ] + self._include_paths + [os.getcwd()]:
+            path = os.path.normpath(os.path.join(directory, name))
+            if os.path.isfile(path):
+                return path
+        raise Exception('{}: unable to locate include file "{}"'.format(
+            includer, name))
+
+    def dependencies(self, filename):
+        """
+        Paths of all files read for the last schema read from a file (the
+        file itself and everything it includes, transitively).
+
+        :param filename: Path of the file.
+        :type filename: str
+
+        :returns: The file paths (empty if no schema was read from the file).
+        :rtype: list of str
+        """
+        return self._files.get(os.path.abspath(filename), [])
+
+    def read_schema(self, filename):
+        """
+        Read a schema source file and all files it includes.
+
+        :param filename: Path of the schema source file.
+        :type filename: str
+
+        :returns: The schema (as returned by
+            :func:`cbsh.idl.loader.read_reflection_schema`, but without the
+            ``bfbs_size`` and ``bfbs_sha256`` of a binary schema).
+        :rtype: dict
+        """
+        filename = os.path.abspath(filename)
+
+        # files in include order (every file is included once)
+        files = []
+        seen = set()
+
+        def visit(path):
+            seen.add(path)
+            tree = self.parse_file(path)
+            for name in tree['includes']:
+                included = self._find_include(name, path)
+                if included not in seen:
+                    visit(included)
+            files.append((path, tree))
+
+        visit(filename)
+        self._files[filename] = [path for path, _ in files]
+
+        builder = _SchemaBuilder(files)
+        types = builder.build()
+
+        tree = files[-1][1]
+        root_name = None
+        if tree['root_type']:
+            root_type, namespace, line = tree['root_type']
+            root_name = builder.lookup(root_type, namespace, filename, line,
+                                       ('table', ))
+
+        self.log.debug('{} definitions read from {} files'.format(
+            len(types), len(files)))
+
+        return {
+            'meta': {
+                'bfbs_size': None,
+                'bfbs_sha256': None,
+                'file_ident': tree['file_ident'],
+                'file_ext': tree['file_ext'],
+                'root': root_name,
+            },
+            'types': types,
+        }
+
+
+def read_fbs_schema_file(filename, include_paths=None, cache=None, log=None):
+    """
+    Read a FlatBuffers schema source file (.fbs), see :class:`FbsParser`.
+
+    :param filename: Path of the schema source file.
+    :type filename: str
+    :param include_paths: Directories to search for included files.
+    :type include_paths: list of str
+    :param cache: Optional cache for the syntax trees of all files read.
+    :type cache: :class:`cbsh.idl.cache.SchemaCache`
+
+    :returns: The extracted schema.
+    :rtype: dict
+    """
+    return FbsParser(include_paths, cache=cache, log=log).read_schema(filename)
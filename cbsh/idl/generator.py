@@ -32,14 +32,23 @@ import argparse
 import json
 import pprint
 import os
+import sys
+import time
+import multiprocessing
+import concurrent.futures
 
-from docutils.core import publish_parts
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from markupsafe import Markup
 
 import txaio
 txaio.use_asyncio()
 
 from cbsh.util import hl
+from cbsh.idl.rst import RstRenderer
+from cbsh.idl.loader import atomic_output
+from cbsh.idl.deps import DepsManifest, track_schema, schema_deps
+from cbsh.idl.npview import struct_dtype, struct_vector_fields
+from cbsh.idl.codec import codec_types
 
 
 
@@ -47,12 +56,52 @@ from cbsh.util import hl
 
 # <div class="content">{{ article.body|rst }}</div>
 
-import jinja2
-import docutils
+# renderer (and cache) for the rst filter, see enable_rst_disk_cache()
+_rst_renderer = RstRenderer()
+_rst_cache_dir = None
+
+
+def enable_rst_disk_cache(cache_dir=None):
+    """
+    Persist the HTML rendered by the rst filter in a disk cache
+    (default: ``~/.cbf/rst-cache``), see :class:`cbsh.idl.rst.RstRenderer`.
+    """
+    global _rst_renderer, _rst_cache_dir
+    _rst_renderer = RstRenderer(cache_dir, disk_cache=True)
+    _rst_cache_dir = cache_dir or RstRenderer.DEFAULT_CACHE_DIR
+
 
 def rst_filter(rst):
-    html = docutils.core.publish_parts(source=rst, writer_name='html')['html_body']
-    return jinja2.Markup(html)
+    return Markup(_rst_renderer.render(rst))
+
+
+def _iter_docs(schema):
+    for typedef in schema['types'].values():
+        yield typedef.get('docs', None)
+        for key in ['fields', 'values', 'slots']:
+            members = typedef.get(key, None)
+            if members:
+                for member in members.values():
+                    yield member.get('docs', None)
+
+
+def prerender_docs(schema):
+    """
+    Render the docs of all definitions and their members (fields, enum values
+    and slots) of a schema for the rst filter, in one batch.
+
+    Docs are rendered as the documentation lines joined by newlines, which is
+    what ``{{ docs|join('\\n')|rst }}`` in a template then gets from the cache.
+
+    :param schema: The schema (as returned by the schema loader).
+    :type schema: dict
+
+    :returns: Number of (distinct) doc fragments.
+    :rtype: int
+    """
+    texts = set('\n'.join(docs) for docs in _iter_docs(schema) if docs)
+    _rst_renderer.render_batch(sorted(texts))
+    return len(texts)
 
 
 
@@ -66,29 +115,383 @@ def rst_filter(rst):
 # 2. render set of target files, computed by individual template files
 #
 
-def process(schema, template_paths=['templates', 'tests/idl']):
-    # http://jinja.pocoo.org/docs/latest/api/#loaders
-    loader = FileSystemLoader(template_paths, encoding='utf-8', followlinks=False)
+# templates shipped with cbsh (eg "numpy.meta" for NumPy struct vector views)
+BUILTIN_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+DEFAULT_TEMPLATE_PATHS = ['templates', 'tests/idl', BUILTIN_TEMPLATE_PATH]
 
-    env = Environment(loader=loader)
-    env.filters['rst'] = rst_filter
+DEFAULT_META_TEMPLATE = 'main.meta'
 
-    tmpl = env.get_template('example.rst')
+# number of template output chunks buffered when streaming a target file
+STREAM_BUFFER_SIZE = 256
 
-    print(tmpl)
+DEFAULT_BYTECODE_CACHE_DIR = u'~/.cbf/jinja-cache'
 
-    contents = tmpl.render(schema=schema)
+# template environments by (template paths, bytecode cache directory)
+_ENVIRONMENTS = {}
 
-    print(contents)
+
+def get_environment(template_paths=None, bytecode_cache_dir=None, bytecode_cache=True):
+    """
+    Get the (memoized) Jinja2 environment for a set of template folders.
+
+    Templates loaded from the environment are compiled only once per process
+    (and recompiled when their mtime changes). With the bytecode cache enabled,
+    compiled templates are also persisted on disk (keyed by template path and
+    checked against the template source), so that repeated generator runs skip
+    template compilation altogether.
+
+    :param template_paths: Template folders to load templates from.
+    :type template_paths: list of str
+    :param bytecode_cache_dir: Bytecode cache directory, created if it does not
+        yet exist (default: ``~/.cbf/jinja-cache``).
+    :type bytecode_cache_dir: str
+    :param bytecode_cache: Enable the persistent bytecode cache.
+    :type bytecode_cache: bool
+
+    :rtype: :class:`jinja2.Environment`
+    """
+    template_paths = tuple(
+        os.path.abspath(path)
+        for path in (template_paths or DEFAULT_TEMPLATE_PATHS))
+
+    if bytecode_cache:
+        bytecode_cache_dir = os.path.abspath(
+            os.path.expanduser(bytecode_cache_dir or DEFAULT_BYTECODE_CACHE_DIR))
+    else:
+        bytecode_cache_dir = None
+
+    key = (template_paths, bytecode_cache_dir)
+    env = _ENVIRONMENTS.get(key, None)
+    if env is None:
+        # http://jinja.pocoo.org/docs/latest/api/#loaders
+        loader = FileSystemLoader(template_paths, encoding='utf-8', followlinks=False)
+
+        bcc = None
+        if bytecode_cache_dir:
+            if not os.path.isdir(bytecode_cache_dir):
+                os.makedirs(bytecode_cache_dir)
+            bcc = FileSystemBytecodeCache(bytecode_cache_dir)
+
+        env = Environment(loader=loader, bytecode_cache=bcc)
+        env.filters['rst'] = rst_filter
+        env.globals['struct_dtype'] = struct_dtype
+        env.globals['struct_vector_fields'] = struct_vector_fields
+        env.globals['codec_types'] = codec_types
+
+        _ENVIRONMENTS[key] = env
+
+    return env
+
+
+def precompile_templates(template_paths=None, bytecode_cache_dir=None):
+    """
+    Compile all templates in a set of template folders into the bytecode cache
+    ahead of time.
+
+    :param template_paths: Template folders to compile.
+    :type template_paths: list of str
+    :param bytecode_cache_dir: Bytecode cache directory.
+    :type bytecode_cache_dir: str
+
+    :returns: Names of the templates compiled.
+    :rtype: list of str
+    """
+    env = get_environment(template_paths, bytecode_cache_dir)
+
+    # skip hidden files (eg editor swap files)
+    names = env.list_templates(
+        filter_func=lambda name: not os.path.basename(name).startswith('.'))
+    for name in names:
+        env.get_template(name)
+    return names
+
+
+def plan_targets(schema, env, meta_template=DEFAULT_META_TEMPLATE):
+    """
+    Compute the set of target files to generate (step 1).
+
+    The meta template is rendered with the schema, and must output one line
+    per target file::
+
+        <target file> <source template> [<qualified type name>]
+
+    Empty lines and lines starting with ``#`` are ignored. Target files are
+    relative to the output directory.
+
+    :param schema: The schema (as returned by the schema loader).
+    :type schema: dict
+    :param env: The template environment.
+    :type env: :class:`jinja2.Environment`
+    :param meta_template: Name of the meta template.
+    :type meta_template: str
+
+    :returns: List of ``(target, template, type_name)`` tuples.
+    :rtype: list of tuple
+    """
+    lines = env.get_template(meta_template).render(schema=schema).splitlines()
+
+    targets = []
+    seen = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.split()
+        if len(parts) not in [2, 3]:
+            raise Exception('invalid target line "{}" in meta template "{}"'.format(
+                line, meta_template))
+        target, template = parts[0], parts[1]
+        type_name = parts[2] if len(parts) == 3 else None
+        if os.path.isabs(target) or '..' in target.replace('\\', '/').split('/'):
+            raise Exception('invalid target file "{}" (must be within the output directory)'.format(target))
+        if target in seen:
+            raise Exception('duplicate target file "{}"'.format(target))
+        if type_name is not None and type_name not in schema['types']:
+            raise Exception('no type "{}" for target file "{}"'.format(type_name, target))
+        seen.add(target)
+        targets.append((target, template, type_name))
+    return targets
+
+
+def render_target(env, schema, outdir, target, template, type_name=None):
+    """
+    Render one target file (step 2), and write it atomically.
+
+    The output is streamed to the file in buffered chunks as it is rendered,
+    so that memory stays bounded however large the target file gets.
+
+    The template is rendered with ``schema``, ``target`` (the target file)
+    and ``type`` (the definition named in the target line, if any).
+
+    :returns: Path of the written target file.
+    :rtype: str
+    """
+    tmpl = env.get_template(template)
+
+    context = {'schema': schema, 'target': target}
+    if type_name is not None:
+        context['type'] = schema['types'][type_name]
+
+    path = os.path.join(outdir, target)
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname, exist_ok=True)
+
+    stream = tmpl.stream(**context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    with atomic_output(path) as f:
+        stream.dump(f)
+
+    return path
+
+
+# state of generator worker processes, see _init_worker()
+_worker_state = None
+
+
+def _init_worker(schema, template_paths, bytecode_cache, outdir, rst_cache_dir,
+                 track):
+    global _worker_state
+    if rst_cache_dir:
+        enable_rst_disk_cache(rst_cache_dir)
+    env = get_environment(template_paths, bytecode_cache=bytecode_cache)
+    _worker_state = (env, schema, outdir, track)
+
+
+def _render_worker(target):
+    env, schema, outdir, track = _worker_state
+    started = time.perf_counter()
+    if track:
+        tracked = track_schema(schema)
+        path = render_target(env, tracked, outdir, *target)
+        deps = schema_deps(schema, tracked)
+    else:
+        path = render_target(env, schema, outdir, *target)
+        deps = None
+
+    # docs rendered (lazily, by the rst filter) go back to the parent
+    # process, which writes them to the disk cache
+    rendered = _rst_renderer.take_rendered() if _rst_cache_dir else None
+
+    return target, path, time.perf_counter() - started, deps, rendered
+
+
+def process(schema,
+            template_paths=None,
+            outdir='.',
+            meta_template=DEFAULT_META_TEMPLATE,
+            max_workers=None,
+            bytecode_cache=True,
+            on_rendered=None,
+            incremental=False):
+    """
+    Generate target files from a schema, in two steps: the meta template
+    computes the set of target files (see :func:`plan_targets`), and then
+    every target file is rendered from its template (see :func:`render_target`).
+
+    Target files are rendered in parallel by a pool of worker processes,
+    forked from this process after the worker state (schema and template
+    environment) is set up, so that they inherit it instead of receiving the
+    schema with every target file.
+
+    In incremental mode, the definitions (by content hash) and templates (by
+    mtime and hash) every target file depends on are recorded in a manifest
+    in the output directory (see :class:`cbsh.idl.deps.DepsManifest`), and
+    only target files with changed dependencies are rendered again. Target
+    files no longer planned are removed.
+
+    :param schema: The schema (as returned by the schema loader).
+    :type schema: dict
+    :param template_paths: Template folders.
+    :type template_paths: list of str
+    :param outdir: Output directory.
+    :type outdir: str
+    :param meta_template: Name of the meta template.
+    :type meta_template: str
+    :param max_workers: Maximum number of worker processes (default: number of
+        CPUs). With ``1``, target files are rendered in this process.
+    :type max_workers: int
+    :param bytecode_cache: Use the template bytecode cache.
+    :type bytecode_cache: bool
+    :param on_rendered: Optional callback ``on_rendered(path, duration)`` fired
+        for every target file written.
+    :type on_rendered: callable
+    :param incremental: Only render target files with changed dependencies.
+    :type incremental: bool
+
+    :returns: Paths of the target files written.
+    :rtype: list of str
+    """
+    env = get_environment(template_paths, bytecode_cache=bytecode_cache)
+
+    targets = plan_targets(schema, env, meta_template)
+
+    manifest = None
+    todo = targets
+    if incremental:
+        manifest = DepsManifest(outdir, {
+            'template_paths': list(env.loader.searchpath),
+            'meta_template': meta_template,
+        })
+        manifest.load()
+
+        # check all targets before recording any
+        todo = [
+            target for target in targets
+            if manifest.is_outdated(env, schema, outdir, *target)
+        ]
+
+        planned = set(target[0] for target in targets)
+        for target in sorted(manifest.targets.keys()):
+            if target not in planned:
+                path = os.path.join(outdir, target)
+                if os.path.exists(path):
+                    os.remove(path)
+                del manifest.targets[target]
+
+    # compile all templates (and render all docs) once, before starting
+    # the workers, which then get them from the caches
+    for template in set(target[1] for target in todo):
+        env.get_template(template)
+    if todo and 2 * len(todo) >= len(targets):
+        prerender_docs(schema)
+        _rst_renderer.flush()
+
+    def collect(results):
+        paths = []
+        for target, path, duration, deps, rendered in results:
+            paths.append(path)
+            if rendered:
+                _rst_renderer.merge(rendered)
+            if manifest:
+                manifest.record(env, *target, deps=deps)
+            if on_rendered:
+                on_rendered(path, duration)
+        return paths
+
+    max_workers = max_workers or os.cpu_count() or 1
+    try:
+        # the worker processes are forked after the worker state is set
+        # (the pool starts them on the first task)
+        _init_worker(schema, template_paths, bytecode_cache, outdir, None,
+                     incremental)
+        if max_workers == 1 or len(todo) < 2:
+            paths = collect(map(_render_worker, todo))
+        else:
+            chunksize = max(1, len(todo) // (4 * max_workers))
+            kwargs = {}
+            if multiprocessing.get_start_method() != 'fork':
+                # worker processes not forked do not inherit the worker state
+                # (the initializer is available from Python 3.7 on)
+                kwargs = {
+                    'initializer': _init_worker,
+                    'initargs': (schema, template_paths, bytecode_cache,
+                                 outdir, _rst_cache_dir, incremental),
+                }
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=max_workers, **kwargs) as executor:
+                paths = collect(
+                    executor.map(_render_worker, todo, chunksize=chunksize))
+    finally:
+        # also keep the docs rendered for the targets written so far
+        _rst_renderer.flush()
+
+    if manifest:
+        manifest.save()
+
+    return paths
 
 
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        'infile', help='FlatBuffers JSON schema input file (.json)')
+        'infile', nargs='?', help='FlatBuffers JSON schema input file (.json)')
     parser.add_argument(
-        '-t', '--templates', help='Templates folder')
+        '-t',
+        '--templates',
+        action='append',
+        help='Templates folder (can be given multiple times, default: {}).'.
+        format(', '.join(DEFAULT_TEMPLATE_PATHS)))
+    parser.add_argument(
+        '-o',
+        '--outdir',
+        default='.',
+        help='Output directory for generated files (default: current directory).')
+    parser.add_argument(
+        '-m',
+        '--meta',
+        default=DEFAULT_META_TEMPLATE,
+        help='Meta template computing the target files (default: {}).'.format(
+            DEFAULT_META_TEMPLATE))
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=None,
+        help='Number of worker processes (default: number of CPUs).')
+    parser.add_argument(
+        '-i',
+        '--incremental',
+        action='store_true',
+        help='Only regenerate files whose schema types or templates changed '
+        '(dependencies are recorded in {} in the output directory).'.format(
+            DepsManifest.FILENAME))
+    parser.add_argument(
+        '--no-bytecode-cache',
+        action='store_true',
+        help='Do not use (or update) the template bytecode cache in {}.'.format(
+            DEFAULT_BYTECODE_CACHE_DIR))
+    parser.add_argument(
+        '--rst-cache',
+        action='store_true',
+        help='Cache HTML rendered from reStructuredText docs on disk in {}.'.
+        format(RstRenderer.DEFAULT_CACHE_DIR))
+    parser.add_argument(
+        '--precompile',
+        action='store_true',
+        help='Compile all templates into the bytecode cache and exit.')
     parser.add_argument(
         '-v',
         '--verbose',
@@ -102,6 +505,17 @@ if __name__ == '__main__':
     log = txaio.make_logger()
     txaio.start_logging(level='debug' if options.debug else 'info')
 
+    if options.precompile:
+        names = precompile_templates(options.templates)
+        log.info('{} templates compiled into bytecode cache.'.format(len(names)))
+        sys.exit(0)
+
+    if options.rst_cache:
+        enable_rst_disk_cache()
+
+    if not options.infile:
+        parser.error('the following arguments are required: infile')
+
     infile_path = os.path.abspath(options.infile)
     with open(infile_path, 'rb') as f:
         buf = f.read()
@@ -110,7 +524,7 @@ if __name__ == '__main__':
         len(buf)))
 
     try:
-        schema = json.loads(buf, encoding='utf8')
+        schema = json.loads(buf.decode('utf8'))
     except Exception as e:
         log.error(e)
 
@@ -127,4 +541,18 @@ if __name__ == '__main__':
                 for s in o['slots'].values():
                     log.info('{:>12}: {}'.format(s['type'], hl(s['name'])))
 
-    process(schema)
+    def on_rendered(path, duration):
+        log.info('{:>10.1f} ms: {}'.format(1000. * duration, path))
+
+    started = time.perf_counter()
+    paths = process(
+        schema,
+        options.templates,
+        outdir=options.outdir,
+        meta_template=options.meta,
+        max_workers=options.jobs,
+        bytecode_cache=not options.no_bytecode_cache,
+        on_rendered=on_rendered if options.verbose else None,
+        incremental=options.incremental)
+    log.info('Generated {} files in {:.1f} ms.'.format(
+        len(paths), 1000. * (time.perf_counter() - started)))
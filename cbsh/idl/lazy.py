@@ -0,0 +1,327 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+import struct
+import hashlib
+
+import txaio
+
+from cbsh.idl.accessor import Schema
+from cbsh.idl.loader import (SchemaIndex, extract_schema_meta, extract_enum,
+                             extract_object, extract_service, typedef_hash)
+
+__all__ = ('LazySchema', )
+
+#
+# Raw hashing of definitions: the members of the reflection tables making up a
+# definition are hashed straight from the buffer, without decoding them. Only
+# member values are hashed (not offsets), so that the hash of a definition does
+# not depend on where the definition (or any vtable shared with other
+# definitions) is located in the buffer. Type references (indexes into the
+# enums and objects vectors) are hashed by the name of the referenced type.
+#
+
+_UOFFSET = struct.Struct('<I')
+_SOFFSET = struct.Struct('<i')
+_VOFFSET = struct.Struct('<H')
+_INT = struct.Struct('<i')
+
+# reflection base type ID of tables and structs
+_OBJ = 15
+
+# kinds of (non-scalar) table members; scalar members are given by their size
+_STRING = 'string'
+_STRINGS = 'strings'
+_TYPE = 'type'
+_OBJECT_NAME = 'object_name'
+
+# members hashed of the reflection tables (see reflection.fbs), by vtable slot
+_KEYVALUE = ((0, _STRING), (1, _STRING))
+_ATTRIBUTES = ('tables', _KEYVALUE)
+_FIELD = ((0, _STRING), (1, _TYPE), (2, 2), (3, 2), (4, 8), (5, 8), (6, 1),
+          (7, 1), (8, 1), (9, _ATTRIBUTES), (10, _STRINGS))
+_OBJECT = ((0, _STRING), (1, ('tables', _FIELD)), (2, 1), (3, 4), (4, 4),
+           (5, _ATTRIBUTES), (6, _STRINGS))
+_ENUMVAL = ((0, _STRING), (1, 8), (2, _OBJECT_NAME), (3, _TYPE), (4, _STRINGS))
+_ENUM = ((0, _STRING), (1, ('tables', _ENUMVAL)), (2, 1), (3, _TYPE),
+         (4, _ATTRIBUTES), (5, _STRINGS))
+_RPCCALL = ((0, _STRING), (1, _OBJECT_NAME), (2, _OBJECT_NAME),
+            (3, _ATTRIBUTES), (4, _STRINGS))
+_SERVICE = ((0, _STRING), (1, ('tables', _RPCCALL)), (2, _ATTRIBUTES),
+            (3, _STRINGS))
+
+
+class _RawHasher(object):
+    """
+    Hashes definitions straight from the buffer (see above).
+    """
+
+    __slots__ = ('_buf', '_index', '_vtables', '_parts')
+
+    def __init__(self, buf, index):
+        self._buf = buf
+        self._index = index
+
+        # vtables (as tuples of uint16) by position in the buffer
+        self._vtables = {}
+
+        self._parts = None
+
+    def hash(self, kind, pos, spec):
+        self._parts = [bytes([kind])]
+        self._table(pos, spec)
+        return hashlib.sha256(b''.join(self._parts)).hexdigest()
+
+    def _vtable(self, pos):
+        buf = self._buf
+        vt_pos = pos - _SOFFSET.unpack_from(buf, pos)[0]
+        vt = self._vtables.get(vt_pos, None)
+        if vt is None:
+            vt_size = _VOFFSET.unpack_from(buf, vt_pos)[0]
+            vt = struct.unpack_from('<{}H'.format(vt_size // 2), buf, vt_pos)
+            self._vtables[vt_pos] = vt
+        return vt
+
+    def _table(self, pos, spec):
+        buf = self._buf
+        parts = self._parts
+        vt = self._vtable(pos)
+        vt_len = len(vt)
+        for slot, kind in spec:
+            # skip vtable size and table size
+            i = slot + 2
+            offset = vt[i] if i < vt_len else 0
+            if not offset:
+                parts.append(b'-')
+                continue
+            parts.append(b'+')
+            at = pos + offset
+            if kind.__class__ is int:
+                parts.append(buf[at:at + kind])
+            elif kind is _STRING:
+                self._string(at)
+            elif kind is _TYPE:
+                self._type(at + _UOFFSET.unpack_from(buf, at)[0])
+            elif kind is _OBJECT_NAME:
+                # the name (required) of the referenced object
+                at += _UOFFSET.unpack_from(buf, at)[0]
+                self._string(at + self._vtable(at)[2])
+            else:
+                # vector of strings or tables
+                at += _UOFFSET.unpack_from(buf, at)[0]
+                n = _UOFFSET.unpack_from(buf, at)[0]
+                parts.append(buf[at:at + 4])
+                for item_at in range(at + 4, at + 4 + 4 * n, 4):
+                    if kind is _STRINGS:
+                        self._string(item_at)
+                    else:
+                        self._table(
+                            item_at + _UOFFSET.unpack_from(buf, item_at)[0],
+                            kind[1])
+
+    def _string(self, at):
+        # length prefix and string data
+        buf = self._buf
+        at += _UOFFSET.unpack_from(buf, at)[0]
+        self._parts.append(buf[at:at + 4 + _UOFFSET.unpack_from(buf, at)[0]])
+
+    def _type(self, pos):
+        buf = self._buf
+        vt = self._vtable(pos)
+        vt_len = len(vt)
+        base_type = buf[pos + vt[2]] if vt_len > 2 and vt[2] else 0
+        element = buf[pos + vt[3]] if vt_len > 3 and vt[3] else 0
+        if vt_len > 4 and vt[4]:
+            i = _INT.unpack_from(buf, pos + vt[4])[0]
+        else:
+            i = -1
+
+        index = self._index
+        if i == -1:
+            ref = u''
+        elif _OBJ in (base_type, element):
+            if i < len(index.object_names):
+                ref = u'{}:{}'.format(index.object_names[i],
+                                      index.object_is_struct[i])
+            else:
+                ref = u'?'
+        else:
+            ref = index.enum_names[i] if i < len(index.enum_names) else u'?'
+        self._parts.append(bytes([base_type, element]))
+        self._parts.append(ref.encode('utf8') + b'\0')
+
+
+class LazySchema(object):
+    """
+    Lazy, read-only view onto a binary FlatBuffers reflection schema.
+
+    Instead of extracting all definitions up front (as
+    :func:`cbsh.idl.loader.read_reflection_schema` does), a table mapping the
+    qualified names of all enums, tables/structs and services to their index in
+    the buffer is built on first use. A definition is then only decoded when it
+    is accessed, and memoized. The decoded definitions are identical to the ones
+    in ``read_reflection_schema(buf)['types']``.
+
+    The buffer must stay valid while the view is in use, eg:
+
+    .. code-block:: python
+
+        with schema_buffer('api.bfbs') as buf:
+            schema = LazySchema(buf)
+            iface = schema['accelstorage.AccelStorage']
+    """
+
+    def __init__(self, buf, log=None):
+        """
+
+        :param buf: The binary reflection schema (anything supporting the
+            buffer protocol, eg a memoryview onto a memory-mapped file).
+        """
+        self.log = log or txaio.make_logger()
+        self._buf = buf
+        self._schema = Schema.GetRootAsSchema(buf, 0)
+        self._meta = None
+        self._index = None
+        self._types = {}
+        self._raw_hashes = {}
+        self._raw_hasher = None
+
+    def __str__(self):
+        return u'LazySchema(bfbs_size={}, decoded={})'.format(
+            len(self._buf), len(self._types))
+
+    @property
+    def meta(self):
+        """
+        Schema metadata (as in ``read_reflection_schema(buf)['meta']``).
+        """
+        if self._meta is None:
+            self._meta = extract_schema_meta(self._schema, self._buf)
+        return self._meta
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = SchemaIndex(self._schema)
+        return self._index.by_name
+
+    def _decode(self, kind, i):
+        _schema = self._schema
+        if kind == SchemaIndex.ENUM:
+            return extract_enum(_schema.Enums(i), self.log)
+        elif kind == SchemaIndex.OBJECT:
+            obj, _, typerefs_error_cnt = extract_object(
+                _schema.Objects(i), self._index, self.log)
+            if typerefs_error_cnt:
+                raise Exception(
+                    '{} unresolved type references encountered in "{}"'.
+                    format(typerefs_error_cnt, obj['name']))
+            return obj
+        else:
+            return extract_service(_schema.Services(i))
+
+    def __getitem__(self, name):
+        typedef = self._types.get(name, None)
+        if typedef is None:
+            kind, i = self._get_index()[name]
+            typedef = self._decode(kind, i)
+            typedef['hash'] = typedef_hash(typedef)
+            self._types[name] = typedef
+        return typedef
+
+    def raw_hash(self, name):
+        """
+        Get the content hash of the raw data of a definition, without
+        decoding the definition.
+
+        Unlike the ``hash`` of decoded definitions (see
+        :func:`cbsh.idl.loader.typedef_hash`), the raw hash also covers data
+        not extracted by the loader. So definitions with equal raw hashes
+        (in the same or another schema) are decoded to equal definitions,
+        while definitions with different raw hashes might still be decoded
+        to equal definitions.
+
+        :param name: Qualified name of the enum, table, struct or interface.
+        :type name: str
+
+        :returns: The hex encoded hash.
+        :rtype: str
+        """
+        raw_hash = self._raw_hashes.get(name, None)
+        if raw_hash is None:
+            kind, i = self._get_index()[name]
+            if self._raw_hasher is None:
+                self._raw_hasher = _RawHasher(self._buf, self._index)
+            if kind == SchemaIndex.ENUM:
+                pos, spec = self._schema.Enums(i)._pos, _ENUM
+            elif kind == SchemaIndex.OBJECT:
+                pos, spec = self._schema.Objects(i)._pos, _OBJECT
+            else:
+                pos, spec = self._schema.Services(i)._pos, _SERVICE
+            raw_hash = self._raw_hasher.hash(kind, pos, spec)
+            self._raw_hashes[name] = raw_hash
+        return raw_hash
+
+    def get(self, name, default=None):
+        """
+        Get a (decoded) definition by qualified name.
+
+        :param name: Qualified name of the enum, table, struct or interface.
+        :type name: str
+
+        :returns: The definition, or ``default`` if there is no such definition.
+        :rtype: dict
+        """
+        if name in self:
+            return self[name]
+        return default
+
+    def __contains__(self, name):
+        return name in self._get_index()
+
+    def __len__(self):
+        return len(self._get_index())
+
+    def __iter__(self):
+        return iter(self._get_index())
+
+    def keys(self):
+        """
+        Qualified names of all definitions (no definition is decoded).
+        """
+        return self._get_index().keys()
+
+    def interfaces(self):
+        """
+        Qualified names of all services (XBR interfaces).
+        """
+        return [
+            name for name, (kind, _) in self._get_index().items()
+            if kind == SchemaIndex.SERVICE
+        ]
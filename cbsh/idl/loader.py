@@ -29,10 +29,16 @@
 #####################################################################################
 
 import os
+import sys
 import json
+import mmap
 import argparse
 import hashlib
+import time
+import tempfile
 import pprint
+import contextlib
+import concurrent.futures
 
 from typing import Dict, Any  # noqa
 
@@ -40,20 +46,18 @@ import six
 import click
 
 from cbsh.util import hl
-from cbsh.reflection import Schema
+from cbsh.idl.accessor import Schema
+from cbsh.idl.cache import SchemaCache
 
 import txaio
 txaio.use_asyncio()
 
 
 def extract_attributes(item, allowed_attributes=None):
-    num_attrs = item.AttributesLength()
-    attrs = [item.Attributes(i) for i in range(num_attrs)]
-    attrs_dict = {
-        x.Key().decode('utf8'): x.Value().decode('utf8')
-        if x.Value().decode('utf8') not in ['0'] else None
-        for x in attrs
-    }
+    attrs_dict = {}
+    for x in item.IterAttributes():
+        value = x.Value().decode('utf8')
+        attrs_dict[x.Key().decode('utf8')] = value if value not in ['0'] else None
     if allowed_attributes:
         for attr in attrs_dict:
             if attr not in allowed_attributes:
@@ -64,9 +68,8 @@ def extract_attributes(item, allowed_attributes=None):
 
 
 def extract_docs(item):
-    num_docs = item.DocumentationLength()
     item_docs = [
-        item.Documentation(i).decode('utf8').strip() for i in range(num_docs)
+        doc.decode('utf8').strip() for doc in item.IterDocumentation()
     ]
     return item_docs
 
@@ -102,19 +105,123 @@ _BASETYPE_ID2NAME = {
     16: 'union',
 }
 
+# scalars (and enums) having their schema default in DefaultInteger (and not
+# in DefaultReal)
+_INTEGER_DEFAULT_TYPES = ('bool', 'int8', 'uint8', 'int16', 'uint16', 'int32',
+                          'uint32', 'int64', 'uint64')
+
 
-def read_reflection_schema(buf, log=None):
+@contextlib.contextmanager
+def schema_buffer(filename, use_mmap=True):
     """
-    Read a binary FlatBuffers buffer that is typed according to the FlatBuffers
-    reflection schema.
+    Open a FlatBuffers binary schema file (.bfbs) for reading.
 
-    The function returns extracted information in a plain, JSON serializable dict.
+    When ``use_mmap`` is set, the file is memory-mapped read-only and a
+    ``memoryview`` onto the mapping is provided, so that no copy of the file
+    contents is made. Otherwise, the file is read into a ``bytes`` object.
+
+    The buffer is only valid within the ``with`` block.
+
+    :param filename: Path of the binary schema file to open.
+    :type filename: str
+    :param use_mmap: Memory-map the file instead of reading it.
+    :type use_mmap: bool
+    """
+    with open(filename, 'rb') as f:
+        if not use_mmap or os.fstat(f.fileno()).st_size == 0:
+            yield f.read()
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    buf = memoryview(mapped)
+    try:
+        yield buf
+    finally:
+        buf.release()
+        try:
+            mapped.close()
+        except BufferError:
+            # a view onto the mapping is still alive somewhere (eg in
+            # a traceback): the mapping will be closed when collected
+            pass
+
+
+def read_reflection_schema_file(filename, use_mmap=True, cache=None,
+                                log=None):
+    """
+    Read a binary FlatBuffers schema file (.bfbs), see :func:`read_reflection_schema`.
+
+    :param filename: Path of the binary schema file to read.
+    :type filename: str
+    :param use_mmap: Memory-map the file instead of reading it (zero-copy).
+    :type use_mmap: bool
+    :param cache: Optional schema cache to lookup (and store) the extracted
+        schema by the SHA256 of the binary schema.
+    :type cache: :class:`cbsh.idl.cache.SchemaCache`
+
+    :returns: The extracted schema.
+    :rtype: dict
     """
     if not log:
         log = txaio.make_logger()
 
-    _schema = Schema.GetRootAsSchema(buf, 0)
+    bfbs_sha256 = None
+    with schema_buffer(filename, use_mmap=use_mmap) as buf:
+        if cache:
+            bfbs_sha256 = hashlib.sha256(buf).hexdigest()
+            schema = cache.get(bfbs_sha256)
+            if schema:
+                log.debug('schema cache hit for {} ({})'.format(
+                    filename, bfbs_sha256))
+                return schema
+
+        # the buffer is hashed once (for both the lookup and the store)
+        schema = read_reflection_schema(buf, log=log, bfbs_sha256=bfbs_sha256)
+
+    if cache:
+        cache.put(bfbs_sha256, schema)
+
+    return schema
+
+
+def read_schema_file(filename, use_mmap=True, cache=None, log=None):
+    """
+    Read a FlatBuffers schema file: a schema source file (.fbs) is parsed
+    with :func:`cbsh.idl.fbs.read_fbs_schema_file`, any other file is read as
+    a binary schema with :func:`read_reflection_schema_file`.
+
+    :param filename: Path of the schema file to read.
+    :type filename: str
+    :param use_mmap: Memory-map binary schema files instead of reading them.
+    :type use_mmap: bool
+    :param cache: Optional schema cache (for schema source files, the
+        syntax trees of all files read are cached).
+    :type cache: :class:`cbsh.idl.cache.SchemaCache`
+
+    :returns: The extracted schema.
+    :rtype: dict
+    """
+    if filename.endswith('.fbs'):
+        # the parser builds on this module
+        from cbsh.idl.fbs import read_fbs_schema_file
+        return read_fbs_schema_file(filename, cache=cache, log=log)
+    return read_reflection_schema_file(
+        filename, use_mmap=use_mmap, cache=cache, log=log)
+
+
+def extract_schema_meta(_schema, buf, bfbs_sha256=None):
+    """
+    Extract schema level information from a reflection schema.
 
+    :param _schema: The reflection schema root.
+    :type _schema: :class:`cbsh.idl.accessor.Schema`
+    :param buf: The buffer the schema was read from.
+    :param bfbs_sha256: SHA256 (hex) of the buffer, if already computed.
+    :type bfbs_sha256: str
+
+    :returns: Schema metadata.
+    :rtype: dict
+    """
     _root = _schema.RootTable()
     if _root:
         root_name = _root.Name().decode('utf8').strip()
@@ -129,349 +236,743 @@ def read_reflection_schema(buf, log=None):
     if _file_ext == '':
         _file_ext = None
 
-    m = hashlib.sha256()
-    m.update(buf)
+    if bfbs_sha256 is None:
+        bfbs_sha256 = hashlib.sha256(buf).hexdigest()
 
     schema_meta = {
         'bfbs_size': len(buf),
-        'bfbs_sha256': m.hexdigest(),
+        'bfbs_sha256': bfbs_sha256,
         'file_ident': _file_ident,
         'file_ext': _file_ext,
         'root': root_name,
     }
+    return schema_meta
 
-    schema = None  # type: dict
-    schema = {
-        'meta': schema_meta,
-        'tables': [],
-        'enums': [],
-        'services': [],
-    }
 
-    schema_by_uri = None  # type: dict
-    schema_by_uri = {
-        'meta': schema_meta,
-        'types': {},
+def extract_enum(_enum, log):
+    """
+    Extract an enum definition.
+
+    :param _enum: The reflection enum.
+    :type _enum: :class:`cbsh.idl.accessor.Enum`
+
+    :returns: The enum definition.
+    :rtype: dict
+    """
+    # extract enum base information
+    #
+    enum_name = _enum.Name().decode('utf8')
+
+    enum = {
+        # '_index': i,
+        'type': 'enum',
+        'name': enum_name,
+        'docs': extract_docs(_enum),
     }
+    if EXTRACT_ATTRS_RAW:
+        enum['attr'] = extract_attributes(_enum)
+
+    # extract enum values
+    #
+    enum_values_dict = dict()  # type: Dict[str, Any]
+    for _enum_value in _enum.IterValues():
+        enum_value_name = _enum_value.Name().decode('utf8')
+        enum_value = {
+            'docs': extract_docs(_enum_value),
+            # enum values cannot have attributes
+        }
+        if enum_value_name in enum_values_dict:
+            raise Exception(
+                'duplicate enum value "{}"'.format(enum_value_name))
+        enum_values_dict[enum_value_name] = enum_value
+    enum['values'] = enum_values_dict
+
+    return enum
+
+
+class SchemaIndex(object):
+    """
+    Index over the names of all top-level definitions (enums, tables/structs
+    and services) of a reflection schema.
+
+    Building the index only reads the name of every definition (and whether
+    an object is a struct), and detects duplicate qualified names. Type
+    references, which are indexes into the enums and objects vectors of the
+    schema, are then resolved from the precomputed arrays, without revisiting
+    the buffer.
+    """
+
+    ENUM = 0
+    OBJECT = 1
+    SERVICE = 2
+
+    __slots__ = ('enum_names', 'object_names', 'object_is_struct',
+                 'service_names', 'by_name')
+
+    def __init__(self, _schema):
+        """
+
+        :param _schema: The reflection schema root.
+        :type _schema: :class:`cbsh.idl.accessor.Schema`
+        """
+        self.enum_names = []
+        self.object_names = []
+        self.object_is_struct = []
+        self.service_names = []
+
+        # qualified name -> (kind, index)
+        self.by_name = {}  # type: Dict[str, Any]
+
+        for i, item in enumerate(_schema.IterEnums()):
+            name = item.Name().decode('utf8')
+            self._add(name, self.ENUM, i)
+            self.enum_names.append(name)
+
+        for i, item in enumerate(_schema.IterObjects()):
+            name = item.Name().decode('utf8')
+            self._add(name, self.OBJECT, i)
+            self.object_names.append(name)
+            self.object_is_struct.append(bool(item.IsStruct()))
+
+        for i, item in enumerate(_schema.IterServices()):
+            name = item.Name().decode('utf8')
+            self._add(name, self.SERVICE, i)
+            self.service_names.append(name)
+
+    def _add(self, name, kind, i):
+        if name in self.by_name:
+            raise Exception('duplicate name "{}"'.format(name))
+        self.by_name[name] = (kind, i)
+
 
-    enums = []
-    objects = []
-    services = []
+def extract_object(_obj, index, log):
+    """
+    Extract a table or struct definition, including its fields.
 
-    fqn2type = dict()  # type: Dict[str, Any]
+    :param _obj: The reflection object.
+    :type _obj: :class:`cbsh.idl.accessor.Object`
+    :param index: The schema name index (to resolve type references).
+    :type index: :class:`SchemaIndex`
 
-    enum_cnt = 0
-    object_cnt = 0
-    service_cnt = 0
+    :returns: A tuple ``(obj, typerefs_cnt, typerefs_error_cnt)`` with the object
+        definition, and the number of resolved and unresolved type references.
+    :rtype: tuple
+    """
     typerefs_cnt = 0
     typerefs_error_cnt = 0
 
-    for i in range(_schema.EnumsLength()):
-        item = _schema.Enums(i)
-        name = item.Name().decode('utf8')
-        if name in fqn2type:
-            raise Exception('duplicate name "{}"'.format(name))
-        enum_cnt += 1
+    obj_name = _obj.Name().decode('utf8')
+    object_type = 'struct' if _obj.IsStruct() else 'table'
 
-    for i in range(_schema.ObjectsLength()):
-        item = _schema.Objects(i)
-        name = item.Name().decode('utf8')
-        if name in fqn2type:
-            raise Exception('duplicate name "{}"'.format(name))
-        object_cnt += 1
+    obj = {
+        # '_index': i,
+        'type': object_type,
+        'name': obj_name,
+        'docs': extract_docs(_obj),
+    }
+    if EXTRACT_ATTRS_RAW:
+        obj['attr'] = extract_attributes(_obj)
 
-    for i in range(_schema.ServicesLength()):
-        item = _schema.Services(i)
-        name = item.Name().decode('utf8')
-        if name in fqn2type:
-            raise Exception('duplicate name "{}"'.format(name))
-        service_cnt += 1
+    object_names = index.object_names
+    enum_names = index.enum_names
 
-    log.info('Processing schema with {} enums, {} objects and {} services ...'.
-             format(enum_cnt, object_cnt, service_cnt))
+    # extract fields
+    fields_by_name = {}
+    for j, _field in enumerate(_obj.IterFields()):
 
-    # enums
-    #
-    num_enums = _schema.EnumsLength()
-    for i in range(num_enums):
-
-        # extract enum base information
-        #
-        _enum = _schema.Enums(i)
-        enum_name = _enum.Name().decode('utf8')
-        log.debug('processing enum {} ("{}")'.format(i, enum_name))
-
-        enum = {
-            # '_index': i,
-            'type': 'enum',
-            'name': enum_name,
-            'docs': extract_docs(_enum),
-        }
-        if EXTRACT_ATTRS_RAW:
-            enum['attr'] = extract_attributes(_enum)
-
-        # extract enum values
-        #
-        enum_values_dict = dict()  # type: Dict[str, Any]
-        for j in range(_enum.ValuesLength()):
-            _enum_value = _enum.Values(j)
-            enum_value_name = _enum_value.Name().decode('utf8')
-            enum_value = {
-                'docs': extract_docs(_enum_value),
-                # enum values cannot have attributes
-            }
-            if enum_value_name in enum_values_dict:
-                raise Exception(
-                    'duplicate enum value "{}"'.format(enum_value_name))
-            enum_values_dict[enum_value_name] = enum_value
-        enum['values'] = enum_values_dict
+        field_name = _field.Name().decode('utf8')
+        log.debug('processing field {} ("{}")'.format(j, field_name))
 
-        if enum_name in schema_by_uri['types']:
-            raise Exception(
-                'unexpected duplicate definition for qualified name "{}"'.
-                format(enum_name))
+        _base_type, _element, _field_index = _field.TypeInfo()
 
-        enums.append(enum)
-        schema_by_uri['types'][enum_name] = enum
+        _field_base_type = _BASETYPE_ID2NAME.get(_base_type, None)
 
-    # objects (tables/structs)
-    #
-    for i in range(_schema.ObjectsLength()):
+        _field_element = _BASETYPE_ID2NAME.get(_element, None)
+        if _field_element == 'none':
+            _field_element = None
 
-        _obj = _schema.Objects(i)
-        obj_name = _obj.Name().decode('utf8')
-        object_type = 'struct' if _obj.IsStruct() else 'table'
+        # FIXME
+        # if _field_element == 'object':
+        #     el = _schema.Objects(_field_type.Element())
+        #     if isinstance(el, reflection.Type) and hasattr(el, 'IsStruct'):
+        #         _field_element = 'struct' if el.Element().IsStruct(
+        #         ) else 'table'
 
-        obj = {
-            # '_index': i,
-            'type': object_type,
-            'name': obj_name,
-            'docs': extract_docs(_obj),
+        field = {
+            # '_index': j,
+            'name': field_name,
+            'id': int(_field.Id()),
+            'offset': int(_field.Offset()),
+            'base_type': _field_base_type,
         }
-        if EXTRACT_ATTRS_RAW:
-            obj['attr'] = extract_attributes(_obj)
-
-        # extract fields
-        num_fields = _obj.FieldsLength()
-        fields = []
-        fields_by_name = {}
-        for j in range(num_fields):
-
-            _field = _obj.Fields(j)
-            field_name = _field.Name().decode('utf8')
-            log.debug('processing field {} ("{}")'.format(i, field_name))
-
-            _field_type = _field.Type()
-
-            _field_index = int(_field_type.Index())
-            _field_base_type = _BASETYPE_ID2NAME.get(_field_type.BaseType(),
-                                                     None)
-
-            _field_element = _BASETYPE_ID2NAME.get(_field_type.Element(), None)
-            if _field_element == 'none':
-                _field_element = None
-
-            # FIXME
-            # if _field_element == 'object':
-            #     el = _schema.Objects(_field_type.Element())
-            #     if isinstance(el, reflection.Type) and hasattr(el, 'IsStruct'):
-            #         _field_element = 'struct' if el.Element().IsStruct(
-            #         ) else 'table'
-
-            field = {
-                # '_index': j,
-                'name': field_name,
-                'id': int(_field.Id()),
-                'offset': int(_field.Offset()),
-                'base_type': _field_base_type,
-            }
-
-            if _field_element:
-                # vector
-                field['element_type'] = _field_element
-
-            if _field_index != -1:
-
-                # field['field_index'] = _field_index
-
-                if _field_base_type in [
-                        'object', 'struct'
-                ] or _field_element in ['object', 'struct']:
-
-                    # obj/struct
-
-                    if _field_index < _schema.ObjectsLength():
-                        l_obj = _schema.Objects(_field_index)
-                        l_obj_ref = _obj.Name().decode('utf8')
-                        field['ref_category'] = 'struct' if l_obj.IsStruct(
-                        ) else 'table'
-                        field['ref_type'] = l_obj_ref
-                        typerefs_cnt += 1
-                    else:
-                        log.info(
-                            'WARNING - referenced table/struct for index {} ("{}.{}") not found'.
-                            format(_field_index, obj_name, field_name))
-                        field['ref_category'] = 'object'
-                        field['ref_type'] = None
-                        typerefs_error_cnt += 1
-
-                elif _field_base_type in [
-                        'utype', 'bool', 'int8', 'uint8', 'int16', 'uint16',
-                        'int32', 'uint32', 'int64', 'uint64', 'float',
-                        'double', 'string'
-                ]:
-                    # enum
-                    field['ref_category'] = 'enum'
-
-                    if _field_index < _schema.EnumsLength():
-                        _enum_ref = _schema.Enums(_field_index).Name().decode(
-                            'utf8')
-                        field['ref_type'] = _enum_ref
-                        typerefs_cnt += 1
-                    else:
-                        log.info('WARNING - referenced enum not found')
-                        field['ref_type'] = None
-                        typerefs_error_cnt += 1
 
+        if _field_element:
+            # vector
+            field['element_type'] = _field_element
+
+        # schema default of scalars (including enums), if not zero
+        if _field_base_type in ('float', 'double'):
+            _default = _field.DefaultReal()
+        elif _field_base_type in _INTEGER_DEFAULT_TYPES:
+            _default = _field.DefaultInteger()
+        else:
+            _default = None
+        if _default:
+            field['default'] = _default
+
+        if _field_index != -1:
+
+            # field['field_index'] = _field_index
+
+            if _field_base_type in [
+                    'object', 'struct'
+            ] or _field_element in ['object', 'struct']:
+
+                # obj/struct
+
+                if _field_index < len(object_names):
+                    field['ref_category'] = 'struct' if index.object_is_struct[
+                        _field_index] else 'table'
+                    field['ref_type'] = object_names[_field_index]
+                    typerefs_cnt += 1
                 else:
-                    raise Exception('unhandled field type: {} {} {} {}'.format(
-                        field_name, _field_base_type, _field_element,
-                        _field_index))
+                    log.info(
+                        'WARNING - referenced table/struct for index {} ("{}.{}") not found'.
+                        format(_field_index, obj_name, field_name))
+                    field['ref_category'] = 'object'
+                    field['ref_type'] = None
+                    typerefs_error_cnt += 1
+
+            elif _field_base_type in [
+                    'utype', 'bool', 'int8', 'uint8', 'int16', 'uint16',
+                    'int32', 'uint32', 'int64', 'uint64', 'float', 'double',
+                    'string'
+            ]:
+                # enum
+                field['ref_category'] = 'enum'
+
+                if _field_index < len(enum_names):
+                    field['ref_type'] = enum_names[_field_index]
+                    typerefs_cnt += 1
+                else:
+                    log.info('WARNING - referenced enum not found')
+                    field['ref_type'] = None
+                    typerefs_error_cnt += 1
 
-            field_docs = extract_docs(_field)
-            if field_docs:
-                field['docs'] = field_docs
+            else:
+                raise Exception('unhandled field type: {} {} {} {}'.format(
+                    field_name, _field_base_type, _field_element,
+                    _field_index))
 
-            if EXTRACT_ATTRS_RAW:
-                _field_attrs = extract_attributes(_field)
-                if _field_attrs:
-                    field['attr'] = _field_attrs
+        field_docs = extract_docs(_field)
+        if field_docs:
+            field['docs'] = field_docs
 
-            fields.append(field)
-            fields_by_name[field_name] = field
+        if EXTRACT_ATTRS_RAW:
+            _field_attrs = extract_attributes(_field)
+            if _field_attrs:
+                field['attr'] = _field_attrs
 
-        obj['fields'] = fields_by_name
+        fields_by_name[field_name] = field
 
-        if obj['name'] in schema_by_uri['types']:
-            raise Exception(
-                'unexpected duplicate definition for qualified name "{}"'.
-                format(field['name']))
+    obj['fields'] = fields_by_name
 
-        # always append the object here, so we can dereference indexes
-        # correctly
-        objects.append(obj)
+    if object_type == 'struct':
+        # fixed memory layout of structs (eg for NumPy dtypes)
+        obj['minalign'] = int(_obj.Minalign())
+        obj['bytesize'] = int(_obj.Bytesize())
 
-        # skip our "void marker"
-        if False and obj_name in ['Void']:
-            pass
-        else:
-            schema_by_uri['types'][obj['name']] = obj
+    return obj, typerefs_cnt, typerefs_error_cnt
 
-    # iterate over services
-    #
-    num_services = _schema.ServicesLength()
-    for i in range(num_services):
-        _service = _schema.Services(i)
 
-        service_name = _service.Name().decode('utf8')
+def _decode_type(x):
+    res = x.Name().decode('utf8')
+    if res in ['Void', 'wamp.Void']:
+        res = None
+    return res
 
-        service_attrs_dict = extract_attributes(_service, INTERFACE_ATTRS)
 
-        service_type = service_attrs_dict.get('type', None)
-        if service_type != 'interface':
+def extract_service(_service):
+    """
+    Extract a service (XBR interface) definition, including its slots.
+
+    :param _service: The reflection service.
+    :type _service: :class:`cbsh.idl.accessor.Service`
+
+    :returns: The service definition.
+    :rtype: dict
+    """
+    service_name = _service.Name().decode('utf8')
+
+    service_attrs_dict = extract_attributes(_service, INTERFACE_ATTRS)
+
+    service_type = service_attrs_dict.get('type', None)
+    if service_type != 'interface':
+        raise Exception(
+            'invalid value "{}" for attribute "type" in XBR interface'.format(
+                service_type))
+
+    service = {
+        # '_index': i,
+        'type': service_type,
+        'name': service_name,
+        'docs': extract_docs(_service),
+    }
+
+    if EXTRACT_ATTRS_RAW:
+        service['attrs'] = service_attrs_dict
+    else:
+        service['uuid'] = service_attrs_dict.get('uuid', None)
+
+    calls = []
+    calls_by_name = {}
+    for _call in _service.IterCalls():
+
+        _call_name = _call.Name().decode('utf8')
+
+        call_attrs_dict = extract_attributes(_call)
+
+        call_type = call_attrs_dict.get('type', None)
+        if call_type not in INTERFACE_MEMBER_TYPES:
             raise Exception(
-                'invalid value "{}" for attribute "type" in XBR interface'.
-                format(service_type))
-
-        service = {
-            # '_index': i,
-            'type': service_type,
-            'name': service_name,
-            'docs': extract_docs(_service),
+                'invalid XBR interface member type "{}" - must be one of {}'.
+                format(call_type, INTERFACE_MEMBER_TYPES))
+
+        call_stream = call_attrs_dict.get('stream', None)
+        if call_stream in ['none', 'None', 'null', 'Null']:
+            call_stream = None
+
+        if call_stream not in INTERFACE_MEMBER_STREAM_VALUES:
+            raise Exception(
+                'invalid XBR interface member stream modifier "{}" - must be one of {}'.
+                format(call_stream, INTERFACE_MEMBER_STREAM_VALUES))
+
+        call = {
+            'type': call_type,
+            'name': _call_name,
+            'in': _decode_type(_call.Request()),
+            'out': _decode_type(_call.Response()),
+            'stream': call_stream,
+            # 'id': int(_call.Id()),
+            # 'offset': int(_call.Offset()),
         }
+        # call['attrs'] = call_attrs_dict
+        call['docs'] = extract_docs(_call)
 
-        if EXTRACT_ATTRS_RAW:
-            service['attrs'] = service_attrs_dict
-        else:
-            service['uuid'] = service_attrs_dict.get('uuid', None)
+        calls.append(call)
+        calls_by_name[_call_name] = call
 
-        num_calls = _service.CallsLength()
-        calls = []
-        calls_by_name = {}
-        for j in range(num_calls):
-            _call = _service.Calls(j)
+    # service['calls'] = sorted(calls, key=lambda field: field['id'])
+    service['slots'] = calls_by_name
 
-            _call_name = _call.Name().decode('utf8')
+    return service
 
-            call_attrs_dict = extract_attributes(_call)
 
-            call_type = call_attrs_dict.get('type', None)
-            if call_type not in INTERFACE_MEMBER_TYPES:
-                raise Exception(
-                    'invalid XBR interface member type "{}" - must be one of {}'.
-                    format(call_type, INTERFACE_MEMBER_TYPES))
+def typedef_hash(typedef):
+    """
+    Compute a stable content hash of a definition.
 
-            call_stream = call_attrs_dict.get('stream', None)
-            if call_stream in ['none', 'None', 'null', 'Null']:
-                call_stream = None
+    The hash is the SHA256 over the canonical (key sorted, compact) JSON
+    serialization of the definition (excluding any ``hash`` key), and only
+    changes when the definition itself (including its docs) changes.
 
-            if call_stream not in INTERFACE_MEMBER_STREAM_VALUES:
-                raise Exception(
-                    'invalid XBR interface member stream modifier "{}" - must be one of {}'.
-                    format(call_stream, INTERFACE_MEMBER_STREAM_VALUES))
-
-            def _decode_type(x):
-                res = x.Name().decode('utf8')
-                if res in ['Void', 'wamp.Void']:
-                    res = None
-                return res
-
-            call = {
-                'type': call_type,
-                'name': _call_name,
-                'in': _decode_type(_call.Request()),
-                'out': _decode_type(_call.Response()),
-                'stream': call_stream,
-                # 'id': int(_call.Id()),
-                # 'offset': int(_call.Offset()),
-            }
-            # call['attrs'] = call_attrs_dict
-            call['docs'] = extract_docs(_call)
-
-            calls.append(call)
-            calls_by_name[_call_name] = call
-
-        # service['calls'] = sorted(calls, key=lambda field: field['id'])
-        service['slots'] = calls_by_name
-
-        services.append(service)
-
-        if service_name in schema_by_uri['types']:
-            raise Exception(
-                'unexpected duplicate definition for qualified name "{}"'.
-                format(service_name))
-        else:
-            schema_by_uri['types'][service_name] = service
+    :param typedef: The definition (an enum, table, struct or interface).
+    :type typedef: dict
+
+    :returns: The hex encoded hash.
+    :rtype: str
+    """
+    if 'hash' in typedef:
+        typedef = {k: v for k, v in typedef.items() if k != 'hash'}
+    data = json.dumps(
+        typedef, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf8')).hexdigest()
+
+
+def iter_schema_types(_schema, index, log):
+    """
+    Extract all definitions of a reflection schema, in one walk over the buffer.
+
+    Enums are generated first, then tables/structs, then services (each in the
+    order of the schema, which is sorted by name). Every definition carries
+    its content hash (see :func:`typedef_hash`) under the ``hash`` key.
+
+    :param _schema: The reflection schema root.
+    :type _schema: :class:`cbsh.idl.accessor.Schema`
+    :param index: The schema name index.
+    :type index: :class:`SchemaIndex`
+
+    :returns: A generator of definitions.
+    """
+    typerefs_cnt = 0
+    typerefs_error_cnt = 0
+
+    # enums
+    #
+    for i, _enum in enumerate(_schema.IterEnums()):
+        log.debug('processing enum {} ("{}")'.format(i,
+                                                     index.enum_names[i]))
+        _enum = extract_enum(_enum, log)
+        _enum['hash'] = typedef_hash(_enum)
+        yield _enum
+
+    # objects (tables/structs)
+    #
+    for _obj in _schema.IterObjects():
+        obj, _typerefs_cnt, _typerefs_error_cnt = extract_object(
+            _obj, index, log)
+        typerefs_cnt += _typerefs_cnt
+        typerefs_error_cnt += _typerefs_error_cnt
+        obj['hash'] = typedef_hash(obj)
+        yield obj
+
+    # services
+    #
+    for _service in _schema.IterServices():
+        service = extract_service(_service)
+        service['hash'] = typedef_hash(service)
+        yield service
+
+    log.debug('{} type references resolved'.format(typerefs_cnt))
 
     if typerefs_error_cnt:
         raise Exception(
             '{} unresolved type references encountered in schema'.format(
                 typerefs_error_cnt))
 
-    schema['enums'] = sorted(enums, key=lambda enum: enum['name'])
-    schema['tables'] = sorted(objects, key=lambda obj: obj['name'])
-    schema['services'] = sorted(services, key=lambda service: service['name'])
+
+def read_reflection_schema(buf, log=None, bfbs_sha256=None):
+    """
+    Read a binary FlatBuffers buffer that is typed according to the FlatBuffers
+    reflection schema.
+
+    The buffer can be anything supporting the buffer protocol, including a
+    ``memoryview`` onto a memory-mapped file, which is then read in place
+    (including hashing) without ever copying it. The SHA256 of the buffer
+    can be passed in if already computed (to not hash the buffer again).
+
+    The function returns extracted information in a plain, JSON serializable dict.
+    """
+    if not log:
+        log = txaio.make_logger()
+
+    _schema = Schema.GetRootAsSchema(buf, 0)
+
+    schema_meta = extract_schema_meta(_schema, buf, bfbs_sha256)
+
+    index = SchemaIndex(_schema)
+
+    log.info('Processing schema with {} enums, {} objects and {} services ...'.
+             format(
+                 len(index.enum_names), len(index.object_names),
+                 len(index.service_names)))
+
+    schema_by_uri = None  # type: dict
+    schema_by_uri = {
+        'meta': schema_meta,
+        'types': {},
+    }
+
+    types = schema_by_uri['types']
+    for typedef in iter_schema_types(_schema, index, log):
+        types[typedef['name']] = typedef
 
     return schema_by_uri
 
 
+def write_schema_json(f, meta, types, compact=False):
+    """
+    Write a schema as JSON to a (text) file, one definition at a time.
+
+    The output is identical to ``json.dumps()`` of the complete schema (with
+    ``indent=4``, or with compact separators when ``compact`` is set), but
+    only ever holds the serialization of a single definition in memory.
+
+    :param f: The file to write to (opened in text mode).
+    :param meta: The schema metadata.
+    :type meta: dict
+    :param types: The schema definitions.
+    :type types: iterable of dict
+
+    :returns: The number of definitions written.
+    :rtype: int
+    """
+    if compact:
+        kwargs = {'separators': (',', ':')}
+        head, sep, tail = '{"meta":', ',"types":{', '}'
+        item_first, item_next, item_key = '', ',', ':'
+        item_last = ''
+    else:
+        kwargs = {'indent': 4, 'separators': (', ', ': ')}
+        head, sep, tail = '{\n    "meta": ', ', \n    "types": {', '\n}'
+        item_first, item_next, item_key = '\n        ', ', \n        ', ': '
+        item_last = '\n    '
+
+    def dumps(obj, indent=''):
+        data = json.dumps(obj, ensure_ascii=False, sort_keys=False, **kwargs)
+        if indent and not compact:
+            # JSON strings never contain a raw newline
+            data = data.replace('\n', '\n' + indent)
+        return data
+
+    f.write(head)
+    f.write(dumps(meta, '    '))
+    f.write(sep)
+
+    cnt_defs = 0
+    for typedef in types:
+        f.write(item_next if cnt_defs else item_first)
+        f.write(dumps(typedef['name']))
+        f.write(item_key)
+        f.write(dumps(typedef, '        '))
+        cnt_defs += 1
+
+    if cnt_defs:
+        f.write(item_last)
+    f.write('}')
+    f.write(tail)
+
+    return cnt_defs
+
+
+def stream_reflection_schema_file(filename, f, use_mmap=True, compact=False,
+                                  log=None):
+    """
+    Read a binary FlatBuffers schema file (.bfbs) and write the extracted
+    schema as JSON to a file, without ever building the complete schema.
+
+    Every definition is written as soon as it is extracted (see
+    :func:`write_schema_json`), so memory use does not grow with the size
+    of the schema.
+
+    :param filename: Path of the binary schema file to read.
+    :type filename: str
+    :param f: The file to write to (opened in text mode).
+    :param use_mmap: Memory-map the file instead of reading it (zero-copy).
+    :type use_mmap: bool
+    :param compact: Write compact (non-indented) JSON.
+    :type compact: bool
+
+    :returns: The number of definitions written.
+    :rtype: int
+    """
+    if not log:
+        log = txaio.make_logger()
+
+    with schema_buffer(filename, use_mmap=use_mmap) as buf:
+        _schema = Schema.GetRootAsSchema(buf, 0)
+
+        meta = extract_schema_meta(_schema, buf)
+        meta['file_name'] = os.path.basename(filename)
+        meta['file_path'] = filename
+
+        index = SchemaIndex(_schema)
+
+        log.info(
+            'Streaming schema with {} enums, {} objects and {} services ...'.
+            format(
+                len(index.enum_names), len(index.object_names),
+                len(index.service_names)))
+
+        return write_schema_json(f, meta,
+                                 iter_schema_types(_schema, index, log),
+                                 compact)
+
+
+@contextlib.contextmanager
+def atomic_output(filename):
+    """
+    Open a (UTF8 text) output file that is only put in place when the
+    ``with`` block completes without error.
+
+    :param filename: Path of the file to write.
+    :type filename: str
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+
+    # mkstemp creates the file private: apply the usual permissions
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmpname, 0o666 & ~umask)
+
+    try:
+        with os.fdopen(fd, 'w', encoding='utf8') as f:
+            yield f
+        os.replace(tmpname, filename)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+
+def find_schema_files(paths):
+    """
+    Expand a list of files and directories into the list of binary schema
+    files (.bfbs). Directories are searched recursively, while files given
+    explicitly may also be schema source files (.fbs).
+
+    :param paths: Files and directories.
+    :type paths: list
+
+    :returns: Absolute paths of all schema files, without duplicates.
+    :rtype: list
+    """
+    filenames = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for dirpath, dirnames, files in os.walk(path):
+                dirnames.sort()
+                for name in sorted(files):
+                    if name.endswith('.bfbs'):
+                        filenames.append(os.path.join(dirpath, name))
+        elif os.path.isfile(path):
+            filenames.append(path)
+        else:
+            raise Exception('no such file or directory "{}"'.format(path))
+
+    seen = set()
+    res = []
+    for filename in filenames:
+        if filename not in seen:
+            seen.add(filename)
+            res.append(filename)
+    return res
+
+
+def _load_schema_file(filename, use_mmap, use_cache):
+    # worker function for load_schemas(): runs in a separate process
+    started = time.perf_counter()
+    cache = SchemaCache() if use_cache else None
+    schema = read_schema_file(filename, use_mmap=use_mmap, cache=cache)
+    schema['meta']['file_name'] = os.path.basename(filename)
+    schema['meta']['file_path'] = filename
+    return filename, schema, time.perf_counter() - started
+
+
+def merge_schemas(schemas):
+    """
+    Merge extracted schemas into one type registry.
+
+    The same qualified name may be defined in multiple schemas (eg when they
+    include a common .fbs file), but only with an identical definition.
+
+    :param schemas: The schemas to merge (in order).
+    :type schemas: list
+
+    :returns: The merged schema, with the metadata of all schemas in
+        ``meta['files']``.
+    :rtype: dict
+    """
+    registry = {
+        'meta': {
+            'files': [],
+        },
+        'types': {},
+    }  # type: Dict[str, Any]
+    defined_in = {}  # type: Dict[str, str]
+
+    for schema in schemas:
+        file_path = schema['meta'].get('file_path', None)
+        registry['meta']['files'].append(schema['meta'])
+        for name, typedef in schema['types'].items():
+            if name in registry['types']:
+                if registry['types'][name] != typedef:
+                    raise Exception(
+                        'conflicting definitions for qualified name "{}" in "{}" and "{}"'.
+                        format(name, defined_in[name], file_path))
+            else:
+                registry['types'][name] = typedef
+                defined_in[name] = file_path
+
+    return registry
+
+
+def load_schemas(filenames,
+                 max_workers=None,
+                 use_mmap=True,
+                 use_cache=True,
+                 on_loaded=None):
+    """
+    Load many schema files in parallel (one process per file at a time)
+    and merge them into one type registry, see :func:`merge_schemas`.
+
+    :param filenames: The schema files to load (see :func:`read_schema_file`).
+    :type filenames: list
+    :param max_workers: Maximum number of worker processes (default: number of CPUs).
+    :type max_workers: int
+    :param use_mmap: Memory-map schema files instead of reading them.
+    :type use_mmap: bool
+    :param use_cache: Use (and update) the default schema cache.
+    :type use_cache: bool
+    :param on_loaded: Optional callback fired with ``(filename, duration)`` as
+        each file is loaded (``duration`` in seconds, within the worker).
+    :type on_loaded: callable
+
+    :returns: The merged schema.
+    :rtype: dict
+    """
+    schemas = {}
+    if len(filenames) == 1 or max_workers == 1:
+        for filename in filenames:
+            _, schema, duration = _load_schema_file(filename, use_mmap,
+                                                    use_cache)
+            schemas[filename] = schema
+            if on_loaded:
+                on_loaded(filename, duration)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_load_schema_file, filename, use_mmap,
+                                use_cache) for filename in filenames
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                filename, schema, duration = future.result()
+                schemas[filename] = schema
+                if on_loaded:
+                    on_loaded(filename, duration)
+
+    # merge in the order given, not in the order loaded
+    return merge_schemas([schemas[filename] for filename in filenames])
+
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        'infile', help='FlatBuffers binary schema input file (.bfbs)')
+        'infile',
+        nargs='+',
+        help='FlatBuffers binary schema input files (.bfbs), schema source '
+        'files (.fbs) or directories')
     parser.add_argument(
         '-o', '--outfile', help='FlatBuffers JSON schema output (.json)')
+    parser.add_argument(
+        '--no-mmap',
+        action='store_true',
+        help='Read the input file into memory instead of memory-mapping it.')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use (or update) the schema cache in {}.'.format(
+            SchemaCache.DEFAULT_CACHE_DIR))
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Write definitions to the output as they are extracted, without '
+        'building the complete schema in memory (single input file only, '
+        'does not use the schema cache).')
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Write compact (non-indented) JSON.')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=None,
+        help='Number of worker processes when loading multiple files '
+        '(default: number of CPUs).')
     parser.add_argument(
         '-v',
         '--verbose',
@@ -485,33 +986,82 @@ if __name__ == '__main__':
     log = txaio.make_logger()
     txaio.start_logging(level='debug' if options.debug else 'info')
 
-    infile_path = os.path.abspath(options.infile)
-    with open(infile_path, 'rb') as f:
-        buf = f.read()
+    infiles = find_schema_files(options.infile)
+    single_file = len(infiles) == 1 and not os.path.isdir(options.infile[0])
 
-    log.info('Loading FlatBuffers binary schema ({} bytes) ...'.format(
-        len(buf)))
+    if options.stream and not single_file:
+        raise Exception('--stream requires a single input file')
 
-    try:
-        schema = read_reflection_schema(buf, log=log)
-    except Exception as e:
-        log.error(e)
-
-    if True:
-        schema['meta']['file_name'] = os.path.basename(options.infile)
-        schema['meta']['file_path'] = infile_path
-
-    with open(options.outfile, 'wb') as f:
-        outdata = json.dumps(
-            schema,
-            ensure_ascii=False,
-            sort_keys=False,
-            indent=4,
-            separators=(', ', ': ')).encode('utf8')
-        f.write(outdata)
-
-    cnt_bytes = len(outdata)
-    cnt_defs = len(schema['types'].keys())
+    if options.stream and infiles[0].endswith('.fbs'):
+        raise Exception('--stream requires a binary schema input file')
+
+    if options.stream:
+
+        infile_path = infiles[0]
+
+        log.info('Streaming FlatBuffers binary schema ({} bytes) ...'.format(
+            os.path.getsize(infile_path)))
+
+        with atomic_output(options.outfile) as f:
+            cnt_defs = stream_reflection_schema_file(
+                infile_path,
+                f,
+                use_mmap=not options.no_mmap,
+                compact=options.compact,
+                log=log)
+
+        log.info(
+            'FlatBuffers JSON schema data written ({} bytes, {} defs).'.format(
+                os.path.getsize(options.outfile), cnt_defs))
+
+        sys.exit(0)
+
+    if single_file:
+
+        infile_path = infiles[0]
+
+        log.info('Loading FlatBuffers schema ({} bytes) ...'.format(
+            os.path.getsize(infile_path)))
+
+        cache = None if options.no_cache else SchemaCache()
+
+        try:
+            schema = read_schema_file(
+                infile_path,
+                use_mmap=not options.no_mmap,
+                cache=cache,
+                log=log)
+        except Exception as e:
+            log.error(e)
+
+        if True:
+            schema['meta']['file_name'] = os.path.basename(infile_path)
+            schema['meta']['file_path'] = infile_path
+
+    else:
+
+        log.info('Loading {} FlatBuffers binary schemas ({} bytes) ...'.format(
+            len(infiles), sum(os.path.getsize(x) for x in infiles)))
+
+        def on_loaded(filename, duration):
+            log.info('{:>10.1f} ms: {}'.format(1000. * duration, filename))
+
+        started = time.perf_counter()
+        schema = load_schemas(
+            infiles,
+            max_workers=options.jobs,
+            use_mmap=not options.no_mmap,
+            use_cache=not options.no_cache,
+            on_loaded=on_loaded)
+        log.info('Loaded and merged {} schemas in {:.1f} ms.'.format(
+            len(infiles), 1000. * (time.perf_counter() - started)))
+
+    with atomic_output(options.outfile) as f:
+        cnt_defs = write_schema_json(f, schema['meta'],
+                                     schema['types'].values(),
+                                     options.compact)
+
+    cnt_bytes = os.path.getsize(options.outfile)
     log.info(
         'FlatBuffers JSON schema data written ({} bytes, {} defs).'.format(
             cnt_bytes, cnt_defs))
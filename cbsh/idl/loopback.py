@@ -0,0 +1,202 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+import asyncio
+import itertools
+
+import txaio
+txaio.use_asyncio()
+
+from autobahn.wamp.exception import ApplicationError  # noqa: E402
+
+__all__ = ('LoopbackRouter', 'LoopbackSession', 'CallDetails', 'EventDetails')
+
+
+class CallDetails(object):
+    """
+    Details of a call, passed to endpoints registered with ``details_arg``
+    (a subset of :class:`autobahn.wamp.types.CallDetails`).
+    """
+
+    __slots__ = ('registration', 'progress', 'caller', 'procedure')
+
+    def __init__(self, registration, progress=None, caller=None, procedure=None):
+        self.registration = registration
+        self.progress = progress
+        self.caller = caller
+        self.procedure = procedure
+
+
+class EventDetails(object):
+    """
+    Details of an event, passed to handlers subscribed with ``details_arg``
+    (a subset of :class:`autobahn.wamp.types.EventDetails`).
+    """
+
+    __slots__ = ('subscription', 'publication', 'publisher', 'topic')
+
+    def __init__(self, subscription, publication, publisher=None, topic=None):
+        self.subscription = subscription
+        self.publication = publication
+        self.publisher = publisher
+        self.topic = topic
+
+
+class _Registration(object):
+
+    __slots__ = ('id', 'session', 'procedure', 'endpoint', 'details_arg')
+
+    def __init__(self, id, session, procedure, endpoint, details_arg):
+        self.id = id
+        self.session = session
+        self.procedure = procedure
+        self.endpoint = endpoint
+        self.details_arg = details_arg
+
+    async def unregister(self):
+        self.session._router._registrations.pop(self.procedure, None)
+
+
+class _Subscription(object):
+
+    __slots__ = ('id', 'session', 'topic', 'handler', 'details_arg')
+
+    def __init__(self, id, session, topic, handler, details_arg):
+        self.id = id
+        self.session = session
+        self.topic = topic
+        self.handler = handler
+        self.details_arg = details_arg
+
+    async def unsubscribe(self):
+        subscriptions = self.session._router._subscriptions.get(self.topic, [])
+        if self in subscriptions:
+            subscriptions.remove(self)
+
+
+class LoopbackRouter(object):
+    """
+    In-process stand-in for a WAMP router, for testing (and benchmarking) WAMP
+    clients and components without network, serialization or a Crossbar.io
+    node.
+
+    Sessions of the router (see :meth:`session`) provide the subset of the
+    :class:`autobahn.wamp.interfaces.ISession` API used by the generated
+    client proxies: ``register``, ``call`` (with progressive results),
+    ``subscribe`` and ``publish``. Call arguments and event payloads are
+    passed through as is (exact URI matching only).
+    """
+
+    def __init__(self):
+        self.log = txaio.make_logger()
+        self._ids = itertools.count(1)
+        self._registrations = {}
+        self._subscriptions = {}
+
+    def __str__(self):
+        return u'LoopbackRouter(registrations={}, subscriptions={})'.format(
+            len(self._registrations), sum(len(s) for s in self._subscriptions.values()))
+
+    def session(self):
+        """
+        Create a new session attached to this router.
+
+        :rtype: :class:`LoopbackSession`
+        """
+        return LoopbackSession(self, next(self._ids))
+
+
+class LoopbackSession(object):
+    """
+    A session attached to a :class:`LoopbackRouter`.
+    """
+
+    def __init__(self, router, session_id):
+        self._router = router
+        self.session_id = session_id
+
+    def __str__(self):
+        return u'LoopbackSession(session_id={})'.format(self.session_id)
+
+    async def register(self, endpoint, procedure, options=None):
+        router = self._router
+        if procedure in router._registrations:
+            raise ApplicationError(ApplicationError.PROCEDURE_ALREADY_EXISTS,
+                                   'procedure "{}" already registered'.format(procedure))
+        registration = _Registration(next(router._ids), self, procedure, endpoint,
+                                     getattr(options, 'details_arg', None))
+        router._registrations[procedure] = registration
+        return registration
+
+    async def call(self, procedure, *args, **kwargs):
+        options = kwargs.pop('options', None)
+        registration = self._router._registrations.get(procedure, None)
+        if registration is None:
+            raise ApplicationError(ApplicationError.NO_SUCH_PROCEDURE,
+                                   'no procedure "{}" registered'.format(procedure))
+        if registration.details_arg:
+            kwargs[registration.details_arg] = CallDetails(
+                registration,
+                progress=getattr(options, 'on_progress', None),
+                caller=self.session_id,
+                procedure=procedure)
+        result = registration.endpoint(*args, **kwargs)
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            result = await result
+        return result
+
+    async def subscribe(self, handler, topic, options=None):
+        router = self._router
+        subscription = _Subscription(next(router._ids), self, topic, handler,
+                                     getattr(options, 'details_arg', None))
+        router._subscriptions.setdefault(topic, []).append(subscription)
+        return subscription
+
+    def publish(self, topic, *args, **kwargs):
+        """
+        Publish an event. Handlers are run right away (coroutine handlers are
+        scheduled on the event loop). As with a WAMP router, the publisher
+        does not receive its own event unless ``options.exclude_me`` is
+        ``False``.
+        """
+        options = kwargs.pop('options', None)
+        exclude_me = getattr(options, 'exclude_me', None) is not False
+        for subscription in list(self._router._subscriptions.get(topic, [])):
+            if exclude_me and subscription.session is self:
+                continue
+            _kwargs = kwargs
+            if subscription.details_arg:
+                _kwargs = dict(kwargs)
+                _kwargs[subscription.details_arg] = EventDetails(
+                    subscription, next(self._router._ids), publisher=self.session_id,
+                    topic=topic)
+            result = subscription.handler(*args, **_kwargs)
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
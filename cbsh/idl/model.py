@@ -0,0 +1,418 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+import sys
+
+import txaio
+
+from cbsh.idl.accessor import Schema
+from cbsh.idl.loader import (SchemaIndex, extract_schema_meta,
+                             iter_schema_types)
+
+__all__ = ('EnumDef', 'TableDef', 'FieldDef', 'ServiceDef', 'SlotDef',
+           'SchemaModel', 'typedef_from_dict', 'read_schema_model')
+
+
+def _intern(value):
+    return sys.intern(value) if value is not None else None
+
+
+class EnumDef(object):
+    """
+    Enum definition.
+
+    Enum values are held as an (ordered) mapping of value name to the tuple of
+    documentation lines of the value.
+    """
+
+    __slots__ = ('name', 'docs', 'values', 'attr', 'hash')
+
+    type = 'enum'
+
+    def __init__(self, name, docs=(), values=None, attr=None, hash=None):
+        self.name = name
+        self.docs = docs
+        self.values = values or {}
+        self.attr = attr
+        self.hash = hash
+
+    def __str__(self):
+        return u'EnumDef(name={}, values={})'.format(self.name,
+                                                     len(self.values))
+
+    @staticmethod
+    def from_dict(data):
+        return EnumDef(
+            _intern(data['name']), tuple(data['docs']), {
+                _intern(name): tuple(value['docs'])
+                for name, value in data['values'].items()
+            }, data.get('attr', None), data.get('hash', None))
+
+    def to_dict(self):
+        data = {
+            'type': self.type,
+            'name': self.name,
+            'docs': list(self.docs),
+        }
+        if self.attr is not None:
+            data['attr'] = self.attr
+        data['values'] = {
+            name: {
+                'docs': list(docs)
+            }
+            for name, docs in self.values.items()
+        }
+        if self.hash is not None:
+            data['hash'] = self.hash
+        return data
+
+
+class FieldDef(object):
+    """
+    Field definition (of a table or struct).
+    """
+
+    __slots__ = ('name', 'id', 'offset', 'base_type', 'element_type',
+                 'default', 'ref_category', 'ref_type', 'docs', 'attr')
+
+    def __init__(self,
+                 name,
+                 id,
+                 offset,
+                 base_type,
+                 element_type=None,
+                 ref_category=None,
+                 ref_type=None,
+                 docs=(),
+                 attr=None,
+                 default=None):
+        self.name = name
+        self.id = id
+        self.offset = offset
+        self.base_type = base_type
+        self.element_type = element_type
+        self.default = default
+        self.ref_category = ref_category
+        self.ref_type = ref_type
+        self.docs = docs
+        self.attr = attr
+
+    def __str__(self):
+        return u'FieldDef(name={}, base_type={})'.format(
+            self.name, self.base_type)
+
+    @staticmethod
+    def from_dict(data):
+        return FieldDef(
+            _intern(data['name']), data['id'], data['offset'],
+            _intern(data['base_type']), _intern(
+                data.get('element_type', None)),
+            _intern(data.get('ref_category', None)),
+            _intern(data.get('ref_type', None)), tuple(data.get('docs', ())),
+            data.get('attr', None), data.get('default', None))
+
+    def to_dict(self):
+        data = {
+            'name': self.name,
+            'id': self.id,
+            'offset': self.offset,
+            'base_type': self.base_type,
+        }
+        if self.element_type is not None:
+            data['element_type'] = self.element_type
+        if self.default is not None:
+            data['default'] = self.default
+        if self.ref_category is not None:
+            data['ref_category'] = self.ref_category
+            data['ref_type'] = self.ref_type
+        if self.docs:
+            data['docs'] = list(self.docs)
+        if self.attr is not None:
+            data['attr'] = self.attr
+        return data
+
+
+class TableDef(object):
+    """
+    Table or struct definition.
+
+    Fields are held as an (ordered) mapping of field name to :class:`FieldDef`.
+    Structs also have a fixed memory layout (``minalign`` and ``bytesize``).
+    """
+
+    __slots__ = ('type', 'name', 'docs', 'fields', 'attr', 'minalign',
+                 'bytesize', 'hash')
+
+    def __init__(self,
+                 name,
+                 docs=(),
+                 fields=None,
+                 is_struct=False,
+                 attr=None,
+                 minalign=None,
+                 bytesize=None,
+                 hash=None):
+        self.type = 'struct' if is_struct else 'table'
+        self.name = name
+        self.docs = docs
+        self.fields = fields or {}
+        self.attr = attr
+        self.minalign = minalign
+        self.bytesize = bytesize
+        self.hash = hash
+
+    def __str__(self):
+        return u'TableDef(type={}, name={}, fields={})'.format(
+            self.type, self.name, len(self.fields))
+
+    @property
+    def is_struct(self):
+        return self.type == 'struct'
+
+    @staticmethod
+    def from_dict(data):
+        return TableDef(
+            _intern(data['name']), tuple(data['docs']), {
+                field.name: field
+                for field in map(FieldDef.from_dict, data['fields'].values())
+            }, data['type'] == 'struct', data.get('attr', None),
+            data.get('minalign', None), data.get('bytesize', None),
+            data.get('hash', None))
+
+    def to_dict(self):
+        data = {
+            'type': self.type,
+            'name': self.name,
+            'docs': list(self.docs),
+        }
+        if self.attr is not None:
+            data['attr'] = self.attr
+        data['fields'] = {
+            name: field.to_dict()
+            for name, field in self.fields.items()
+        }
+        if self.minalign is not None:
+            data['minalign'] = self.minalign
+            data['bytesize'] = self.bytesize
+        if self.hash is not None:
+            data['hash'] = self.hash
+        return data
+
+
+class SlotDef(object):
+    """
+    Slot definition (procedure or topic of an interface).
+    """
+
+    __slots__ = ('type', 'name', 'in_type', 'out_type', 'stream', 'docs')
+
+    def __init__(self,
+                 type,
+                 name,
+                 in_type=None,
+                 out_type=None,
+                 stream=None,
+                 docs=()):
+        self.type = type
+        self.name = name
+        self.in_type = in_type
+        self.out_type = out_type
+        self.stream = stream
+        self.docs = docs
+
+    def __str__(self):
+        return u'SlotDef(type={}, name={}, in={}, out={})'.format(
+            self.type, self.name, self.in_type, self.out_type)
+
+    @staticmethod
+    def from_dict(data):
+        return SlotDef(
+            _intern(data['type']), _intern(data['name']),
+            _intern(data['in']), _intern(data['out']),
+            _intern(data['stream']), tuple(data['docs']))
+
+    def to_dict(self):
+        return {
+            'type': self.type,
+            'name': self.name,
+            'in': self.in_type,
+            'out': self.out_type,
+            'stream': self.stream,
+            'docs': list(self.docs),
+        }
+
+
+class ServiceDef(object):
+    """
+    Service (XBR interface) definition.
+
+    Slots are held as an (ordered) mapping of slot name to :class:`SlotDef`.
+    """
+
+    __slots__ = ('name', 'docs', 'uuid', 'slots', 'attrs', 'hash')
+
+    type = 'interface'
+
+    def __init__(self,
+                 name,
+                 docs=(),
+                 uuid=None,
+                 slots=None,
+                 attrs=None,
+                 hash=None):
+        self.name = name
+        self.docs = docs
+        self.uuid = uuid
+        self.slots = slots or {}
+        self.attrs = attrs
+        self.hash = hash
+
+    def __str__(self):
+        return u'ServiceDef(name={}, uuid={}, slots={})'.format(
+            self.name, self.uuid, len(self.slots))
+
+    @staticmethod
+    def from_dict(data):
+        return ServiceDef(
+            _intern(data['name']), tuple(data['docs']),
+            data.get('uuid', None), {
+                slot.name: slot
+                for slot in map(SlotDef.from_dict, data['slots'].values())
+            }, data.get('attrs', None), data.get('hash', None))
+
+    def to_dict(self):
+        data = {
+            'type': self.type,
+            'name': self.name,
+            'docs': list(self.docs),
+        }
+        if self.attrs is not None:
+            data['attrs'] = self.attrs
+        else:
+            data['uuid'] = self.uuid
+        data['slots'] = {
+            name: slot.to_dict()
+            for name, slot in self.slots.items()
+        }
+        if self.hash is not None:
+            data['hash'] = self.hash
+        return data
+
+
+_FROM_DICT = {
+    'enum': EnumDef.from_dict,
+    'table': TableDef.from_dict,
+    'struct': TableDef.from_dict,
+    'interface': ServiceDef.from_dict,
+}
+
+
+def typedef_from_dict(data):
+    """
+    Create a model definition from a definition dict (as extracted by the
+    schema loader).
+
+    :param data: The definition.
+    :type data: dict
+
+    :returns: The model definition.
+    :rtype: :class:`EnumDef`, :class:`TableDef` or :class:`ServiceDef`
+    """
+    return _FROM_DICT[data['type']](data)
+
+
+class SchemaModel(object):
+    """
+    Typed, compact schema model, an alternative to the nested dicts returned
+    by :func:`cbsh.idl.loader.read_reflection_schema`.
+
+    Definitions are :class:`EnumDef`, :class:`TableDef` (tables and structs)
+    and :class:`ServiceDef` instances with ``__slots__``, names are interned
+    and documentation lines are held in tuples.
+    """
+
+    __slots__ = ('meta', 'types')
+
+    def __init__(self, meta, types=None):
+        self.meta = meta
+        self.types = types or {}
+
+    def __str__(self):
+        return u'SchemaModel(types={})'.format(len(self.types))
+
+    @staticmethod
+    def from_dict(data):
+        return SchemaModel(
+            dict(data['meta']), {
+                name: typedef_from_dict(typedef)
+                for name, typedef in data['types'].items()
+            })
+
+    def to_dict(self):
+        """
+        Convert the model to the plain, JSON serializable dict (as returned by
+        :func:`cbsh.idl.loader.read_reflection_schema`).
+        """
+        return {
+            'meta': dict(self.meta),
+            'types': {
+                name: typedef.to_dict()
+                for name, typedef in self.types.items()
+            },
+        }
+
+
+def read_schema_model(buf, log=None):
+    """
+    Read a binary FlatBuffers reflection schema into a :class:`SchemaModel`.
+
+    Definitions are extracted and converted one at a time, so that the full
+    dict representation of the schema is never built.
+
+    :param buf: The binary reflection schema (anything supporting the
+        buffer protocol).
+
+    :returns: The schema model.
+    :rtype: :class:`SchemaModel`
+    """
+    if not log:
+        log = txaio.make_logger()
+
+    _schema = Schema.GetRootAsSchema(buf, 0)
+
+    model = SchemaModel(extract_schema_meta(_schema, buf))
+
+    types = model.types
+    for typedef in iter_schema_types(_schema, SchemaIndex(_schema), log):
+        typedef = typedef_from_dict(typedef)
+        types[typedef.name] = typedef
+
+    return model
@@ -0,0 +1,104 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+__all__ = ('NUMPY_FORMATS', 'struct_dtype', 'struct_vector_fields')
+
+# NumPy array-protocol type strings of FlatBuffers scalars (little endian)
+NUMPY_FORMATS = {
+    'utype': 'u1',
+    'bool': '?',
+    'int8': 'i1',
+    'uint8': 'u1',
+    'int16': '<i2',
+    'uint16': '<u2',
+    'int32': '<i4',
+    'uint32': '<u4',
+    'int64': '<i8',
+    'uint64': '<u8',
+    'float': '<f4',
+    'double': '<f8',
+}
+
+
+def struct_dtype(types, name):
+    """
+    Compute the NumPy structured dtype of a FlatBuffers struct, from the
+    struct layout extracted by the schema loader (field offsets and struct
+    byte size, including any padding).
+
+    The dtype is returned as a plain specification (no NumPy needed), which
+    ``numpy.dtype(spec)`` accepts. Nested structs become nested specifications.
+
+    :param types: The type registry (``schema['types']``).
+    :type types: dict
+    :param name: Qualified name of the struct.
+    :type name: str
+
+    :returns: The dtype specification, a dict with ``names``, ``formats``,
+        ``offsets`` and ``itemsize``.
+    :rtype: dict
+    """
+    struct = types[name]
+    if struct['type'] != 'struct':
+        raise Exception('"{}" is not a struct'.format(name))
+
+    spec = {'names': [], 'formats': [], 'offsets': [], 'itemsize': struct['bytesize']}
+    for field in struct['fields'].values():
+        if field['base_type'] == 'object' and field.get('ref_category', None) == 'struct':
+            fmt = struct_dtype(types, field['ref_type'])
+        elif field['base_type'] in NUMPY_FORMATS:
+            fmt = NUMPY_FORMATS[field['base_type']]
+        else:
+            raise Exception('unsupported type "{}" of struct field "{}.{}"'.format(
+                field['base_type'], name, field['name']))
+        spec['names'].append(field['name'])
+        spec['formats'].append(fmt)
+        spec['offsets'].append(field['offset'])
+    return spec
+
+
+def struct_vector_fields(types):
+    """
+    Find all table fields which are vectors of structs.
+
+    :param types: The type registry (``schema['types']``).
+    :type types: dict
+
+    :returns: List of ``(table, field)`` tuples (the definitions).
+    :rtype: list of tuple
+    """
+    result = []
+    for typedef in types.values():
+        if typedef['type'] != 'table':
+            continue
+        for field in typedef['fields'].values():
+            if field['base_type'] == 'vector' and field.get('ref_category', None) == 'struct':
+                result.append((typedef, field))
+    return result
@@ -0,0 +1,286 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+import os
+import re
+import uuid
+import marshal
+import hashlib
+import tempfile
+
+import txaio
+txaio.use_asyncio()
+
+import docutils  # noqa: E402
+from docutils.core import publish_parts  # noqa: E402
+from docutils import frontend  # noqa: E402
+from docutils.parsers.rst import Parser  # noqa: E402
+from docutils.readers.standalone import Reader  # noqa: E402
+from docutils.writers.html4css1 import Writer  # noqa: E402
+
+__all__ = ('RstRenderer', )
+
+_HEADER = b'CBSR' + bytes([1]) + docutils.__version__.encode('ascii') + b'\0'
+
+_DOC_START = '<div class="document">\n'
+_DOC_END = '</div>\n'
+
+# reST constructs that interact with the rest of the document (section titles
+# and transitions, explicit markup like targets, directives and footnotes,
+# hyperlink/footnote references, and leading field lists which are turned into
+# docinfo): fragments using them are always rendered as a document of their own
+_OWN_DOCUMENT = re.compile(
+    r'^([!-/:-@\[-`{-~])\1+\s*$|^\s*\.\.(\s|$)|^\s*__(\s|$)|[\w`\]]__?(?!\w)',
+    re.MULTILINE)
+
+
+def _needs_own_document(text):
+    return bool(_OWN_DOCUMENT.search(text)) or text.lstrip().startswith(':')
+
+
+class RstRenderer(object):
+    """
+    Renders reStructuredText fragments (eg the docs of schema definitions)
+    to HTML (the ``html_body`` as rendered by docutils).
+
+    Rendered fragments are cached by the SHA256 of their source text, in memory
+    and optionally on disk (in one file, see :meth:`flush`). The docutils
+    settings are built once and reused for all fragments.
+
+    :meth:`render_batch` renders many fragments in a single docutils run, and
+    splits the output again.
+    """
+
+    DEFAULT_CACHE_DIR = u'~/.cbf/rst-cache'
+
+    CACHE_FILE = u'rst.cache'
+
+    def __init__(self, cache_dir=None, disk_cache=False):
+        """
+
+        :param cache_dir: Cache directory for the disk cache, created if it does
+            not yet exist (default: ``~/.cbf/rst-cache``).
+        :type cache_dir: str
+        :param disk_cache: Enable the disk cache.
+        :type disk_cache: bool
+        """
+        self.log = txaio.make_logger()
+        self._settings = None
+        self._cache = {}
+        self._dirty = False
+
+        # fragments rendered since last taken, see take_rendered()
+        self._rendered = {}
+        self._cache_path = None
+        if disk_cache or cache_dir:
+            cache_dir = os.path.abspath(
+                os.path.expanduser(cache_dir or self.DEFAULT_CACHE_DIR))
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            self._cache_path = os.path.join(cache_dir, self.CACHE_FILE)
+            self._load()
+
+    def __str__(self):
+        return u'RstRenderer(cache_path={}, cached={})'.format(
+            self._cache_path, len(self._cache))
+
+    def _load(self):
+        try:
+            with open(self._cache_path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            return
+        if data[:len(_HEADER)] == _HEADER:
+            try:
+                self._cache.update(marshal.loads(data[len(_HEADER):]))
+                return
+            except (EOFError, ValueError, TypeError):
+                pass
+        # written by another cache format, Python or docutils version
+        self.log.debug('dropping stale reST cache {}'.format(self._cache_path))
+
+    def flush(self):
+        """
+        Write the rendered fragments to the disk cache (if enabled and there
+        are new fragments).
+        """
+        if not self._cache_path or not self._dirty:
+            return
+        data = _HEADER + marshal.dumps(self._cache)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self._cache_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._cache_path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        self._dirty = False
+
+    def _publish(self, text):
+        if self._settings is None:
+            if hasattr(frontend, 'get_default_settings'):
+                # docutils >= 0.18
+                self._settings = frontend.get_default_settings(
+                    Parser, Reader, Writer)
+            else:
+                self._settings = frontend.OptionParser(
+                    components=(Parser, Reader, Writer)).get_default_values()
+        return publish_parts(
+            source=text, writer=Writer(),
+            settings=self._settings)['html_body']
+
+    def _put(self, key, html):
+        self._cache[key] = html
+        self._rendered[key] = html
+        self._dirty = True
+
+    def take_rendered(self):
+        """
+        Take the fragments rendered since last taken (eg to merge the
+        fragments rendered in a worker process into the renderer of the
+        parent process, see :meth:`merge`).
+
+        :returns: The rendered HTML by cache key.
+        :rtype: dict
+        """
+        rendered, self._rendered = self._rendered, {}
+        return rendered
+
+    def merge(self, rendered):
+        """
+        Merge rendered fragments (as taken from another renderer) into the
+        cache.
+
+        :param rendered: The rendered HTML by cache key.
+        :type rendered: dict
+        """
+        for key, html in rendered.items():
+            if key not in self._cache:
+                self._cache[key] = html
+                self._dirty = True
+
+    def render(self, text):
+        """
+        Render a reStructuredText fragment.
+
+        :param text: The reStructuredText source.
+        :type text: str
+
+        :returns: The rendered HTML.
+        :rtype: str
+        """
+        key = hashlib.sha256(text.encode('utf8')).hexdigest()
+        html = self._cache.get(key, None)
+        if html is None:
+            html = self._publish(text)
+            self._put(key, html)
+        return html
+
+    def render_batch(self, texts):
+        """
+        Render many reStructuredText fragments, in a single docutils run for
+        all fragments not yet cached.
+
+        The fragments are separated by unique marker paragraphs, and the output
+        is split again at the markers. Fragments using constructs that interact
+        with the rest of the document (like section titles or targets) are
+        rendered on their own. When docutils reports problems for a batch, the
+        batch is split in halves until the offending fragments are rendered on
+        their own. The result is identical to rendering every
+        fragment with :meth:`render`.
+
+        :param texts: The reStructuredText sources.
+        :type texts: list of str
+
+        :returns: The rendered HTML (in the order of ``texts``).
+        :rtype: list of str
+        """
+        keys = [hashlib.sha256(text.encode('utf8')).hexdigest() for text in texts]
+
+        batch = {}
+        for key, text in zip(keys, texts):
+            if key not in self._cache and key not in batch:
+                if _needs_own_document(text):
+                    self._put(key, self._publish(text))
+                else:
+                    batch[key] = text
+
+        if batch:
+            self._render_batch(list(batch.items()))
+
+        return [self._cache[key] for key in keys]
+
+    def _render_batch(self, batch):
+        if len(batch) == 1:
+            key, text = batch[0]
+            self._put(key, self._publish(text))
+            return
+
+        token = 'cbshrst{}x'.format(uuid.uuid4().hex)
+        markers = ['{}{}'.format(token, i) for i in range(len(batch) + 1)]
+
+        source = []
+        for marker, (_, text) in zip(markers, batch):
+            source.append(marker)
+            source.append('\n\n')
+            source.append(text)
+            source.append('\n\n')
+        source.append(markers[-1])
+        source.append('\n')
+
+        html = self._publish(''.join(source))
+
+        pieces = None
+        if 'system-message' not in html and html.startswith(
+                _DOC_START) and html.endswith(_DOC_END):
+            html = html[len(_DOC_START):-len(_DOC_END)]
+            pieces = html.split('<p>{}'.format(token))
+            # first piece is empty, then one per fragment (and the last marker)
+            if pieces[0] or len(pieces) != len(markers) + 1:
+                pieces = None
+
+        if pieces is None:
+            self.log.debug('batch rendering of {} fragments failed: '
+                           'splitting batch'.format(len(batch)))
+            half = len(batch) // 2
+            self._render_batch(batch[:half])
+            self._render_batch(batch[half:])
+            return
+
+        for i, (key, _) in enumerate(batch):
+            prefix = '{}</p>\n'.format(i)
+            piece = pieces[i + 1]
+            if not piece.startswith(prefix):
+                # never happens: the markers are unique
+                raise Exception('unexpected batch rendering output')
+            self._put(key, _DOC_START + piece[len(prefix):] + _DOC_END)
@@ -0,0 +1,337 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+import flatbuffers
+
+from cbsh.reflection.Schema import (
+    SchemaStart, SchemaAddObjects, SchemaStartObjectsVector, SchemaAddEnums,
+    SchemaStartEnumsVector, SchemaAddFileIdent, SchemaAddFileExt,
+    SchemaAddServices, SchemaStartServicesVector, SchemaEnd)
+from cbsh.reflection.Object import (
+    ObjectStart, ObjectAddName, ObjectAddFields, ObjectStartFieldsVector,
+    ObjectAddIsStruct, ObjectAddMinalign, ObjectAddBytesize,
+    ObjectAddDocumentation, ObjectStartDocumentationVector, ObjectEnd)
+from cbsh.reflection.Field import (
+    FieldStart, FieldAddName, FieldAddType, FieldAddId, FieldAddOffset,
+    FieldAddDefaultInteger, FieldAddDocumentation,
+    FieldStartDocumentationVector, FieldEnd)
+from cbsh.reflection.Type import (TypeStart, TypeAddBaseType, TypeAddElement,
+                                  TypeAddIndex, TypeEnd)
+from cbsh.reflection.Enum import (
+    EnumStart, EnumAddName, EnumAddValues, EnumStartValuesVector,
+    EnumAddUnderlyingType, EnumAddDocumentation, EnumStartDocumentationVector,
+    EnumEnd)
+from cbsh.reflection.EnumVal import (
+    EnumValStart, EnumValAddName, EnumValAddValue, EnumValAddDocumentation,
+    EnumValStartDocumentationVector, EnumValEnd)
+from cbsh.reflection.Service import (
+    ServiceStart, ServiceAddName, ServiceAddCalls, ServiceStartCallsVector,
+    ServiceAddAttributes, ServiceStartAttributesVector, ServiceAddDocumentation,
+    ServiceStartDocumentationVector, ServiceEnd)
+from cbsh.reflection.RPCCall import (
+    RPCCallStart, RPCCallAddName, RPCCallAddRequest, RPCCallAddResponse,
+    RPCCallAddAttributes, RPCCallStartAttributesVector,
+    RPCCallAddDocumentation, RPCCallStartDocumentationVector, RPCCallEnd)
+from cbsh.reflection.KeyValue import (KeyValueStart, KeyValueAddKey,
+                                      KeyValueAddValue, KeyValueEnd)
+
+#
+# Synthetic FlatBuffers reflection schemas (the binary .bfbs format produced by
+# "flatc --binary --schema"), built directly with the FlatBuffers Builder, so
+# that no flatc compiler is needed. Used by unit tests and the IDL benchmarks.
+#
+
+# FlatBuffers reflection base type IDs (see reflection.fbs)
+_UBYTE = 4
+_UINT = 8
+_ULONG = 10
+_FLOAT = 11
+_STRING = 13
+_VECTOR = 14
+_OBJ = 15
+
+# the (cycling) kinds of table fields generated
+_FIELD_KINDS = ['uint64', 'string', 'enum', 'bytes', 'table', 'tables']
+
+
+def _vector(builder, start_vector, offsets):
+    start_vector(builder, len(offsets))
+    for off in reversed(offsets):
+        builder.PrependUOffsetTRelative(off)
+    return builder.EndVector()
+
+
+def _docs(builder, start_vector, lines):
+    return _vector(builder, start_vector,
+                   [builder.CreateString(line) for line in lines])
+
+
+def _attrs(builder, start_vector, attrs):
+    offsets = []
+    for key in sorted(attrs):
+        _key = builder.CreateString(key)
+        _value = builder.CreateString(attrs[key])
+        KeyValueStart(builder)
+        KeyValueAddKey(builder, _key)
+        KeyValueAddValue(builder, _value)
+        offsets.append(KeyValueEnd(builder))
+    return _vector(builder, start_vector, offsets)
+
+
+def _type(builder, base_type, element=0, index=-1):
+    TypeStart(builder)
+    TypeAddBaseType(builder, base_type)
+    TypeAddElement(builder, element)
+    TypeAddIndex(builder, index)
+    return TypeEnd(builder)
+
+
+def _doc_lines(what, doc_lines):
+    return [
+        ' Documentation line {} for {}.'.format(k, what)
+        for k in range(doc_lines)
+    ]
+
+
+def build_schema(enums=4,
+                 tables=8,
+                 fields=8,
+                 structs=2,
+                 services=2,
+                 slots=4,
+                 values=4,
+                 doc_lines=1,
+                 namespace='synth',
+                 defaults=False):
+    """
+    Build a synthetic FlatBuffers reflection schema buffer.
+
+    All names are zero padded, so that the generated definitions come out sorted
+    by name (as flatc does). Table fields cycle through scalar, string, enum,
+    vector and table reference types. Every struct has three float fields.
+
+    :param enums: Number of enums to generate.
+    :type enums: int
+    :param tables: Number of tables to generate.
+    :type tables: int
+    :param fields: Number of fields per table.
+    :type fields: int
+    :param structs: Number of structs to generate.
+    :type structs: int
+    :param services: Number of XBR interfaces (rpc_service) to generate.
+    :type services: int
+    :param slots: Number of slots (procedures and topics) per interface.
+    :type slots: int
+    :param values: Number of values per enum.
+    :type values: int
+    :param doc_lines: Number of doc comment lines per definition.
+    :type doc_lines: int
+    :param namespace: Namespace to place all definitions in.
+    :type namespace: str
+    :param defaults: Give the scalar and enum fields of tables non-zero
+        defaults (the field number plus one, and the last enum value).
+    :type defaults: bool
+
+    :returns: The binary reflection schema.
+    :rtype: bytes
+    """
+    if services and not tables:
+        raise Exception('synthetic schema with services needs tables')
+
+    builder = flatbuffers.Builder(1024)
+
+    # enums
+    #
+    enum_offsets = []
+    for i in range(enums):
+        name = '{}.Enum{:06d}'.format(namespace, i)
+        value_offsets = []
+        for j in range(values):
+            _name = builder.CreateString('VALUE_{:06d}'.format(j))
+            _docs_vec = _docs(builder, EnumValStartDocumentationVector,
+                              _doc_lines('value {}'.format(j), doc_lines))
+            EnumValStart(builder)
+            EnumValAddName(builder, _name)
+            EnumValAddValue(builder, j)
+            EnumValAddDocumentation(builder, _docs_vec)
+            value_offsets.append(EnumValEnd(builder))
+        _values = _vector(builder, EnumStartValuesVector, value_offsets)
+        _name = builder.CreateString(name)
+        _docs_vec = _docs(builder, EnumStartDocumentationVector,
+                          _doc_lines(name, doc_lines))
+        _underlying = _type(builder, _UBYTE)
+        EnumStart(builder)
+        EnumAddName(builder, _name)
+        EnumAddValues(builder, _values)
+        EnumAddUnderlyingType(builder, _underlying)
+        EnumAddDocumentation(builder, _docs_vec)
+        enum_offsets.append(EnumEnd(builder))
+
+    # objects: structs first, then tables (both sort before in this order)
+    #
+    object_offsets = []
+    for i in range(structs):
+        name = '{}.Struct{:06d}'.format(namespace, i)
+        field_offsets = []
+        for j, field_name in enumerate(['x', 'y', 'z']):
+            _name = builder.CreateString(field_name)
+            _field_type = _type(builder, _FLOAT)
+            FieldStart(builder)
+            FieldAddName(builder, _name)
+            FieldAddType(builder, _field_type)
+            FieldAddId(builder, j)
+            FieldAddOffset(builder, 4 * j)
+            field_offsets.append(FieldEnd(builder))
+        _fields = _vector(builder, ObjectStartFieldsVector, field_offsets)
+        _name = builder.CreateString(name)
+        _docs_vec = _docs(builder, ObjectStartDocumentationVector,
+                          _doc_lines(name, doc_lines))
+        ObjectStart(builder)
+        ObjectAddName(builder, _name)
+        ObjectAddFields(builder, _fields)
+        ObjectAddIsStruct(builder, True)
+        ObjectAddMinalign(builder, 4)
+        ObjectAddBytesize(builder, 12)
+        ObjectAddDocumentation(builder, _docs_vec)
+        object_offsets.append(ObjectEnd(builder))
+
+    for i in range(tables):
+        name = '{}.Table{:06d}'.format(namespace, i)
+        field_offsets = []
+        for j in range(fields):
+            kind = _FIELD_KINDS[j % len(_FIELD_KINDS)]
+            if kind == 'enum' and not enums:
+                kind = 'uint64'
+            default = 0
+            if defaults and kind == 'uint64':
+                default = j + 1
+            elif defaults and kind == 'enum':
+                default = values - 1
+            if kind == 'uint64':
+                _field_type = _type(builder, _ULONG)
+            elif kind == 'string':
+                _field_type = _type(builder, _STRING)
+            elif kind == 'enum':
+                _field_type = _type(builder, _UBYTE, index=(i + j) % enums)
+            elif kind == 'bytes':
+                _field_type = _type(builder, _VECTOR, element=_UBYTE)
+            elif kind == 'table':
+                _field_type = _type(
+                    builder, _OBJ, index=structs + (i + j) % tables)
+            else:
+                _field_type = _type(
+                    builder,
+                    _VECTOR,
+                    element=_OBJ,
+                    index=structs + (i + j) % tables)
+            _name = builder.CreateString('field_{:06d}'.format(j))
+            _docs_vec = _docs(
+                builder, FieldStartDocumentationVector,
+                _doc_lines('field {} of {}'.format(j, name), doc_lines))
+            FieldStart(builder)
+            FieldAddName(builder, _name)
+            FieldAddType(builder, _field_type)
+            FieldAddId(builder, j)
+            FieldAddOffset(builder, 4 + 2 * j)
+            if default:
+                FieldAddDefaultInteger(builder, default)
+            FieldAddDocumentation(builder, _docs_vec)
+            field_offsets.append(FieldEnd(builder))
+        _fields = _vector(builder, ObjectStartFieldsVector, field_offsets)
+        _name = builder.CreateString(name)
+        _docs_vec = _docs(builder, ObjectStartDocumentationVector,
+                          _doc_lines(name, doc_lines))
+        ObjectStart(builder)
+        ObjectAddName(builder, _name)
+        ObjectAddFields(builder, _fields)
+        ObjectAddMinalign(builder, 1)
+        ObjectAddDocumentation(builder, _docs_vec)
+        object_offsets.append(ObjectEnd(builder))
+
+    # services (XBR interfaces), referencing the table objects created above
+    #
+    service_offsets = []
+    for i in range(services):
+        name = '{}.Service{:06d}'.format(namespace, i)
+        call_offsets = []
+        for j in range(slots):
+            call_name = 'slot_{:06d}'.format(j)
+            if j % 2:
+                call_attrs = {'type': 'topic'}
+            else:
+                call_attrs = {'type': 'procedure', 'stream': 'none'}
+            _name = builder.CreateString(call_name)
+            _attrs_vec = _attrs(builder, RPCCallStartAttributesVector,
+                                call_attrs)
+            _docs_vec = _docs(
+                builder, RPCCallStartDocumentationVector,
+                _doc_lines('slot {} of {}'.format(j, name), doc_lines))
+            RPCCallStart(builder)
+            RPCCallAddName(builder, _name)
+            RPCCallAddRequest(builder,
+                              object_offsets[structs + (i + j) % tables])
+            RPCCallAddResponse(builder,
+                               object_offsets[structs + (i + j + 1) % tables])
+            RPCCallAddAttributes(builder, _attrs_vec)
+            RPCCallAddDocumentation(builder, _docs_vec)
+            call_offsets.append(RPCCallEnd(builder))
+        _calls = _vector(builder, ServiceStartCallsVector, call_offsets)
+        _name = builder.CreateString(name)
+        _attrs_vec = _attrs(
+            builder, ServiceStartAttributesVector, {
+                'type': 'interface',
+                'uuid': '00000000-0000-0000-0000-{:012d}'.format(i)
+            })
+        _docs_vec = _docs(builder, ServiceStartDocumentationVector,
+                          _doc_lines(name, doc_lines))
+        ServiceStart(builder)
+        ServiceAddName(builder, _name)
+        ServiceAddCalls(builder, _calls)
+        ServiceAddAttributes(builder, _attrs_vec)
+        ServiceAddDocumentation(builder, _docs_vec)
+        service_offsets.append(ServiceEnd(builder))
+
+    _objects = _vector(builder, SchemaStartObjectsVector, object_offsets)
+    _enums = _vector(builder, SchemaStartEnumsVector, enum_offsets)
+    _services = _vector(builder, SchemaStartServicesVector, service_offsets)
+    _file_ident = builder.CreateString('SYNT')
+    _file_ext = builder.CreateString('synt')
+
+    SchemaStart(builder)
+    SchemaAddObjects(builder, _objects)
+    SchemaAddEnums(builder, _enums)
+    SchemaAddFileIdent(builder, _file_ident)
+    SchemaAddFileExt(builder, _file_ext)
+    SchemaAddServices(builder, _services)
+    schema = SchemaEnd(builder)
+
+    builder.Finish(schema, file_identifier=b'BFBS')
+
+    return bytes(builder.Output())
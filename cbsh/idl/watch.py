@@ -0,0 +1,426 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+import txaio
+
+from cbsh.idl.cache import SchemaCache
+from cbsh.idl.loader import read_reflection_schema_file, merge_schemas
+from cbsh.idl.fbs import FbsParser
+from cbsh.idl.generator import process, DEFAULT_TEMPLATE_PATHS
+
+__all__ = ('InotifyWatcher', 'PollingWatcher', 'make_watcher', 'IdlWatch')
+
+# inotify event masks (see inotify(7))
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0x00000800
+_IN_CLOEXEC = 0x00080000
+
+_IN_WATCH_MASK = (_IN_CLOSE_WRITE | _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _is_hidden(path):
+    # hidden files (eg editor swap files, our own dependency manifests)
+    return os.path.basename(path).startswith('.')
+
+
+class InotifyWatcher(object):
+    """
+    Watches directory trees for changed files using Linux inotify (through
+    ctypes, no extra dependencies).
+    """
+
+    def __init__(self, paths):
+        """
+
+        :param paths: Directories to watch (recursively).
+        :type paths: list of str
+        """
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError(errno.ENOSYS, 'libc not found')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify not available')
+
+        self._libc = libc
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        # watch descriptor -> directory
+        self._wds = {}
+        for path in paths:
+            self._add_tree(os.path.abspath(path))
+
+    def __str__(self):
+        return u'InotifyWatcher(directories={})'.format(len(self._wds))
+
+    def _add_tree(self, path):
+        for dirpath, dirnames, _ in os.walk(path):
+            dirnames[:] = [d for d in dirnames if not _is_hidden(d)]
+            wd = self._libc.inotify_add_watch(self._fd,
+                                              os.fsencode(dirpath),
+                                              _IN_WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(),
+                              'inotify_add_watch failed for "{}"'.format(dirpath))
+            self._wds[wd] = dirpath
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def wait(self, timeout=None):
+        """
+        Wait for changes.
+
+        :param timeout: Maximum time to wait in seconds (forever when ``None``).
+        :type timeout: float
+
+        :returns: Paths of the files changed (possibly empty on timeout).
+        :rtype: set of str
+        """
+        changed = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return changed
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                dirpath = self._wds.get(wd, None)
+                if dirpath is None:
+                    continue
+                if mask & _IN_IGNORED:
+                    del self._wds[wd]
+                    continue
+                path = os.path.join(dirpath, os.fsdecode(name)) if name else dirpath
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO) and not _is_hidden(path):
+                        # watch new directories, and the files already in them
+                        self._add_tree(path)
+                        for dirpath_, _, files in os.walk(path):
+                            changed.update(os.path.join(dirpath_, f) for f in files)
+                    continue
+                changed.add(path)
+        return changed
+
+
+class PollingWatcher(object):
+    """
+    Watches directory trees for changed files by periodically comparing the
+    modification times and sizes of all files.
+    """
+
+    def __init__(self, paths, interval=0.5):
+        """
+
+        :param paths: Directories to watch (recursively).
+        :type paths: list of str
+        :param interval: Polling interval in seconds.
+        :type interval: float
+        """
+        self._paths = [os.path.abspath(path) for path in paths]
+        self._interval = interval
+        self._snapshot = self._scan()
+
+    def __str__(self):
+        return u'PollingWatcher(files={}, interval={})'.format(
+            len(self._snapshot), self._interval)
+
+    def _scan(self):
+        snapshot = {}
+        for path in self._paths:
+            for dirpath, dirnames, files in os.walk(path):
+                dirnames[:] = [d for d in dirnames if not _is_hidden(d)]
+                for name in files:
+                    filename = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(filename)
+                    except OSError:
+                        continue
+                    snapshot[filename] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def close(self):
+        pass
+
+    def wait(self, timeout=None):
+        """
+        Wait for changes, see :meth:`InotifyWatcher.wait`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = set(
+                path for path in set(snapshot) | set(self._snapshot)
+                if snapshot.get(path, None) != self._snapshot.get(path, None))
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return changed
+                time.sleep(min(self._interval, remaining))
+            else:
+                time.sleep(self._interval)
+
+
+def make_watcher(paths, poll=False):
+    """
+    Create a watcher for directory trees, using inotify when available and
+    falling back to polling otherwise.
+
+    :param paths: Directories to watch (recursively).
+    :type paths: list of str
+    :param poll: Always use polling.
+    :type poll: bool
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths)
+
+
+def wait_debounced(watcher, debounce=0.2, timeout=None):
+    """
+    Wait for changes, and then collect further changes until there were none
+    for ``debounce`` seconds (so that a burst of changes, eg from an editor
+    saving or a version control checkout, is handled at once).
+
+    :returns: Paths of the files changed.
+    :rtype: set of str
+    """
+    changed = watcher.wait(timeout)
+    if changed:
+        while True:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changed.update(more)
+    return changed
+
+
+class IdlWatch(object):
+    """
+    Rebuilds the generated files from a directory of FlatBuffers schemas
+    (.fbs and .bfbs) whenever schemas or templates change.
+
+    The extracted schemas and the compiled templates are kept in memory
+    between rebuilds. On changes, only the changed schema files (and .fbs
+    files including them) are loaded again, and only the target files with
+    changed dependencies are generated again (see the incremental mode of
+    :func:`cbsh.idl.generator.process`).
+
+    .fbs files are read with the built-in parser (see
+    :class:`cbsh.idl.fbs.FbsParser`), which only parses files again that
+    changed.
+    """
+
+    def __init__(self,
+                 schema_dir,
+                 template_paths=None,
+                 outdir='.',
+                 meta_template=None,
+                 max_workers=None,
+                 bytecode_cache=True,
+                 use_cache=True,
+                 poll=False,
+                 debounce=0.2,
+                 log=None):
+        self.log = log or txaio.make_logger()
+        self._schema_dir = os.path.abspath(schema_dir)
+        # the template folders generated from are also the ones watched
+        self._template_paths = [
+            os.path.abspath(path)
+            for path in (template_paths or DEFAULT_TEMPLATE_PATHS)
+        ]
+        self._outdir = os.path.abspath(outdir)
+        self._process_kwargs = {
+            'outdir': self._outdir,
+            'max_workers': max_workers,
+            'bytecode_cache': bytecode_cache,
+            'incremental': True,
+        }
+        if meta_template:
+            self._process_kwargs['meta_template'] = meta_template
+        self._cache = SchemaCache() if use_cache else None
+        self._poll = poll
+        self._debounce = debounce
+        self._fbs = FbsParser(cache=self._cache, log=self.log)
+
+        # extracted schemas by source file (.fbs or .bfbs)
+        self._schemas = {}
+
+    def __str__(self):
+        return u'IdlWatch(schema_dir={}, outdir={}, schemas={})'.format(
+            self._schema_dir, self._outdir, len(self._schemas))
+
+    def _sources(self):
+        sources = []
+        for dirpath, dirnames, files in os.walk(self._schema_dir):
+            dirnames[:] = sorted(d for d in dirnames if not _is_hidden(d))
+            for name in sorted(files):
+                path = os.path.join(dirpath, name)
+                if name.endswith(('.fbs', '.bfbs')) and not self._ignored(path):
+                    sources.append(path)
+        return sources
+
+    def _ignored(self, path):
+        # never react to our own output
+        return _is_hidden(path) or path.startswith(self._outdir + os.sep)
+
+    def _includers(self, changed_fbs):
+        # all .fbs files (transitively) including any of the changed ones
+        includes = {
+            path: set(self._fbs.dependencies(path))
+            for path in self._schemas if path.endswith('.fbs')
+        }
+        result = set(changed_fbs)
+        while True:
+            more = set(path for path, included in includes.items()
+                       if path not in result and included & result)
+            if not more:
+                return result
+            result.update(more)
+
+    def _load(self, path):
+        if path.endswith('.fbs'):
+            schema = self._fbs.read_schema(path)
+        else:
+            schema = read_reflection_schema_file(path, cache=self._cache)
+        schema['meta']['file_name'] = os.path.basename(path)
+        schema['meta']['file_path'] = path
+        return schema
+
+    def rebuild(self, changed=None):
+        """
+        Reload changed schema files and regenerate the outdated target files.
+
+        :param changed: Paths of the files changed (everything when ``None``).
+        :type changed: set of str
+
+        :returns: Paths of the target files written.
+        :rtype: list of str
+        """
+        sources = self._sources()
+
+        if changed is None:
+            reload = set(sources)
+        else:
+            changed = set(os.path.abspath(path) for path in changed)
+            reload = set(path for path in changed
+                         if path.endswith(('.fbs', '.bfbs')))
+            reload = self._includers(reload)
+
+        for path in list(self._schemas.keys()):
+            if path not in sources:
+                del self._schemas[path]
+
+        for path in sources:
+            if path in reload or path not in self._schemas:
+                started = time.perf_counter()
+                self._schemas[path] = self._load(path)
+                self.log.info('{:>10.1f} ms: loaded {}'.format(
+                    1000. * (time.perf_counter() - started), path))
+
+        schema = merge_schemas([self._schemas[path] for path in sources])
+
+        started = time.perf_counter()
+        paths = process(schema, self._template_paths, **self._process_kwargs)
+        self.log.info('{:>10.1f} ms: generated {} files'.format(
+            1000. * (time.perf_counter() - started), len(paths)))
+        return paths
+
+    def _watched(self):
+        watched = [self._schema_dir]
+        for path in self._template_paths:
+            if os.path.isdir(path) and path not in watched:
+                watched.append(path)
+        return watched
+
+    def run(self):
+        """
+        Build once, and then rebuild on changes until interrupted.
+        """
+        watched = self._watched()
+        watcher = make_watcher(watched, poll=self._poll)
+        self.log.info('watching {} ({})'.format(', '.join(watched), watcher))
+        try:
+            self._rebuild_logged(None)
+            while True:
+                changed = set(
+                    path for path in wait_debounced(watcher, self._debounce)
+                    if not self._ignored(path))
+                if changed:
+                    self.log.info('{} files changed'.format(len(changed)))
+                    self._rebuild_logged(changed)
+        finally:
+            watcher.close()
+
+    def _rebuild_logged(self, changed):
+        # keep watching when a rebuild fails (eg on a syntax error being
+        # fixed in the editor)
+        try:
+            self.rebuild(changed)
+        except Exception as e:
+            self.log.error('rebuild failed: {error}', error=e)
@@ -0,0 +1,725 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import asyncio
+import tempfile
+
+import txaio
+
+from cbsh import command
+from cbsh.cache import CallCache, CachingSession
+
+__all__ = ('FabricMirror', 'TopologySnapshot')
+
+# resources of workers, and the fabric-wide listings seeding them
+_RESOURCES = (
+    (u'transports', u'transport', command.CmdListAllTransports,
+     command.CmdListTransports),
+    (u'realms', u'realm', command.CmdListAllRealms, command.CmdListRealms),
+    (u'components', u'component', command.CmdListAllComponents,
+     command.CmdListComponents),
+)
+
+
+def _diff(old, new):
+    # number of nodes, workers and resources added, removed or changed
+    changes = len(set(old) ^ set(new))
+    for node_id in set(old) & set(new):
+        workers, new_workers = old[node_id], new[node_id]
+        changes += len(set(workers) ^ set(new_workers))
+        for worker_id in set(workers) & set(new_workers):
+            worker, new_worker = workers[worker_id], new_workers[worker_id]
+            if worker[u'details'] != new_worker[u'details']:
+                changes += 1
+            for kind, _, _, _ in _RESOURCES:
+                changes += len(worker[kind] ^ new_worker[kind])
+    return changes
+
+
+# magic bytes and format version at the start of topology snapshots (bump the
+# version whenever the marshalled topology changes)
+_HEADER = b'CBTS' + bytes([2])
+
+_SUFFIX = '.snapshot'
+
+
+class FabricMirror(object):
+    """
+    In-memory mirror of the topology of a management realm: the nodes, and
+    the workers, transports, realms and components running on the nodes.
+
+    When attached to a session, the mirror subscribes to the lifecycle events
+    of nodes and workers, and is then seeded by the fabric-wide listings (see
+    :class:`cbsh.command.CmdListAll`). Events received while seeding are
+    applied afterwards. The mirror is seeded again whenever attached to a new
+    session (eg on reconnect).
+
+    List and show commands are answered locally from a synced mirror (see
+    :meth:`run`), and the mirror provides the completions of the node, worker
+    and resource arguments of commands (see :meth:`complete`).
+
+    Commands changing the topology mark the nodes they touch (or the set of
+    nodes) as stale (see :meth:`invalidate`): commands on stale parts of the
+    topology are not answered from the mirror, until these parts are fetched
+    again in the background. The same holds for nodes the seeding calls
+    failed on, and for workers learned from events without details.
+
+    The lifecycle event topics subscribed (see :attr:`EVENTS`) are not
+    confirmed to be published by the fabric, and changes made by other
+    clients (or node failures) might hence never reach the mirror. The
+    staleness of the mirror is therefore bounded: every node (and the set of
+    nodes) is only answered from the mirror for ``max_age`` seconds after it
+    was fetched. Commands on older parts of the topology are run remotely,
+    and these parts are fetched again in the background.
+
+    The mirror can be restored from a snapshot of the last known topology
+    (see :class:`TopologySnapshot`), which is then used until the mirror is
+    reconciled with the fabric on the first session. The snapshot records
+    when the topology was fetched, so that the bound holds for restored
+    topologies too: snapshots older than ``max_age`` are only used for
+    completions.
+    """
+
+    # default maximum age (in seconds) of the parts of the topology answered
+    # from the mirror
+    MAX_AGE = 60.
+
+    # lifecycle events: topic -> (kind, started). The positional event
+    # arguments are the node ID, the worker ID and the resource ID (as far as
+    # applicable), optionally followed by a details dict. These topics are
+    # not (yet) confirmed to be published by the fabric, see MAX_AGE.
+    EVENTS = {
+        u'crossbarfabriccenter.mrealm.on_node_online': (u'node', True),
+        u'crossbarfabriccenter.mrealm.on_node_offline': (u'node', False),
+        u'crossbarfabriccenter.node.on_worker_started': (u'worker', True),
+        u'crossbarfabriccenter.node.on_worker_stopped': (u'worker', False),
+        u'crossbarfabriccenter.worker.on_transport_started': (u'transports', True),
+        u'crossbarfabriccenter.worker.on_transport_stopped': (u'transports', False),
+        u'crossbarfabriccenter.worker.on_realm_started': (u'realms', True),
+        u'crossbarfabriccenter.worker.on_realm_stopped': (u'realms', False),
+        u'crossbarfabriccenter.worker.on_component_started': (u'components', True),
+        u'crossbarfabriccenter.worker.on_component_stopped': (u'components', False),
+    }
+
+    def __init__(self, concurrency=None, snapshot=None, log=None,
+                 max_age=None):
+        """
+
+        :param concurrency: Maximum number of calls in flight while seeding.
+        :type concurrency: int
+        :param snapshot: Snapshot to restore the mirror from, and to save the
+            mirror to when seeded and when detached.
+        :type snapshot: :class:`TopologySnapshot`
+        :param max_age: Maximum age (in seconds) of the parts of the topology
+            answered from the mirror (default: :attr:`MAX_AGE`).
+        :type max_age: float
+        """
+        self.log = log or txaio.make_logger()
+        self._concurrency = concurrency
+        self._snapshot = snapshot
+        self._max_age = self.MAX_AGE if max_age is None else max_age
+
+        # node ID -> worker ID -> worker (details and resource ID sets)
+        self._nodes = {}  # type: dict
+
+        # node ID -> when fetched (time.time(), as recorded in snapshots), and
+        # when the set of nodes was fetched
+        self._fetched = {}  # type: dict
+        self._listed = None
+
+        self._session = None
+        self._synced = False
+
+        # events received while seeding
+        self._pending = None
+
+        # stale node ID (None: the set of nodes) -> number of times marked
+        self._dirty = {}  # type: dict
+
+        # background refresh of the stale nodes
+        self._refreshing = None
+        self._refresh_again = False
+
+        # whether the topology was restored from a snapshot (and is not yet
+        # reconciled with the fabric)
+        self._restored = False
+
+        # incremented on every change
+        self.version = 0
+        self._saved_version = None
+        self._saved_listed = None
+
+        if snapshot:
+            self.restore(snapshot.load())
+
+    def __str__(self):
+        return u'FabricMirror(nodes={}, workers={}, synced={}, version={})'.format(
+            len(self._nodes), sum(len(workers) for workers in self._nodes.values()),
+            self._synced, self.version)
+
+    @property
+    def synced(self):
+        """
+        Whether the mirror is seeded and kept current by a session.
+        """
+        return self._synced
+
+    @property
+    def restored(self):
+        """
+        Whether the mirror holds a topology restored from a snapshot, which
+        is not yet reconciled with the fabric.
+        """
+        return self._restored
+
+    def marshal(self):
+        """
+        Marshal the topology (for storing as a snapshot).
+
+        :returns: The topology (plain dicts, lists and scalars).
+        :rtype: dict
+        """
+        nodes = {}
+        for node_id, workers in self._nodes.items():
+            nodes[node_id] = {}
+            for worker_id, worker in workers.items():
+                obj = {u'details': worker[u'details']}
+                for kind, _, _, _ in _RESOURCES:
+                    obj[kind] = sorted(worker[kind])
+                nodes[node_id][worker_id] = obj
+        return {
+            u'version': self.version,
+            u'nodes': nodes,
+            u'fetched': {
+                node_id: fetched
+                for node_id, fetched in self._fetched.items()
+                if node_id in self._nodes
+            },
+            u'listed': self._listed,
+        }
+
+    def restore(self, obj):
+        """
+        Restore the topology from a snapshot. The restored topology is used
+        to answer commands and for completion until the mirror is seeded.
+
+        :param obj: The topology as returned from :meth:`marshal`, or
+            ``None`` (no snapshot).
+        :type obj: dict or None
+
+        :returns: Whether a topology was restored.
+        :rtype: bool
+        """
+        if not obj or self._session:
+            return False
+        nodes = {}
+        for node_id, workers in obj[u'nodes'].items():
+            nodes[node_id] = {}
+            for worker_id, worker in workers.items():
+                nodes[node_id][worker_id] = self._new_worker(
+                    worker[u'details'])
+                for kind, _, _, _ in _RESOURCES:
+                    nodes[node_id][worker_id][kind].update(worker[kind])
+        self._nodes = nodes
+        self._fetched = dict(obj[u'fetched'])
+        self._listed = obj[u'listed']
+
+        self.version = self._saved_version = obj[u'version']
+        self._saved_listed = self._listed
+        self._restored = True
+        return True
+
+    def save(self):
+        """
+        Save the topology to the snapshot (if changed, or fetched again,
+        since last saved).
+        """
+        changed = (self.version, self._listed) != (self._saved_version,
+                                                   self._saved_listed)
+        if self._snapshot and changed:
+            try:
+                self._snapshot.save(self.marshal())
+            except Exception as e:
+                self.log.warn('could not save {}: {}'.format(self._snapshot, e))
+            else:
+                self._saved_version = self.version
+                self._saved_listed = self._listed
+
+    @staticmethod
+    def _new_worker(details):
+        worker = {u'details': details}
+        for kind, _, _, _ in _RESOURCES:
+            worker[kind] = set()
+        return worker
+
+    async def attach(self, session):
+        """
+        Subscribe to the lifecycle events on a (joined) session, and seed the
+        mirror.
+
+        :param session: The session.
+        """
+        self._session = session
+        self._synced = False
+        self._pending = []
+
+        def make_handler(kind, started):
+            def handler(*args, **kwargs):
+                if self._session is not session:
+                    return
+                if self._pending is not None:
+                    self._pending.append((kind, started, args))
+                else:
+                    self._apply(kind, started, args)
+
+            return handler
+
+        await asyncio.gather(*[
+            session.subscribe(make_handler(kind, started), topic)
+            for topic, (kind, started) in self.EVENTS.items()
+        ])
+
+        dirty = dict(self._dirty)
+        await self.sync(session)
+
+        for kind, started, args in self._pending:
+            self._apply(kind, started, args)
+        self._pending = None
+        self._clean(dirty)
+        self._synced = True
+        self._restored = False
+
+        self.save()
+
+        # marked stale while seeding
+        if self._dirty:
+            self._refresh_soon()
+
+    def detach(self):
+        """
+        Stop answering commands from the mirror (when the session is gone),
+        and save the topology to the snapshot.
+        """
+        self._session = None
+        self._synced = False
+        self._restored = False
+        self._pending = None
+        self._dirty = {}
+
+        self.save()
+
+    def invalidate(self, procedure, args):
+        """
+        Mark the part of the topology a command changed as stale (see
+        :meth:`cbsh.command.Cmd.invalidates`), and refresh it in the
+        background.
+
+        :param procedure: The procedure of the invalidated calls (``None``
+            for any procedure).
+        :type procedure: str or None
+        :param args: The leading arguments of the invalidated calls: the
+            node ID (if any).
+        :type args: tuple
+        """
+        if args:
+            self._mark(args[0])
+        elif procedure == u'crossbarfabriccenter.mrealm.get_nodes':
+            self._mark(None)
+        else:
+            return
+        self._refresh_soon()
+
+    def _mark(self, node_id):
+        self._dirty[node_id] = self._dirty.get(node_id, 0) + 1
+
+    def _clean(self, dirty):
+        # unmark what was not marked again since
+        for node_id, count in dirty.items():
+            if self._dirty.get(node_id, None) == count:
+                del self._dirty[node_id]
+
+    def _refresh_soon(self):
+        if not self._synced:
+            # refreshed once attached
+            return
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(
+                self._refresh(self._session))
+        else:
+            self._refresh_again = True
+
+    async def _refresh(self, session):
+        self._refresh_again = True
+        while self._refresh_again and self._dirty and self._session is session:
+            self._refresh_again = False
+            dirty = dict(self._dirty)
+            nodes = None if None in dirty else sorted(dirty)
+
+            self._pending = []
+            try:
+                await self.sync(session, nodes)
+            except Exception as e:
+                self.log.warn('could not refresh {}: {}'.format(self, e))
+                return
+            finally:
+                if self._session is session:
+                    pending, self._pending = self._pending, None
+                    for kind, started, args in pending:
+                        self._apply(kind, started, args)
+
+            self._clean(dirty)
+        self.save()
+
+    async def sync(self, session, nodes=None):
+        """
+        Seed the mirror with the fabric-wide listings, and reconcile the
+        (eg restored) topology with it.
+
+        Every call is made once: the listings share the nodes, workers and
+        worker details fetched. Nodes any of the calls failed on are marked
+        stale.
+
+        :param session: The session.
+        :param nodes: Only fetch the given nodes again (instead of all nodes
+            of the management realm).
+        :type nodes: list of str
+
+        :returns: Number of changes to the topology.
+        :rtype: int
+        """
+        started = time.perf_counter()
+        fetched = time.time()
+        shared = CachingSession(
+            session, CallCache(max_size=sys.maxsize), ttl=float('inf'))
+
+        if nodes is None:
+            node_ids = await shared.call(u'crossbarfabriccenter.mrealm.get_nodes')
+        else:
+            node_ids = nodes
+        workers = await command.CmdListAllWorkers(
+            self._concurrency, nodes=node_ids).run(shared)
+        listings = await asyncio.gather(*[
+            cmd_all_class(self._concurrency, nodes=node_ids).run(shared)
+            for _, _, cmd_all_class, _ in _RESOURCES
+        ])
+
+        new = {node_id: {} for node_id in node_ids}
+        for row in workers.result:
+            details = {
+                k: v
+                for k, v in row.items() if k not in (u'node', u'worker')
+            }
+            new.setdefault(row[u'node'], {})[row[u'worker']] = self._new_worker(details)
+
+        errors = set(workers.errors)
+        for (kind, column, _, _), listing in zip(_RESOURCES, listings):
+            errors.update(listing.errors)
+            for row in listing.result:
+                worker = new.get(row[u'node'], {}).get(row[u'worker'], None)
+                if worker is not None:
+                    worker[kind].add(row[column])
+
+        if nodes is None:
+            old = self._nodes
+            self._nodes = new
+            self._fetched = {}
+            self._listed = fetched
+        else:
+            old = {
+                node_id: self._nodes[node_id]
+                for node_id in node_ids if node_id in self._nodes
+            }
+            self._nodes.update(new)
+        for node_id in node_ids:
+            self._fetched[node_id] = fetched
+        changes = _diff(old, new)
+        if changes:
+            self.version += 1
+
+        # the errors are keyed by node ID, or by node and worker ID
+        for node_id in node_ids:
+            if any(path == node_id or path.startswith(node_id + u'/')
+                   for path in errors):
+                self._mark(node_id)
+
+        if errors:
+            self.log.warn('fabric mirror seeded with {} failed calls'.format(len(errors)))
+        self.log.debug('{} seeded in {:.1f} ms ({} changes)'.format(
+            self, 1000. * (time.perf_counter() - started), changes))
+
+        return changes
+
+    def _apply(self, kind, started, args):
+        node_id = args[0]
+        if kind == u'node':
+            if started:
+                self._nodes.setdefault(node_id, {})
+            elif node_id in self._nodes:
+                # still paired, but nothing is running anymore
+                self._nodes[node_id] = {}
+        elif kind == u'worker':
+            workers = self._nodes.setdefault(node_id, {})
+            if started:
+                if len(args) > 2 and isinstance(args[2], dict):
+                    workers[args[1]] = self._new_worker(args[2])
+                else:
+                    # the details are unknown: fetch the node again
+                    workers[args[1]] = self._new_worker(None)
+                    self._mark(node_id)
+                    self._refresh_soon()
+            else:
+                workers.pop(args[1], None)
+        else:
+            worker = self._nodes.get(node_id, {}).get(args[1], None)
+            if worker is None:
+                # the worker is unknown (yet): ignore
+                return
+            if started:
+                worker[kind].add(args[2])
+            else:
+                worker[kind].discard(args[2])
+        self.version += 1
+
+    def _worker(self, node, worker):
+        return self._nodes.get(node, {}).get(worker, None)
+
+    def _fresh(self, node_id):
+        # whether a node (None: the set of nodes) is neither stale nor
+        # older than max_age. Expired nodes are fetched again.
+        if node_id in self._dirty:
+            return False
+        if node_id is None:
+            fetched = self._listed
+        else:
+            fetched = self._fetched.get(node_id, None)
+        if fetched is not None and time.time() - fetched <= self._max_age:
+            return True
+        if node_id is None or node_id in self._nodes:
+            self._mark(node_id)
+            self._refresh_soon()
+        return False
+
+    def _complete(self):
+        # whether all nodes and workers are known (with details), and fresh
+        return self._fresh(None) and all([
+            self._fresh(node_id) for node_id in self._nodes
+        ]) and all(
+            worker[u'details'] is not None
+            for workers in self._nodes.values() for worker in workers.values())
+
+    def _query(self, cmd):
+        # -> (found, result)
+        node = getattr(cmd, u'node', None)
+        if node is not None and not self._fresh(node):
+            return False, None
+
+        if isinstance(cmd, command.CmdListNodes):
+            if self._fresh(None):
+                return True, sorted(self._nodes)
+
+        elif isinstance(cmd, command.CmdListAllWorkers):
+            if not self._complete():
+                return False, None
+            rows = []
+            for node in sorted(self._nodes):
+                workers = self._nodes[node]
+                for worker in sorted(workers):
+                    row = dict(workers[worker][u'details'])
+                    row[u'node'] = node
+                    row[u'worker'] = worker
+                    rows.append(row)
+            return True, rows
+
+        elif isinstance(cmd, command.CmdListWorkers):
+            if cmd.node in self._nodes:
+                return True, sorted(self._nodes[cmd.node])
+
+        elif isinstance(cmd, command.CmdShowWorker):
+            worker = self._worker(cmd.node, cmd.worker)
+            if worker is not None and worker[u'details'] is not None:
+                return True, worker[u'details']
+
+        else:
+            for kind, column, cmd_all_class, cmd_class in _RESOURCES:
+                if isinstance(cmd, cmd_all_class):
+                    if not self._complete():
+                        return False, None
+                    return True, [{
+                        u'node': node,
+                        u'worker': worker,
+                        column: item
+                    } for node in sorted(self._nodes)
+                        for worker in sorted(self._nodes[node])
+                        for item in sorted(self._nodes[node][worker][kind])]
+                elif isinstance(cmd, cmd_class):
+                    worker = self._worker(cmd.node, cmd.worker)
+                    if worker is not None and worker[u'details'] is not None:
+                        return True, sorted(worker[kind])
+
+        return False, None
+
+    def run(self, cmd):
+        """
+        Run a command locally from the mirror.
+
+        :param cmd: The command.
+        :type cmd: :class:`cbsh.command.Cmd`
+
+        :returns: The result, or ``None`` if the command cannot be answered
+            from the mirror (or the mirror is neither synced nor restored).
+        :rtype: :class:`cbsh.command.CmdRunResult`
+        """
+        if not (self._synced or self._restored):
+            return None
+        started = time.perf_counter()
+        found, result = self._query(cmd)
+        if not found:
+            return None
+        return command.CmdRunResult(
+            result, round(1000. * (time.perf_counter() - started), 3))
+
+    def complete(self, name, params):
+        """
+        Complete a command argument.
+
+        :param name: The name of the argument (eg ``node`` or ``worker``).
+        :type name: str
+        :param params: The arguments given so far (by name).
+        :type params: dict
+
+        :returns: The possible values.
+        :rtype: list of str
+        """
+        if name in (u'node', u'node_id'):
+            return sorted(self._nodes)
+
+        node = params.get(u'node', None) or params.get(u'node_id', None)
+        if name in (u'worker', u'worker_id'):
+            return sorted(self._nodes.get(node, {}))
+
+        worker = self._worker(
+            node, params.get(u'worker', None) or params.get(u'worker_id', None))
+        if worker is not None:
+            for kind, column, _, _ in _RESOURCES:
+                if name in (column, column + u'_id'):
+                    return sorted(worker[kind])
+        return []
+
+
+class TopologySnapshot(object):
+    """
+    Snapshot of the last known topology of a management realm, stored in a
+    compact file (compressed JSON) per user profile and management realm.
+    """
+
+    DEFAULT_SNAPSHOT_DIR = u'~/.cbf/topology'
+
+    def __init__(self, profile, realm, snapshot_dir=None):
+        """
+
+        :param profile: The user profile.
+        :type profile: str
+        :param realm: The management realm (``None`` for the global users
+            realm).
+        :type realm: str or None
+        :param snapshot_dir: Snapshot directory, created if it does not yet
+            exist.
+        :type snapshot_dir: str
+        """
+        self.log = txaio.make_logger()
+        self._snapshot_dir = os.path.abspath(
+            os.path.expanduser(snapshot_dir or self.DEFAULT_SNAPSHOT_DIR))
+        name = u'{}@{}'.format(profile, realm or u'')
+        self._path = os.path.join(
+            self._snapshot_dir, re.sub(r'[^\w.@-]', u'_', name) + _SUFFIX)
+
+    def __str__(self):
+        return u'TopologySnapshot(path={})'.format(self._path)
+
+    @property
+    def path(self):
+        return self._path
+
+    def load(self):
+        """
+        Load the snapshot.
+
+        :returns: The topology or ``None`` when not (validly) stored.
+        :rtype: dict or None
+        """
+        try:
+            with open(self._path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            return None
+
+        if data[:len(_HEADER)] == _HEADER:
+            try:
+                return json.loads(zlib.decompress(data[len(_HEADER):]).decode('utf8'))
+            except (zlib.error, ValueError):
+                pass
+
+        # written by another snapshot format
+        self.log.debug('ignoring stale topology snapshot {}'.format(self._path))
+        return None
+
+    def save(self, obj):
+        """
+        Save the snapshot.
+
+        :param obj: The topology (plain dicts, lists and scalars).
+        :type obj: dict
+        """
+        data = _HEADER + zlib.compress(
+            json.dumps(obj, separators=(',', ':'), sort_keys=True).encode('utf8'))
+
+        if not os.path.isdir(self._snapshot_dir):
+            os.makedirs(self._snapshot_dir)
+
+        # write to a temporary file and rename, so readers never see
+        # partially written snapshots
+        fd, tmp_path = tempfile.mkstemp(dir=self._snapshot_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
@@ -118,8 +118,17 @@ _register_internal_command(['?', 'h', 'help'], _help_internal,
 
 
 class ClickCompleter(Completer):
-    def __init__(self, cli):
+    def __init__(self, cli, complete_argument=None):
+        """
+
+        :param cli: The command group to complete.
+        :param complete_argument: Optional function returning the possible
+            values of a command argument, called with the name of the
+            argument and the arguments given so far (by name).
+        :type complete_argument: callable
+        """
         self.cli = cli
+        self.complete_argument = complete_argument
 
     def get_completions(self, document, complete_event=None):
         # Code analogous to click._bashcomplete.do_complete
@@ -181,6 +190,20 @@ class ClickCompleter(Completer):
                         -len(incomplete),
                         display_meta=getattr(command, 'short_help')))
 
+        # values of the next (positional) argument not given yet
+        if self.complete_argument and not isinstance(ctx.command,
+                                                     click.MultiCommand):
+            for param in ctx.command.params:
+                if isinstance(param, click.Argument) and ctx.params.get(
+                        param.name, None) is None:
+                    for value in self.complete_argument(
+                            param.name, ctx.params):
+                        choices.append(
+                            Completion(
+                                value, -len(incomplete),
+                                display_meta=param.name))
+                    break
+
         for item in choices:
             if item.text.startswith(incomplete):
                 yield item
@@ -201,13 +224,16 @@ async def repl(old_ctx,
                once=False,
                get_bottom_toolbar_tokens=_get_bottom_toolbar_tokens,
                get_prompt_tokens=None,
-               style=_style):
+               style=_style,
+               complete_argument=None):
     """
     Start an interactive shell. All subcommands are available in it.
 
     :param old_ctx: The current Click context.
     :param prompt_kwargs: Parameters passed to
         :py:func:`prompt_toolkit.shortcuts.prompt`.
+    :param complete_argument: Optional function completing command
+        arguments (see :class:`ClickCompleter`).
 
     If stdin is not a TTY, no prompt will be printed, but only commands read
     from stdin.
@@ -232,7 +258,7 @@ async def repl(old_ctx,
         history = prompt_kwargs.pop('history', None) \
             or InMemoryHistory()
         completer = prompt_kwargs.pop('completer', None) \
-            or ClickCompleter(group)
+            or ClickCompleter(group, complete_argument)
 
         def get_command():
             return prompt_async(
@@ -0,0 +1,132 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import asyncio
+
+from cbsh.cache import CallCache, CachingSession
+from cbsh.command import (CmdListNodes, CmdShowWorker, CmdListAllWorkers,
+                          CmdStartContainerWorker)
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class CountingSession(object):
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, procedure, *args, **kwargs):
+        self.calls.append((procedure, args))
+        if procedure == u'crossbarfabriccenter.mrealm.get_nodes':
+            return [u'node1', u'node2']
+        elif procedure == u'crossbarfabriccenter.list_workers':
+            return [u'worker1']
+        return {u'type': u'router', u'args': list(args)}
+
+
+def test_call_cache_ttl_and_lru():
+    clock = Clock()
+    cache = CallCache(max_size=2, clock=clock)
+
+    key1 = cache.key(u'a.b', (1, ))
+    key2 = cache.key(u'a.b', (2, ))
+    cache.put(key1, u'one', ttl=10)
+    cache.put(key2, u'two', ttl=1)
+    assert cache.get(key1) == (True, u'one')
+
+    clock.now = 5
+    assert cache.get(key2) == (False, None)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # key1 is the least recently used one
+    cache.put(key2, u'two', ttl=10)
+    cache.put(cache.key(u'a.c'), u'three', ttl=10)
+    cache.get(key2)
+    cache.put(cache.key(u'a.d'), u'four', ttl=10)
+    assert len(cache) == 2
+    assert cache.get(key1) == (False, None)
+
+    assert cache.key(u'a.b', ([1], )) is None
+
+
+def test_call_cache_invalidate():
+    cache = CallCache()
+    for args in [(u'node1', ), (u'node1', u'worker1'), (u'node2', u'worker1')]:
+        cache.put(cache.key(u'show', args), args, ttl=10)
+        cache.put(cache.key(u'list', args), args, ttl=10)
+    cache.put(cache.key(u'nodes'), [], ttl=10)
+
+    assert cache.invalidate(u'list', (u'node2', )) == 1
+    assert cache.invalidate(None, (u'node1', )) == 4
+    assert cache.invalidate(u'nodes') == 1
+    assert len(cache) == 1
+
+
+def test_caching_session():
+    session = CountingSession()
+    cache = CallCache()
+    loop = asyncio.new_event_loop()
+
+    def run(cmd, fresh=False):
+        return loop.run_until_complete(
+            cmd.run(CachingSession(session, cache, cmd.CACHE_TTL, fresh=fresh)))
+
+    assert run(CmdListNodes()).result == [u'node1', u'node2']
+    assert run(CmdListNodes()).result == [u'node1', u'node2']
+    assert len(session.calls) == 1
+
+    run(CmdListNodes(), fresh=True)
+    assert len(session.calls) == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # a fan-out is answered from (and fills) the cache call by call
+    run(CmdListAllWorkers())
+    assert len(session.calls) == 2 + 4
+    run(CmdShowWorker(u'node1', u'worker1'))
+    assert len(session.calls) == 6
+
+    # starting a worker on node1 drops everything cached for node1
+    for procedure, args in CmdStartContainerWorker(u'node1', u'worker2').invalidates():
+        cache.invalidate(procedure, args)
+    run(CmdListAllWorkers())
+    assert session.calls[6:] == [
+        (u'crossbarfabriccenter.list_workers', (u'node1', )),
+        (u'crossbarfabriccenter.show_worker', (u'node1', u'worker1')),
+    ]
+
+    loop.close()
@@ -0,0 +1,166 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import asyncio
+
+from autobahn.wamp.exception import ApplicationError
+
+from cbsh.command import (CmdBatch, CmdBatchResult, CmdShowNode,
+                          CmdListAllWorkers, CmdListAllComponents,
+                          CmdListAllRealms)
+
+
+class FakeSession(object):
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def call(self, procedure, *args, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if args[0] == 'bad':
+            raise ApplicationError(u'crossbar.error.no_such_object')
+        return {u'node': args[0]}
+
+
+def test_cmd_batch():
+    session = FakeSession()
+    nodes = [u'node{}'.format(i) for i in range(100)] + [u'bad']
+    finished = []
+
+    batch = CmdBatch([CmdShowNode(node) for node in nodes],
+                     concurrency=20,
+                     on_result=lambda i, cmd, run, error: finished.append(i))
+    loop = asyncio.new_event_loop()
+    result = loop.run_until_complete(batch.run(session))
+    loop.close()
+
+    assert isinstance(result, CmdBatchResult)
+    assert session.calls == len(nodes)
+    assert session.max_active == 20
+    assert sorted(finished) == list(range(len(nodes)))
+
+    # results in batch order, the failed command does not abort the batch
+    assert result.result[:100] == [{u'node': node} for node in nodes[:100]]
+    assert result.result[100] is None
+    assert list(result.errors) == [100]
+    assert isinstance(result.errors[100], ApplicationError)
+    assert all(run.duration >= 20 for run in result.runs[:100])
+
+    # 6 rounds of concurrent calls, instead of 101 calls one after another
+    assert result.duration < 50 * session.delay * 1000
+
+
+class FakeFabricSession(FakeSession):
+    """
+    Fabric of nodes with a router, a container and a guest worker each.
+    """
+
+    WORKERS = {u'router1': u'router', u'container1': u'container',
+               u'guest1': u'guest'}
+
+    def __init__(self, nodes, delay=0.02):
+        FakeSession.__init__(self, delay)
+        self.nodes = nodes
+
+    async def call(self, procedure, *args, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if args and args[0] == u'bad':
+            raise ApplicationError(u'crossbar.error.no_such_object')
+        if procedure == u'crossbarfabriccenter.mrealm.get_nodes':
+            return self.nodes
+        elif procedure == u'crossbarfabriccenter.list_workers':
+            return sorted(self.WORKERS)
+        elif procedure == u'crossbarfabriccenter.show_worker':
+            return {u'id': args[1], u'type': self.WORKERS[args[1]]}
+        elif procedure == u'crossbarfabriccenter.list_components':
+            return [u'{}-c{}'.format(args[1], i) for i in range(2)]
+        elif procedure == u'crossbarfabriccenter.list_realms':
+            return [u'realm1']
+        raise ApplicationError(u'wamp.error.no_such_procedure')
+
+
+def test_list_all_workers():
+    nodes = [u'node{:03d}'.format(i) for i in range(100)] + [u'bad']
+    session = FakeFabricSession(nodes)
+    rows = []
+
+    cmd = CmdListAllWorkers(concurrency=50, on_row=rows.append)
+    loop = asyncio.new_event_loop()
+    result = loop.run_until_complete(cmd.run(session))
+    loop.close()
+
+    assert len(result.result) == 300
+    assert result.result[0] == {
+        u'id': u'container1', u'type': u'container', u'node': u'node000',
+        u'worker': u'container1'}
+    assert sorted(rows, key=lambda row: (row[u'node'], row[u'worker'])) == result.result
+    assert list(result.errors) == [u'bad']
+    assert result.calls == session.calls == 1 + 101 + 300
+    assert session.max_active == 50
+
+    # get_nodes, list_workers and show_worker: 3 round-trips of wall time
+    # (and the bounded concurrency), instead of 402 calls one after another
+    assert result.duration < 40 * session.delay * 1000
+
+
+def test_list_all_components():
+    session = FakeFabricSession([u'node1', u'node2'])
+    loop = asyncio.new_event_loop()
+    result = loop.run_until_complete(CmdListAllComponents().run(session))
+
+    # the guest workers are not asked for components
+    assert result.result == [{
+        u'node': node,
+        u'worker': worker,
+        u'component': u'{}-c{}'.format(worker, i)
+    } for node in [u'node1', u'node2'] for worker in [u'container1', u'router1']
+        for i in range(2)]
+    assert result.errors == {}
+
+    result = loop.run_until_complete(CmdListAllRealms().run(session))
+    loop.close()
+    assert [row[u'realm'] for row in result.result] == [u'realm1'] * 2
@@ -0,0 +1,93 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+from __future__ import absolute_import
+
+from cbsh import reflection
+from cbsh.idl import accessor
+from cbsh.idl.synthetic import build_schema
+
+
+def _docs(item):
+    return [item.Documentation(i) for i in range(item.DocumentationLength())]
+
+
+def _attrs(item):
+    return [(item.Attributes(i).Key(), item.Attributes(i).Value())
+            for i in range(item.AttributesLength())]
+
+
+def test_accessor_matches_generated():
+    buf = build_schema(enums=3, tables=4, services=2)
+    gen = reflection.Schema.GetRootAsSchema(buf, 0)
+    fast = accessor.Schema.GetRootAsSchema(buf, 0)
+
+    assert fast.FileIdent() == gen.FileIdent()
+    assert fast.ObjectsLength() == gen.ObjectsLength()
+    assert fast.EnumsLength() == gen.EnumsLength()
+    assert fast.ServicesLength() == gen.ServicesLength()
+
+    for i, _enum in enumerate(fast.IterEnums()):
+        _gen = gen.Enums(i)
+        assert _enum.Name() == _gen.Name()
+        assert _docs(_enum) == _docs(_gen)
+        assert [(v.Name(), v.Value()) for v in _enum.IterValues()] == [
+            (_gen.Values(j).Name(), _gen.Values(j).Value())
+            for j in range(_gen.ValuesLength())
+        ]
+
+    for i, _obj in enumerate(fast.IterObjects()):
+        _gen = gen.Objects(i)
+        assert _obj.Name() == _gen.Name()
+        assert _obj.IsStruct() == _gen.IsStruct()
+        assert _obj.Bytesize() == _gen.Bytesize()
+        assert _docs(_obj) == _docs(_gen)
+        for j, _field in enumerate(_obj.IterFields()):
+            _gen_field = _gen.Fields(j)
+            _gen_type = _gen_field.Type()
+            assert _field.Name() == _gen_field.Name()
+            assert _field.Id() == _gen_field.Id()
+            assert _field.Offset() == _gen_field.Offset()
+            assert _field.TypeInfo() == (_gen_type.BaseType(),
+                                         _gen_type.Element(),
+                                         _gen_type.Index())
+            assert _field.Type().Index() == _gen_type.Index()
+            assert list(_field.IterDocumentation()) == _docs(_gen_field)
+
+    for i, _service in enumerate(fast.IterServices()):
+        _gen = gen.Services(i)
+        assert _service.Name() == _gen.Name()
+        assert _attrs(_service) == _attrs(_gen)
+        for j, _call in enumerate(_service.IterCalls()):
+            _gen_call = _gen.Calls(j)
+            assert _call.Name() == _gen_call.Name()
+            assert _call.Request().Name() == _gen_call.Request().Name()
+            assert _call.Response().Name() == _gen_call.Response().Name()
+            assert _attrs(_call) == _attrs(_gen_call)
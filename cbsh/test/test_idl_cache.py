@@ -0,0 +1,96 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+from __future__ import absolute_import
+
+import os
+import hashlib
+
+import txaio
+txaio.use_asyncio()
+
+from cbsh.idl.cache import SchemaCache  # noqa: E402
+from cbsh.idl.loader import read_reflection_schema_file  # noqa: E402
+from cbsh.idl.synthetic import build_schema  # noqa: E402
+
+
+def test_schema_cache_roundtrip(tmpdir):
+    cache = SchemaCache(str(tmpdir))
+    schema = {'meta': {'bfbs_sha256': 'a' * 64}, 'types': {'x.Y': {}}}
+
+    assert cache.get('a' * 64) is None
+    cache.put('a' * 64, schema)
+    assert cache.get('a' * 64) == schema
+
+
+def test_schema_cache_stale_entry(tmpdir):
+    cache = SchemaCache(str(tmpdir))
+    tmpdir.join('b' * 64 + '.cache').write_binary(b'garbage')
+
+    assert cache.get('b' * 64) is None
+    assert not tmpdir.join('b' * 64 + '.cache').exists()
+
+
+def test_schema_cache_lru_eviction(tmpdir):
+    cache = SchemaCache(str(tmpdir), max_size=3000)
+    schema = {'docs': ['x' * 1000]}
+
+    for i, key in enumerate(['a', 'b']):
+        cache.put(key * 64, schema)
+        os.utime(str(tmpdir.join(key * 64 + '.cache')), (i, i))
+
+    # touching "a" makes "b" the least recently used entry
+    assert cache.get('a' * 64) == schema
+    cache.put('c' * 64, schema)
+
+    assert cache.get('b' * 64) is None
+    assert cache.get('a' * 64) == schema
+    assert cache.get('c' * 64) == schema
+
+
+def test_read_reflection_schema_file_cached(tmpdir, monkeypatch):
+    path = tmpdir.join('synth.bfbs')
+    path.write_binary(build_schema())
+    cache = SchemaCache(str(tmpdir.join('cache')))
+
+    # on a miss, the buffer is hashed once for both the lookup and the store
+    hashed = []
+
+    def sha256(data=b''):
+        hashed.append(len(data))
+        return hashlib.new('sha256', data)
+
+    monkeypatch.setattr(hashlib, 'sha256', sha256)
+    schema = read_reflection_schema_file(str(path), cache=cache)
+    monkeypatch.undo()
+    assert hashed.count(path.size()) == 1
+    assert schema['meta']['bfbs_sha256'] == hashlib.sha256(path.read_binary()).hexdigest()
+    assert cache.get(schema['meta']['bfbs_sha256']) == schema
+    assert read_reflection_schema_file(str(path), cache=cache) == schema
@@ -0,0 +1,123 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import sys
+import asyncio
+import importlib
+
+import pytest
+
+from autobahn.wamp.types import RegisterOptions
+from autobahn.wamp.exception import ApplicationError
+
+from cbsh.idl.generator import BUILTIN_TEMPLATE_PATH, process
+from cbsh.idl.loader import read_reflection_schema
+from cbsh.idl.loopback import LoopbackRouter
+from cbsh.idl.synthetic import build_schema
+
+PREFIX = 'com.example.synth.'
+
+REQUEST = {
+    'field_000000': 23,
+    'field_000001': 'hello',
+    'field_000002': 1,
+    'field_000003': b'\x01\x02',
+}
+
+
+@pytest.fixture
+def client(tmpdir):
+    schema = read_reflection_schema(
+        build_schema(enums=1, tables=2, fields=4, structs=0, services=1, slots=2))
+    schema['types']['synth.Service000000']['slots']['slot_000000']['stream'] = 'out'
+
+    package = tmpdir.mkdir('gen_client')
+    package.join('__init__.py').write('')
+    process(schema, [BUILTIN_TEMPLATE_PATH], outdir=str(package),
+            meta_template='client.meta', max_workers=1, bytecode_cache=False)
+
+    sys.path.insert(0, str(tmpdir))
+    try:
+        yield importlib.import_module('gen_client.client')
+    finally:
+        sys.path.remove(str(tmpdir))
+        for name in ['gen_client', 'gen_client.client', 'gen_client.codec']:
+            sys.modules.pop(name, None)
+
+
+def test_call(client):
+    codec = client.codec
+    router = LoopbackRouter()
+
+    def echo(payload, details=None):
+        request = codec.decode_synth_Table000000(payload)
+        for i in range(3):
+            details.progress(codec.encode_synth_Table000001({'field_000000': i}))
+        return codec.encode_synth_Table000001({'field_000001': request['field_000001'].upper()})
+
+    progress = []
+
+    async def main():
+        await router.session().register(echo, PREFIX + 'slot_000000',
+                                        options=RegisterOptions(details_arg='details'))
+        proxy = client.synth_Service000000Client(router.session(), PREFIX)
+        result = await proxy.slot_000000(REQUEST, on_progress=progress.append)
+
+        other = client.synth_Service000000Client(router.session(), 'com.example.other.')
+        with pytest.raises(ApplicationError, match='no_such_procedure'):
+            await other.slot_000000(REQUEST)
+        return result
+
+    loop = asyncio.new_event_loop()
+    result = loop.run_until_complete(main())
+    loop.close()
+    assert result['field_000001'] == 'HELLO'
+    assert [p['field_000000'] for p in progress] == [0, 1, 2]
+
+
+def test_publish_subscribe(client):
+    router = LoopbackRouter()
+    events = []
+
+    async def main():
+        subscriber = client.synth_Service000000Client(router.session(), PREFIX)
+        subscription = await subscriber.subscribe_slot_000001(events.append)
+        publisher = client.synth_Service000000Client(router.session(), PREFIX)
+        publisher.publish_slot_000001({'field_000001': 'event'})
+        await subscription.unsubscribe()
+        publisher.publish_slot_000001({'field_000001': 'lost'})
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main())
+    loop.close()
+    assert [e['field_000001'] for e in events] == ['event']
@@ -0,0 +1,236 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import pytest
+
+import flatbuffers
+from flatbuffers.table import Table
+from flatbuffers import number_types as N
+
+from cbsh.idl.codec import codec_types, table_layout
+from cbsh.idl.generator import BUILTIN_TEMPLATE_PATH, get_environment
+
+
+def _field(name, id, base_type, **kwargs):
+    field = {'name': name, 'id': id, 'offset': 4 + 2 * id, 'base_type': base_type}
+    field.update(kwargs)
+    return field
+
+
+def _struct_field(name, offset, base_type, **kwargs):
+    field = {'name': name, 'id': 0, 'offset': offset, 'base_type': base_type}
+    field.update(kwargs)
+    return field
+
+
+TYPES = {
+    'test.Vec3': {
+        'type': 'struct', 'name': 'test.Vec3', 'docs': [],
+        'fields': {
+            'x': _struct_field('x', 0, 'float'),
+            'y': _struct_field('y', 4, 'float'),
+            'z': _struct_field('z', 8, 'float'),
+        },
+        'minalign': 4, 'bytesize': 12,
+    },
+    'test.Sample': {
+        'type': 'struct', 'name': 'test.Sample', 'docs': [],
+        'fields': {
+            'ts': _struct_field('ts', 0, 'uint64'),
+            'pos': _struct_field('pos', 8, 'object', ref_category='struct', ref_type='test.Vec3'),
+            'flag': _struct_field('flag', 20, 'bool'),
+        },
+        'minalign': 8, 'bytesize': 24,
+    },
+    'test.Tag': {
+        'type': 'table', 'name': 'test.Tag', 'docs': [],
+        'fields': {
+            'name': _field('name', 0, 'string'),
+            'value': _field('value', 1, 'double'),
+        },
+    },
+    'test.Series': {
+        'type': 'table', 'name': 'test.Series', 'docs': [],
+        'fields': {
+            'name': _field('name', 0, 'string'),
+            'origin': _field('origin', 1, 'object', ref_category='struct', ref_type='test.Vec3'),
+            'samples': _field('samples', 2, 'vector', element_type='object',
+                              ref_category='struct', ref_type='test.Sample'),
+            'raw': _field('raw', 3, 'vector', element_type='uint8'),
+            'weights': _field('weights', 4, 'vector', element_type='float'),
+            'labels': _field('labels', 5, 'vector', element_type='string'),
+            'tags': _field('tags', 6, 'vector', element_type='object',
+                           ref_category='table', ref_type='test.Tag'),
+            'parent': _field('parent', 7, 'object', ref_category='table', ref_type='test.Tag'),
+            'count': _field('count', 8, 'int16'),
+            'active': _field('active', 9, 'bool'),
+        },
+    },
+    'test.Settings': {
+        'type': 'table', 'name': 'test.Settings', 'docs': [],
+        'fields': {
+            'mode': _field('mode', 0, 'uint8', ref_category='enum',
+                           ref_type='test.Mode', default=2),
+            'gain': _field('gain', 1, 'double', default=0.5),
+            'enabled': _field('enabled', 2, 'bool', default=1),
+            'limit': _field('limit', 3, 'float', default=float('inf')),
+            'count': _field('count', 4, 'int32'),
+        },
+    },
+    'test.Choice': {
+        'type': 'table', 'name': 'test.Choice', 'docs': [],
+        'fields': {
+            'value_type': _field('value_type', 0, 'utype'),
+            'value': _field('value', 1, 'union'),
+        },
+    },
+}
+
+SERIES = {
+    'name': 'series-1',
+    'origin': {'x': 1.0, 'y': 2.0, 'z': 3.0},
+    'samples': [{'ts': i, 'pos': {'x': 0.5 * i, 'y': -1.0, 'z': 2.0}, 'flag': bool(i % 2)}
+                for i in range(5)],
+    'raw': b'\x00\x01\x02',
+    'weights': [0.5, 0.25],
+    'labels': ['a', 'bc', ''],
+    'tags': [{'name': 'unit', 'value': 9.81}, {'name': None, 'value': 0.0}],
+    'parent': {'name': 'p', 'value': 1.5},
+    'count': -3,
+    'active': True,
+}
+
+
+@pytest.fixture(scope='module')
+def codec():
+    schema = {'meta': {}, 'types': TYPES}
+    env = get_environment([BUILTIN_TEMPLATE_PATH], bytecode_cache=False)
+    source = env.get_template('codec.py.jinja2').render(schema=schema)
+    module = {}
+    exec(compile(source, 'codec.py', 'exec'), module)
+    return module
+
+
+def test_table_layout():
+    layout = table_layout(TYPES, 'test.Series')
+    # by decreasing alignment (and then by id), without padding
+    assert [f['name'] for f in layout['fields']][-2:] == ['count', 'active']
+    assert layout['encode_format'] == '<iIfffIIIIIIh?'
+    assert layout['decode_format'] == '<iI12xIIIIIIh?'
+    assert layout['vtable'][:4] == bytes([24, 0, layout['size'], 0])
+
+    tables, structs, skipped = codec_types(TYPES)
+    assert [t['name'] for t in tables] == ['test.Series', 'test.Settings', 'test.Tag']
+    assert [s['name'] for s in structs] == ['test.Sample', 'test.Vec3']
+    assert skipped == ['test.Choice']
+
+
+def test_roundtrip(codec):
+    buf = bytearray(16)
+    data = codec['encode_test_Series'](SERIES, buf)
+    assert len(buf) >= len(data)
+
+    decoded = codec['decode_test_Series'](data)
+    assert decoded == SERIES
+    assert codec['decode_test_Series'](codec['encode_test_Series'](SERIES, buf)) == SERIES
+
+    # absent fields
+    decoded = codec['decode_test_Series'](codec['encode_test_Series']({'count': 1}))
+    assert decoded['count'] == 1
+    assert decoded['name'] is None and decoded['tags'] is None and decoded['origin'] == {'x': 0.0, 'y': 0.0, 'z': 0.0}
+
+    # packed vectors from bytes-like objects
+    packed = bytes(data)
+    samples = codec['decode_test_Series'](codec['encode_test_Series'](
+        {'samples': memoryview(packed)[0:0], 'weights': bytes(8)}))
+    assert samples['samples'] == [] and samples['weights'] == [0.0, 0.0]
+
+
+def test_readable_by_flatbuffers(codec):
+    data = codec['encode_test_Series'](SERIES)
+    pos = flatbuffers.encode.Get(N.UOffsetTFlags.packer_type, data, 0)
+    table = Table(bytearray(data), pos)
+
+    assert table.String(table.Offset(4) + pos) == b'series-1'
+    assert table.Get(N.Int16Flags, pos + table.Offset(20)) == -3
+    assert table.Get(N.BoolFlags, pos + table.Offset(22))
+    assert table.VectorLen(table.Offset(10)) == 3
+    assert table.Get(N.Float32Flags, pos + table.Offset(6) + 8) == 3.0
+
+    start = table.Vector(table.Offset(8))
+    assert table.Get(N.Uint64Flags, start + 24 * 4) == 4
+    assert start % 8 == 0
+
+
+def test_decode_builder_output(codec):
+    builder = flatbuffers.Builder(0)
+    name = builder.CreateString('tag')
+    builder.StartObject(2)
+    builder.PrependUOffsetTRelativeSlot(0, name, 0)
+    builder.PrependFloat64Slot(1, 2.5, 0)
+    tag = builder.EndObject()
+    builder.StartVector(4, 2, 4)
+    builder.PrependFloat32(2.0)
+    builder.PrependFloat32(1.0)
+    weights = builder.EndVector()
+    builder.StartObject(10)
+    builder.PrependUOffsetTRelativeSlot(7, tag, 0)
+    builder.PrependUOffsetTRelativeSlot(4, weights, 0)
+    builder.PrependInt16Slot(8, 7, 0)
+    builder.Finish(builder.EndObject())
+
+    decoded = codec['decode_test_Series'](builder.Output())
+    assert decoded['parent'] == {'name': 'tag', 'value': 2.5}
+    assert decoded['weights'] == [1.0, 2.0]
+    assert decoded['count'] == 7
+    assert decoded['active'] is False
+    assert decoded['samples'] is None and decoded['origin'] is None
+
+
+def test_defaults(codec):
+    defaults = {'mode': 2, 'gain': 0.5, 'enabled': True, 'limit': float('inf'), 'count': 0}
+
+    # fields equal to their default are elided by the Builder
+    builder = flatbuffers.Builder(0)
+    builder.StartObject(5)
+    builder.PrependUint8Slot(0, 2, 2)
+    builder.PrependInt32Slot(4, 3, 0)
+    builder.Finish(builder.EndObject())
+    assert codec['decode_test_Settings'](builder.Output()) == dict(defaults, count=3)
+
+    # absent fields are written as their defaults, zero values are kept
+    decode, encode = codec['decode_test_Settings'], codec['encode_test_Settings']
+    assert decode(encode({})) == defaults
+    assert decode(encode({'mode': None, 'count': 1})) == dict(defaults, count=1)
+    values = {'mode': 0, 'gain': 0.0, 'enabled': False, 'limit': 0.0, 'count': 0}
+    assert decode(encode(values)) == values
@@ -0,0 +1,120 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import copy
+import hashlib
+
+from cbsh.idl.cache import SchemaCache
+from cbsh.idl.lazy import LazySchema
+from cbsh.idl.loader import read_reflection_schema, typedef_hash
+from cbsh.idl.synthetic import build_schema
+from cbsh.idl.diff import (diff_schemas, diff_lazy_schemas, diff_schema_files,
+                           format_schema_diff)
+
+
+def test_typedef_hash():
+    schema1 = read_reflection_schema(build_schema(tables=3))
+    schema2 = read_reflection_schema(build_schema(tables=3))
+
+    for name, typedef in schema1['types'].items():
+        assert typedef['hash'] == typedef_hash(typedef)
+        assert typedef['hash'] == schema2['types'][name]['hash']
+
+
+def test_diff_schemas():
+    schema1 = read_reflection_schema(build_schema(tables=3))
+    schema2 = copy.deepcopy(schema1)
+
+    assert diff_schemas(schema1, schema2) == {
+        'added': [],
+        'removed': [],
+        'changed': {}
+    }
+
+    del schema2['types']['synth.Enum000000']
+    table = schema2['types']['synth.Table000001']
+    table['docs'] = ['Changed.']
+    table['fields']['field_000001']['docs'] = ['Changed.']
+    del table['fields']['field_000002']
+    table['hash'] = typedef_hash(table)
+
+    diff = diff_schemas(schema1, schema2)
+    assert diff['added'] == []
+    assert diff['removed'] == ['synth.Enum000000']
+    assert list(diff['changed'].keys()) == ['synth.Table000001']
+
+    changes = diff['changed']['synth.Table000001']
+    assert sorted(changes.keys()) == ['docs', 'fields']
+    assert changes['fields']['removed'] == ['field_000002']
+    assert list(changes['fields']['changed'].keys()) == ['field_000001']
+
+    assert format_schema_diff(diff_schemas(schema2, schema1))[0] == \
+        '+ synth.Enum000000'
+
+
+def test_diff_schema_files(tmpdir):
+    old = tmpdir.join('old.bfbs')
+    old.write_binary(build_schema(tables=3))
+    new = tmpdir.join('new.bfbs')
+    new.write_binary(build_schema(tables=4))
+
+    diff = diff_schema_files(str(old), str(old))
+    assert not (diff['added'] or diff['removed'] or diff['changed'])
+
+    diff = diff_schema_files(str(old), str(new))
+    assert diff['added'] == ['synth.Table000003']
+
+    # schemas not yet cached are stored in the cache
+    cache = SchemaCache(str(tmpdir.join('cache')))
+    assert diff_schema_files(str(old), str(new), cache=cache) == diff
+    for path in [old, new]:
+        schema = cache.get(hashlib.sha256(path.read_binary()).hexdigest())
+        assert schema == read_reflection_schema(path.read_binary())
+    assert diff_schema_files(str(old), str(new), cache=cache) == diff
+
+
+def test_diff_lazy_schemas():
+    buf1 = build_schema(tables=3)
+    buf2 = build_schema(tables=4)
+    assert diff_lazy_schemas(LazySchema(buf1), LazySchema(buf2)) == diff_schemas(
+        read_reflection_schema(buf1), read_reflection_schema(buf2))
+
+    # change the docs of one table in place: only that table is decoded
+    i = buf1.find(b'for synth.Table000001.')
+    buf2 = buf1[:i] + b'FOR' + buf1[i + 3:]
+    old = LazySchema(buf1)
+    new = LazySchema(buf2)
+    diff = diff_lazy_schemas(old, new)
+    assert list(diff['changed'].keys()) == ['synth.Table000001']
+    assert list(diff['changed']['synth.Table000001'].keys()) == ['docs']
+    assert len(old._types) == len(new._types) == 1
@@ -0,0 +1,249 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from cbsh.idl.cache import SchemaCache
+from cbsh.idl.fbs import FbsParser, parse_fbs, read_fbs_schema_file
+from cbsh.idl.loader import read_reflection_schema_file, read_schema_file
+
+EXAMPLE_FBS = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'tests', 'idl', 'example.fbs')
+
+COMMON_FBS = '''
+attribute "uuid";
+attribute "type";
+attribute "stream";
+
+namespace common;
+
+/// A 3d vector.
+struct Vec3 (force_align: 16) {
+  x: float;
+  y: float;
+  z: float;
+}
+
+/* block
+   comment */
+enum Flags: ubyte (bit_flags) {
+  /// first
+  A,
+  B = 3,
+  C,
+}
+
+table Void {}
+'''
+
+MAIN_FBS = '''
+include "inc/common.fbs";
+
+namespace app.model;
+
+enum Level: short { Low = -2, Mid, Zero, High = 10 }
+
+struct Pad {
+  a: bool;
+  b: double;
+  c: byte;
+  v: common.Vec3;
+  l: Level;
+}
+
+/// Main table.
+// not a doc comment
+/// Second line.
+table Monster (uuid: "m") {
+  name: string (id: 2, required);
+  pos: Pad (id: 0);
+  /// inventory
+  inventory: [ubyte] (id: 1);
+  names: [string] (id: 4);
+  friends: [Monster] (id: 3, deprecated);
+  path: [common.Vec3] (id: 5);
+  level: Level = Mid (id: 6);
+  flags: common.Flags (id: 7);
+  hp: short = 100 (id: 8);
+  speed: float = 1.5 (id: 9);
+  alive: bool = true (id: 10);
+  mana: uint = 0x10 (id: 11);
+}
+
+rpc_service Game (type: "interface", uuid: "0") {
+  /// spawn it
+  spawn (Monster): common.Void (type: "procedure", stream: "null");
+  on_spawn (Monster): Monster (type: "topic");
+}
+
+root_type Monster;
+file_identifier "MONS";
+file_extension "mon";
+'''
+
+
+def _write_fixture(tmpdir):
+    tmpdir.mkdir('inc').join('common.fbs').write(COMMON_FBS)
+    tmpdir.join('main.fbs').write(MAIN_FBS)
+    return str(tmpdir.join('main.fbs'))
+
+
+def test_parse_fbs():
+    tree = parse_fbs(COMMON_FBS)
+    assert tree['attributes'] == ['uuid', 'type', 'stream']
+    vec3, flags, void = tree['decls']
+    assert (vec3['kind'], vec3['namespace'], vec3['name']) == ('struct', 'common', 'Vec3')
+    assert vec3['docs'] == ['A 3d vector.']
+    assert vec3['attrs'] == [('force_align', '16', 9)]
+    assert [v['name'] for v in flags['values']] == ['A', 'B', 'C']
+    assert flags['values'][0]['docs'] == ['first']
+
+    with pytest.raises(Exception, match='<string>:3: expected ";"'):
+        parse_fbs('table A {\n  x: int\n}')
+
+
+def test_read_fbs_schema(tmpdir):
+    schema = read_fbs_schema_file(_write_fixture(tmpdir))
+    types = schema['types']
+
+    assert schema['meta']['root'] == 'app.model.Monster'
+    assert schema['meta']['file_ident'] == 'MONS'
+    assert schema['meta']['file_ext'] == 'mon'
+
+    # enums, then tables/structs, then services, each sorted by name
+    assert list(types) == [
+        'app.model.Level', 'common.Flags', 'app.model.Monster',
+        'app.model.Pad', 'common.Vec3', 'common.Void', 'app.model.Game'
+    ]
+    assert list(types['common.Flags']['values']) == ['A', 'B', 'C']
+    assert list(types['app.model.Level']['values']) == [
+        'Low', 'Mid', 'Zero', 'High'
+    ]
+
+    # struct layout
+    pad = types['app.model.Pad']
+    assert [(f['name'], f['offset']) for f in pad['fields'].values()] == [
+        ('a', 0), ('b', 8), ('c', 16), ('l', 48), ('v', 32)
+    ]
+    assert (pad['minalign'], pad['bytesize']) == (16, 64)
+
+    monster = types['app.model.Monster']
+    assert monster['docs'] == ['Main table.', 'Second line.']
+    assert monster['fields']['names'] == {
+        'name': 'names',
+        'id': 4,
+        'offset': 12,
+        'base_type': 'vector',
+        'element_type': 'string',
+    }
+    assert monster['fields']['level']['ref_category'] == 'enum'
+
+    # schema defaults (if not zero)
+    assert [(name, field.get('default', None))
+            for name, field in monster['fields'].items()
+            if name in ('alive', 'flags', 'hp', 'level', 'mana', 'speed')] == [
+        ('alive', 1), ('flags', None), ('hp', 100), ('level', -1),
+        ('mana', 16), ('speed', 1.5)
+    ]
+    assert monster['fields']['path']['ref_type'] == 'common.Vec3'
+
+    game = types['app.model.Game']
+    assert game['uuid'] is None
+    assert game['slots']['spawn']['out'] == 'common.Void'
+    assert game['slots']['spawn']['stream'] is None
+    assert game['slots']['on_spawn']['in'] == 'app.model.Monster'
+
+    # dispatch by file extension
+    assert read_schema_file(str(tmpdir.join('main.fbs')))['types'] == types
+
+
+@pytest.mark.parametrize('source, error', [
+    ('table A { b: B; }', 'type referenced but not defined: "B"'),
+    ('table A (foo) {}', 'must be declared before use: "foo"'),
+    ('struct A { s: string; }', 'only scalar or struct fields'),
+    ('table A { x: int (id: 1); }', 'must be consecutive from 0'),
+    ('table A {}\ntable A {}', 'duplicate name "A"'),
+])
+def test_fbs_errors(tmpdir, source, error):
+    tmpdir.join('bad.fbs').write(source)
+    with pytest.raises(Exception, match=error):
+        read_fbs_schema_file(str(tmpdir.join('bad.fbs')))
+
+
+def test_fbs_parse_cache(tmpdir):
+    main = _write_fixture(tmpdir.mkdir('src'))
+    cache = SchemaCache(cache_dir=str(tmpdir.join('cache')))
+
+    parser = FbsParser(cache=cache)
+    schema = parser.read_schema(main)
+    assert parser.parsed == 2
+    assert sorted(parser.dependencies(main)) == [
+        str(tmpdir.join('src', 'inc', 'common.fbs')), main
+    ]
+
+    # nothing changed: no file is parsed again
+    assert parser.read_schema(main) == schema
+    assert parser.parsed == 2
+
+    # only the edited include file is parsed again
+    tmpdir.join('src', 'inc', 'common.fbs').write(
+        COMMON_FBS.replace('/// A 3d vector.', '/// A vector.'))
+    schema = parser.read_schema(main)
+    assert parser.parsed == 3
+    assert schema['types']['common.Vec3']['docs'] == ['A vector.']
+
+    # a new parser finds all syntax trees in the persistent cache
+    parser = FbsParser(cache=cache)
+    assert parser.read_schema(main) == schema
+    assert parser.parsed == 0
+
+
+@pytest.mark.skipif(shutil.which('flatc') is None, reason='flatc not found')
+def test_fbs_matches_flatc(tmpdir):
+    for fbs in [EXAMPLE_FBS, _write_fixture(tmpdir.mkdir('src'))]:
+        outdir = str(tmpdir.join('out'))
+        subprocess.check_call([
+            'flatc', '-o', outdir, '--binary', '--schema', '--bfbs-comments',
+            '--bfbs-builtins', fbs
+        ])
+        bfbs = os.path.join(
+            outdir, os.path.splitext(os.path.basename(fbs))[0] + '.bfbs')
+        expected = read_reflection_schema_file(bfbs)
+        schema = read_fbs_schema_file(fbs)
+        assert schema['types'] == expected['types']
+        assert list(schema['types']) == list(expected['types'])
+        assert schema['meta']['root'] == expected['meta']['root']
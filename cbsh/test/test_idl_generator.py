@@ -0,0 +1,246 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import multiprocessing
+import concurrent.futures
+
+import pytest
+
+from cbsh.idl import generator
+from cbsh.idl.generator import (get_environment, precompile_templates,
+                                plan_targets, process)
+from cbsh.idl.loader import read_reflection_schema, typedef_hash
+from cbsh.idl.synthetic import build_schema
+from cbsh.idl.rst import RstRenderer
+
+
+def test_precompile_templates(tmpdir):
+    templates = tmpdir.mkdir('templates')
+    templates.join('a.rst').write('{{ schema.meta.file_ident }}')
+    templates.mkdir('sub').join('b.rst').write('{% for x in xs %}{{ x }}{% endfor %}')
+    templates.join('.a.rst.swp').write('{{')
+    cache_dir = str(tmpdir.join('cache'))
+
+    names = precompile_templates([str(templates)], cache_dir)
+    assert sorted(names) == ['a.rst', 'sub/b.rst']
+    assert len(os.listdir(cache_dir)) == 2
+
+    env = get_environment([str(templates)], cache_dir)
+    assert env is get_environment([str(templates)], cache_dir)
+    assert env.get_template('sub/b.rst').render(xs=[1, 2]) == '12'
+
+
+def test_rst_render_batch(tmpdir):
+    texts = ['Docs of *field* {}, see ``foo``.'.format(i) for i in range(20)]
+    texts += [
+        '', 'A list:\n\n* x\n* y', 'Title\n=====\n\nBody.',
+        'A `link <https://crossbar.io>`_.', 'term\n   definition',
+        '   quoted', 'Broken::', ':Author: someone', 'Docs of *field* 0, see ``foo``.'
+    ]
+
+    expected = [RstRenderer().render(text) for text in texts]
+    assert RstRenderer().render_batch(texts) == expected
+
+    cache_dir = str(tmpdir.join('cache'))
+    renderer = RstRenderer(cache_dir)
+    assert renderer.render_batch(texts) == expected
+    renderer.flush()
+
+    renderer = RstRenderer(cache_dir)
+    renderer._publish = None
+    assert renderer.render_batch(texts) == expected
+
+
+def _write_templates(tmpdir):
+    templates = tmpdir.mkdir('templates')
+    templates.join('main.meta').write(
+        '# all interfaces\n'
+        'index.txt index.txt\n'
+        '{% for name, t in schema.types.items() if t.type == "interface" %}'
+        'api/{{ name }}.txt interface.txt {{ name }}\n'
+        '{% endfor %}')
+    templates.join('index.txt').write('{{ schema.types|length }} types')
+    templates.join('interface.txt').write(
+        '{{ target }}: {% for s in type.slots.values() %}{{ s.name }} {% endfor %}')
+    return str(templates)
+
+
+def test_plan_targets(tmpdir):
+    schema = read_reflection_schema(build_schema(services=3))
+    env = get_environment([_write_templates(tmpdir)], bytecode_cache=False)
+
+    targets = plan_targets(schema, env)
+    assert targets[0] == ('index.txt', 'index.txt', None)
+    assert targets[1:] == [('api/synth.Service{:06d}.txt'.format(i),
+                            'interface.txt', 'synth.Service{:06d}'.format(i))
+                           for i in range(3)]
+
+    tmpdir.join('templates', 'bad.meta').write('../outside.txt index.txt')
+    with pytest.raises(Exception, match='invalid target file'):
+        plan_targets(schema, env, 'bad.meta')
+
+
+def test_process(tmpdir):
+    schema = read_reflection_schema(build_schema(services=3, slots=2))
+    templates = _write_templates(tmpdir)
+
+    outputs = []
+    for max_workers in [1, 2]:
+        outdir = tmpdir.join('out{}'.format(max_workers))
+        paths = process(
+            schema, [templates],
+            outdir=str(outdir),
+            max_workers=max_workers,
+            bytecode_cache=False)
+        assert len(paths) == 4
+        outputs.append({
+            os.path.relpath(path, str(outdir)): open(path).read()
+            for path in paths
+        })
+
+    assert outputs[0] == outputs[1]
+    assert outputs[0]['api/synth.Service000001.txt'] == \
+        'api/synth.Service000001.txt: slot_000000 slot_000001 '
+
+
+def test_process_no_initializer(tmpdir, monkeypatch):
+    # process pools without initializer (as before Python 3.7)
+    base = concurrent.futures.ProcessPoolExecutor
+
+    class ProcessPoolExecutor(base):
+        def __init__(self, max_workers=None):
+            base.__init__(self, max_workers)
+
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor',
+                        ProcessPoolExecutor)
+    monkeypatch.setattr(multiprocessing, 'get_start_method', lambda: 'fork')
+
+    schema = read_reflection_schema(build_schema(services=3, slots=2))
+    paths = process(
+        schema, [_write_templates(tmpdir)],
+        outdir=str(tmpdir.join('out')),
+        max_workers=2,
+        bytecode_cache=False)
+    assert len(paths) == 4
+
+
+def test_process_rst_cache(tmpdir, monkeypatch):
+    schema = read_reflection_schema(build_schema(services=3, slots=2))
+    templates = _write_templates(tmpdir)
+    tmpdir.join('templates', 'interface.txt').write(
+        '{{ ("Docs of *" ~ target ~ "*.")|rst }}')
+
+    cache_dir = str(tmpdir.join('cache'))
+    monkeypatch.setattr(generator, '_rst_renderer', RstRenderer(cache_dir))
+    monkeypatch.setattr(generator, '_rst_cache_dir', cache_dir)
+
+    # docs rendered lazily (in the worker processes) are persisted as well
+    paths = process(
+        schema, [templates],
+        outdir=str(tmpdir.join('out')),
+        max_workers=2,
+        bytecode_cache=False)
+    assert len(paths) == 4
+
+    renderer = RstRenderer(cache_dir)
+    renderer._publish = None
+    assert renderer.render('Docs of *api/synth.Service000002.txt*.') == \
+        open(paths[-1]).read()
+
+
+def test_process_incremental(tmpdir):
+    schema = read_reflection_schema(build_schema(services=3, slots=2))
+    templates = _write_templates(tmpdir)
+    outdir = str(tmpdir.join('out'))
+
+    def generate():
+        paths = process(
+            schema, [templates],
+            outdir=outdir,
+            max_workers=1,
+            bytecode_cache=False,
+            incremental=True)
+        return sorted(os.path.relpath(path, outdir) for path in paths)
+
+    assert len(generate()) == 4
+    assert generate() == []
+
+    # a changed doc comment only regenerates the page of its interface
+    service = schema['types']['synth.Service000001']
+    service['slots']['slot_000000']['docs'] = ['Changed.']
+    service['hash'] = typedef_hash(service)
+    assert generate() == ['api/synth.Service000001.txt']
+
+    # the index lists all types
+    del schema['types']['synth.Service000002']
+    assert generate() == ['index.txt']
+    assert not os.path.exists(os.path.join(outdir, 'api/synth.Service000002.txt'))
+
+    tmpdir.join('templates', 'interface.txt').write('{{ type.name }}')
+    assert generate() == ['api/synth.Service000000.txt', 'api/synth.Service000001.txt']
+
+    # touching a template without changing it does not regenerate anything
+    os.utime(str(tmpdir.join('templates', 'index.txt')), (0, 0))
+    assert generate() == []
+
+
+def test_process_incremental_probed(tmpdir):
+    schema = read_reflection_schema(build_schema(services=1))
+    templates = tmpdir.mkdir('templates')
+    templates.join('main.meta').write('a.txt a.txt\nb.txt b.txt\nc.txt c.txt')
+    templates.join('a.txt').write("{{ schema.types.get('synth.Extra', {}).name }}")
+    templates.join('b.txt').write("{{ 'synth.Extra' in schema.types }}")
+    templates.join('c.txt').write("{{ schema.meta.get('extra') }}")
+    outdir = str(tmpdir.join('out'))
+
+    def generate():
+        paths = process(
+            schema, [str(templates)],
+            outdir=outdir,
+            max_workers=1,
+            bytecode_cache=False,
+            incremental=True)
+        return sorted(os.path.relpath(path, outdir) for path in paths)
+
+    assert generate() == ['a.txt', 'b.txt', 'c.txt']
+    assert generate() == []
+
+    # keys probed while missing are dependencies too
+    extra = dict(schema['types']['synth.Service000000'], name='synth.Extra')
+    schema['types']['synth.Extra'] = extra
+    assert generate() == ['a.txt', 'b.txt']
+    assert open(os.path.join(outdir, 'a.txt')).read() == 'synth.Extra'
+
+    schema['meta']['extra'] = 'x'
+    assert generate() == ['c.txt']
@@ -0,0 +1,164 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+from __future__ import absolute_import
+
+import io
+import json
+
+import pytest
+
+from cbsh.idl.loader import (read_reflection_schema,
+                             read_reflection_schema_file, find_schema_files,
+                             load_schemas, merge_schemas, write_schema_json,
+                             stream_reflection_schema_file)
+from cbsh.idl.synthetic import build_schema
+from cbsh.idl.lazy import LazySchema
+
+
+def _write_schema(tmpdir, **kwargs):
+    buf = build_schema(**kwargs)
+    path = tmpdir.join('synth.bfbs')
+    path.write_binary(buf)
+    return buf, str(path)
+
+
+def test_read_reflection_schema():
+    schema = read_reflection_schema(build_schema(enums=2, tables=3, services=1))
+
+    assert schema['meta']['file_ident'] == 'SYNT'
+    assert sorted(schema['types'].keys()) == [
+        'synth.Enum000000', 'synth.Enum000001', 'synth.Service000000',
+        'synth.Struct000000', 'synth.Struct000001', 'synth.Table000000',
+        'synth.Table000001', 'synth.Table000002'
+    ]
+    assert schema['types']['synth.Service000000']['type'] == 'interface'
+
+
+def test_read_reflection_schema_typerefs():
+    schema = read_reflection_schema(build_schema(enums=2, tables=3, services=1))
+
+    fields = schema['types']['synth.Table000000']['fields']
+    assert fields['field_000002']['ref_category'] == 'enum'
+    assert fields['field_000002']['ref_type'] == 'synth.Enum000000'
+    assert fields['field_000004']['ref_category'] == 'table'
+    assert fields['field_000004']['ref_type'] == 'synth.Table000001'
+    assert fields['field_000005']['ref_type'] == 'synth.Table000002'
+
+
+def test_read_reflection_schema_file_mmap(tmpdir):
+    buf, path = _write_schema(tmpdir)
+
+    schema = read_reflection_schema(buf)
+    assert read_reflection_schema_file(path, use_mmap=True) == schema
+    assert read_reflection_schema_file(path, use_mmap=False) == schema
+    assert schema['meta']['bfbs_size'] == len(buf)
+
+
+def test_lazy_schema():
+    buf = build_schema(enums=3, tables=5, services=2)
+    schema = read_reflection_schema(buf)
+    lazy = LazySchema(buf)
+
+    assert len(lazy) == len(schema['types'])
+    assert sorted(lazy.interfaces()) == [
+        'synth.Service000000', 'synth.Service000001'
+    ]
+    assert 'synth.Table000004' in lazy
+    assert lazy.get('synth.NoSuchType') is None
+    assert lazy.meta == schema['meta']
+
+    for name in lazy.keys():
+        assert lazy[name] == schema['types'][name]
+        assert lazy[name] is lazy[name]
+
+
+def test_load_schemas(tmpdir):
+    for i in range(3):
+        tmpdir.join('s{}.bfbs'.format(i)).write_binary(
+            build_schema(namespace='ns{}'.format(i)))
+    # a shared definition, identical in both files
+    tmpdir.mkdir('sub').join('s0.bfbs').write_binary(
+        build_schema(namespace='ns0'))
+
+    filenames = find_schema_files([str(tmpdir)])
+    assert len(filenames) == 4
+
+    loaded = []
+    schema = load_schemas(
+        filenames,
+        max_workers=2,
+        use_cache=False,
+        on_loaded=lambda filename, duration: loaded.append(filename))
+
+    assert sorted(loaded) == sorted(filenames)
+    assert len(schema['meta']['files']) == 4
+    assert len(schema['types']) == 3 * 16
+
+
+def test_merge_schemas_conflict():
+    schema1 = read_reflection_schema(build_schema(tables=2))
+    schema2 = read_reflection_schema(build_schema(tables=3))
+
+    with pytest.raises(Exception, match='conflicting definitions'):
+        merge_schemas([schema1, schema2])
+
+
+def test_write_schema_json(tmpdir):
+    buf, path = _write_schema(tmpdir)
+    schema = read_reflection_schema_file(path)
+    schema['meta']['file_name'] = 'synth.bfbs'
+    schema['meta']['file_path'] = path
+
+    for compact, kwargs in [(False, {
+            'indent': 4,
+            'separators': (', ', ': ')
+    }), (True, {
+            'separators': (',', ':')
+    })]:
+        expected = json.dumps(schema, ensure_ascii=False, **kwargs)
+
+        f = io.StringIO()
+        write_schema_json(f, schema['meta'], schema['types'].values(),
+                          compact)
+        assert f.getvalue() == expected
+
+        f = io.StringIO()
+        cnt_defs = stream_reflection_schema_file(path, f, compact=compact)
+        assert cnt_defs == len(schema['types'])
+        assert f.getvalue() == expected
+
+    f = io.StringIO()
+    write_schema_json(f, {}, [])
+    assert f.getvalue() == json.dumps(
+        {
+            'meta': {},
+            'types': {}
+        }, indent=4, separators=(', ', ': '))
@@ -0,0 +1,75 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import json
+
+from cbsh.idl.loader import read_reflection_schema
+from cbsh.idl.model import SchemaModel, TableDef, read_schema_model
+from cbsh.idl.synthetic import build_schema
+
+
+def test_read_schema_model():
+    buf = build_schema(enums=2, tables=3, services=2)
+    schema = read_reflection_schema(buf)
+    model = read_schema_model(buf)
+
+    assert model.to_dict() == schema
+    # same key order, hence the same JSON output
+    assert json.dumps(model.to_dict()) == json.dumps(schema)
+    assert SchemaModel.from_dict(schema).to_dict() == schema
+
+    table = model.types['synth.Table000000']
+    assert isinstance(table, TableDef)
+    assert not table.is_struct
+    assert isinstance(table.docs, tuple)
+    assert table.fields['field_000004'].ref_type == 'synth.Table000001'
+    assert model.types['synth.Struct000000'].is_struct
+
+    # names are interned, and shared between definitions
+    assert table.fields['field_000000'].name is model.types[
+        'synth.Table000001'].fields['field_000000'].name
+
+
+def test_read_schema_model_defaults():
+    buf = build_schema(enums=2, tables=3, services=1, defaults=True)
+    schema = read_reflection_schema(buf)
+    model = read_schema_model(buf)
+
+    assert model.to_dict() == schema
+    assert json.dumps(model.to_dict()) == json.dumps(schema)
+    assert SchemaModel.from_dict(schema).to_dict() == schema
+
+    fields = model.types['synth.Table000000'].fields
+    assert fields['field_000000'].default == 1
+    assert fields['field_000002'].default == 3
+    assert fields['field_000001'].default is None
@@ -0,0 +1,145 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import pytest
+
+import flatbuffers
+
+from cbsh.idl.generator import BUILTIN_TEMPLATE_PATH, get_environment, plan_targets
+from cbsh.idl.npview import struct_dtype, struct_vector_fields
+
+
+def _field(name, offset, base_type, **kwargs):
+    field = {'name': name, 'id': 0, 'offset': offset, 'base_type': base_type}
+    field.update(kwargs)
+    return field
+
+
+# struct Vec3 { x: float; y: float; z: float; }
+# struct Sample { ts: uint64; pos: Vec3; flag: bool; }  (padded to 32 bytes)
+# table Series { name: string; samples: [Sample]; }
+TYPES = {
+    'test.Vec3': {
+        'type': 'struct', 'name': 'test.Vec3', 'docs': [],
+        'fields': {
+            'x': _field('x', 0, 'float'),
+            'y': _field('y', 4, 'float'),
+            'z': _field('z', 8, 'float'),
+        },
+        'minalign': 4, 'bytesize': 12,
+    },
+    'test.Sample': {
+        'type': 'struct', 'name': 'test.Sample', 'docs': [],
+        'fields': {
+            'ts': _field('ts', 0, 'uint64'),
+            'pos': _field('pos', 8, 'object', ref_category='struct', ref_type='test.Vec3'),
+            'flag': _field('flag', 20, 'bool'),
+        },
+        'minalign': 8, 'bytesize': 24,
+    },
+    'test.Series': {
+        'type': 'table', 'name': 'test.Series', 'docs': [],
+        'fields': {
+            'name': _field('name', 4, 'string'),
+            'samples': _field('samples', 6, 'vector', element_type='object',
+                              ref_category='struct', ref_type='test.Sample'),
+        },
+    },
+}
+
+
+def test_struct_dtype():
+    spec = struct_dtype(TYPES, 'test.Sample')
+    assert spec['names'] == ['ts', 'pos', 'flag']
+    assert spec['formats'][1] == struct_dtype(TYPES, 'test.Vec3')
+    assert spec['offsets'] == [0, 8, 20]
+    assert spec['itemsize'] == 24
+
+    assert struct_vector_fields(TYPES) == [
+        (TYPES['test.Series'], TYPES['test.Series']['fields']['samples'])]
+
+    with pytest.raises(Exception, match='not a struct'):
+        struct_dtype(TYPES, 'test.Series')
+
+
+def _build_series(samples):
+    builder = flatbuffers.Builder(0)
+    name = builder.CreateString('series')
+    builder.StartVector(24, len(samples), 8)
+    for ts, (x, y, z), flag in reversed(samples):
+        builder.Prep(8, 24)
+        builder.Pad(3)
+        builder.PrependBool(flag)
+        builder.PrependFloat32(z)
+        builder.PrependFloat32(y)
+        builder.PrependFloat32(x)
+        builder.PrependUint64(ts)
+    vec = builder.EndVector()
+    builder.StartObject(2)
+    builder.PrependUOffsetTRelativeSlot(0, name, 0)
+    builder.PrependUOffsetTRelativeSlot(1, vec, 0)
+    builder.Finish(builder.EndObject())
+    return builder.Output()
+
+
+def test_generated_npview():
+    np = pytest.importorskip('numpy')
+
+    schema = {'meta': {}, 'types': TYPES}
+    env = get_environment([BUILTIN_TEMPLATE_PATH], bytecode_cache=False)
+    assert plan_targets(schema, env, 'numpy.meta') == [
+        ('npview.py', 'npview.py.jinja2', None)]
+    source = env.get_template('npview.py.jinja2').render(schema=schema)
+
+    module = {}
+    exec(compile(source, 'npview.py', 'exec'), module)
+    assert module['test_Sample_dtype'].itemsize == 24
+
+    samples = [(i, (i + .5, -i, 2. * i), bool(i % 2)) for i in range(100)]
+    buf = bytearray(_build_series(samples))
+    view = module['test_Series_samples'](buf)
+
+    assert len(view) == 100
+    assert view['ts'].tolist() == list(range(100))
+    assert np.allclose(view['pos']['x'], [s[1][0] for s in samples])
+    assert view['flag'].tolist() == [s[2] for s in samples]
+
+    # a view, not a copy
+    view['ts'][3] = 42
+    assert module['test_Series_samples'](buf)['ts'][3] == 42
+
+    # an absent vector is empty
+    builder = flatbuffers.Builder(0)
+    builder.StartObject(2)
+    builder.Finish(builder.EndObject())
+    assert len(module['test_Series_samples'](builder.Output())) == 0
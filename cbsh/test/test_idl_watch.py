@@ -0,0 +1,161 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+
+import pytest
+
+from cbsh.idl.generator import BUILTIN_TEMPLATE_PATH
+from cbsh.idl.synthetic import build_schema
+from cbsh.idl.watch import (InotifyWatcher, PollingWatcher, IdlWatch,
+                            wait_debounced)
+
+
+def _check_watcher(watcher, tmpdir):
+    tmpdir.join('a.fbs').write('table A {}')
+    tmpdir.mkdir('sub').join('b.fbs').write('table B {}')
+    changed = wait_debounced(watcher, debounce=0.2, timeout=5)
+    assert str(tmpdir.join('a.fbs')) in changed
+
+    tmpdir.join('sub', 'b.fbs').write('table B { x: int; }')
+    changed = wait_debounced(watcher, debounce=0.2, timeout=5)
+    assert changed == {str(tmpdir.join('sub', 'b.fbs'))}
+
+    assert wait_debounced(watcher, timeout=0.1) == set()
+    watcher.close()
+
+
+def test_polling_watcher(tmpdir):
+    _check_watcher(PollingWatcher([str(tmpdir)], interval=0.05), tmpdir)
+
+
+def test_inotify_watcher(tmpdir):
+    try:
+        watcher = InotifyWatcher([str(tmpdir)])
+    except OSError:
+        pytest.skip('inotify not available')
+    _check_watcher(watcher, tmpdir)
+
+
+def test_idl_watch_rebuild(tmpdir):
+    schemas = tmpdir.mkdir('schemas')
+    schemas.join('api.bfbs').write_binary(bytes(build_schema(services=2)))
+    schemas.join('other.bfbs').write_binary(
+        bytes(build_schema(services=0, namespace='other')))
+
+    templates = tmpdir.mkdir('templates')
+    templates.join('main.meta').write(
+        '{% for name, t in schema.types.items() if t.type == "interface" %}'
+        'api/{{ name }}.txt interface.txt {{ name }}\n'
+        '{% endfor %}')
+    templates.join('interface.txt').write('{{ type.slots|length }}')
+
+    outdir = str(tmpdir.join('out'))
+    watch = IdlWatch(
+        str(schemas),
+        template_paths=[str(templates)],
+        outdir=outdir,
+        max_workers=1,
+        bytecode_cache=False,
+        use_cache=False)
+
+    assert len(watch.rebuild()) == 2
+
+    # only the changed schema file is loaded again
+    loaded = []
+    load = watch._load
+    watch._load = lambda path: loaded.append(path) or load(path)
+
+    schemas.join('api.bfbs').write_binary(
+        bytes(build_schema(services=3, slots=2)))
+    paths = watch.rebuild({str(schemas.join('api.bfbs'))})
+    assert loaded == [str(schemas.join('api.bfbs'))]
+    assert len(paths) == 3
+    with open(os.path.join(outdir, 'api', 'synth.Service000002.txt')) as f:
+        assert f.read() == '2'
+
+    assert watch.rebuild({str(templates.join('main.meta'))}) == []
+
+
+def test_idl_watch_fbs(tmpdir):
+    schemas = tmpdir.mkdir('schemas')
+    schemas.join('common.fbs').write(
+        'attribute "type";\nnamespace common;\ntable Void {}\n')
+    schemas.join('api.fbs').write(
+        'include "common.fbs";\nnamespace api;\n'
+        'rpc_service Api (type: "interface") {\n'
+        '  ping (common.Void): common.Void (type: "procedure");\n}\n')
+
+    templates = tmpdir.mkdir('templates')
+    templates.join('main.meta').write('types.txt types.txt\n')
+    templates.join('types.txt').write(
+        '{{ schema.types.keys()|sort|join(",") }}')
+
+    outdir = str(tmpdir.join('out'))
+    watch = IdlWatch(
+        str(schemas),
+        template_paths=[str(templates)],
+        outdir=outdir,
+        max_workers=1,
+        bytecode_cache=False,
+        use_cache=False)
+    watch.rebuild()
+    assert watch._fbs.parsed == 2
+
+    # the includer is loaded again, but only the changed file is parsed
+    schemas.join('common.fbs').write(
+        'attribute "type";\nnamespace common;\ntable Void {}\ntable X {}\n')
+    assert watch.rebuild({str(schemas.join('common.fbs'))})
+    assert watch._fbs.parsed == 3
+    with open(os.path.join(outdir, 'types.txt')) as f:
+        assert f.read() == 'api.Api,common.Void,common.X'
+
+
+def test_idl_watch_default_templates(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    schemas = tmpdir.mkdir('schemas')
+
+    # without template folders, the default template folders are watched
+    # (as far as they exist), as these are the ones generated from
+    watch = IdlWatch(str(schemas), use_cache=False)
+    assert watch._watched() == [str(schemas), BUILTIN_TEMPLATE_PATH]
+
+    templates = tmpdir.mkdir('templates')
+    watch = IdlWatch(str(schemas), use_cache=False)
+    assert watch._watched() == [
+        str(schemas), str(templates), BUILTIN_TEMPLATE_PATH
+    ]
+
+    watch = IdlWatch(
+        str(schemas), template_paths=[str(templates)], use_cache=False)
+    assert watch._watched() == [str(schemas), str(templates)]
@@ -0,0 +1,316 @@
+#####################################################################################
+#
+#  Copyright (c) Crossbar.io Technologies GmbH
+#
+#  Unless a separate license agreement exists between you and Crossbar.io GmbH (e.g.
+#  you have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import asyncio
+
+import txaio
+txaio.use_asyncio()
+
+from autobahn.wamp.exception import ApplicationError  # noqa: E402
+
+from cbsh import command  # noqa: E402
+from cbsh.mirror import FabricMirror, TopologySnapshot  # noqa: E402
+
+
+class FakeFabricSession(object):
+    """
+    Fabric of nodes with a router and a container worker each.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.calls = 0
+        self.handlers = {}
+
+    async def subscribe(self, handler, topic):
+        self.handlers[topic] = handler
+
+    def publish(self, topic, *args):
+        self.handlers[topic](*args)
+
+    async def call(self, procedure, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if procedure == u'crossbarfabriccenter.mrealm.get_nodes':
+            return self.nodes
+        elif procedure == u'crossbarfabriccenter.list_workers':
+            return [u'container1', u'router1']
+        elif procedure == u'crossbarfabriccenter.show_worker':
+            return {u'type': args[1][:-1]}
+        elif procedure == u'crossbarfabriccenter.list_components':
+            return [u'{}-c1'.format(args[1])]
+        elif procedure == u'crossbarfabriccenter.list_transports':
+            return [u't1', u't2']
+        elif procedure == u'crossbarfabriccenter.list_realms':
+            return [u'realm1']
+        raise ApplicationError(u'wamp.error.no_such_procedure')
+
+
+def test_fabric_mirror():
+    session = FakeFabricSession([u'node1', u'node2'])
+    mirror = FabricMirror()
+
+    assert mirror.run(command.CmdListNodes()) is None
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(mirror.attach(session))
+    loop.close()
+    assert mirror.synced
+
+    # every call is made once: 1 get_nodes, 2 list_workers, 4 show_worker,
+    # 4 list_components, 2 list_transports and 2 list_realms
+    assert session.calls == 15
+
+    calls = session.calls
+    assert mirror.run(command.CmdListNodes()).result == [u'node1', u'node2']
+    assert mirror.run(command.CmdListWorkers(u'node1')).result == [
+        u'container1', u'router1'
+    ]
+    assert mirror.run(command.CmdShowWorker(u'node2', u'router1')).result == {
+        u'type': u'router'
+    }
+    assert mirror.run(command.CmdListTransports(u'node1', u'router1')).result == [
+        u't1', u't2'
+    ]
+    assert mirror.run(command.CmdListAllComponents()).result == [{
+        u'node': node,
+        u'worker': worker,
+        u'component': u'{}-c1'.format(worker)
+    } for node in [u'node1', u'node2'] for worker in [u'container1', u'router1']]
+    assert session.calls == calls
+
+    # not in the mirror: run remotely
+    assert mirror.run(command.CmdListWorkers(u'node3')) is None
+    assert mirror.run(command.CmdShowNode(u'node1')) is None
+
+    assert mirror.complete(u'node', {}) == [u'node1', u'node2']
+    assert mirror.complete(u'worker', {u'node': u'node1'}) == [
+        u'container1', u'router1'
+    ]
+    assert mirror.complete(u'realm', {
+        u'node': u'node1',
+        u'worker': u'router1'
+    }) == [u'realm1']
+
+
+def test_fabric_mirror_events():
+    session = FakeFabricSession([u'node1'])
+    mirror = FabricMirror()
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(mirror.attach(session))
+    version = mirror.version
+
+    session.publish(u'crossbarfabriccenter.node.on_worker_started', u'node1',
+                    u'router2', {u'type': u'router'})
+    session.publish(u'crossbarfabriccenter.worker.on_realm_started', u'node1',
+                    u'router2', u'realm2')
+    session.publish(u'crossbarfabriccenter.worker.on_transport_stopped',
+                    u'node1', u'router1', u't1')
+    session.publish(u'crossbarfabriccenter.mrealm.on_node_online', u'node2')
+    assert mirror.version == version + 4
+
+    assert mirror.complete(u'worker', {u'node': u'node1'}) == [
+        u'container1', u'router1', u'router2'
+    ]
+    assert mirror.complete(u'realm', {u'node': u'node1', u'worker': u'router2'}) == [u'realm2']
+    assert mirror.complete(u'transport', {u'node': u'node1', u'worker': u'router1'}) == [u't2']
+    assert mirror.run(command.CmdListNodes()).result == [u'node1', u'node2']
+
+    session.publish(u'crossbarfabriccenter.mrealm.on_node_offline', u'node1')
+    assert mirror.run(command.CmdListWorkers(u'node1')).result == []
+
+    # a new session (eg on reconnect) seeds the mirror again
+    mirror.detach()
+    assert mirror.run(command.CmdListNodes()) is None
+    session = FakeFabricSession([u'node1', u'node3'])
+    loop.run_until_complete(mirror.attach(session))
+    loop.close()
+    assert mirror.run(command.CmdListNodes()).result == [u'node1', u'node3']
+    assert mirror.complete(u'worker', {u'node': u'node1'}) == [
+        u'container1', u'router1'
+    ]
+
+
+def test_fabric_mirror_stale():
+    async def main():
+        session = FakeFabricSession([u'node1', u'node2'])
+        mirror = FabricMirror()
+        await mirror.attach(session)
+
+        # a worker without details is fetched again (run remotely until then)
+        session.publish(u'crossbarfabriccenter.node.on_worker_started',
+                        u'node1', u'router2')
+        assert mirror.run(command.CmdShowWorker(u'node1', u'router2')) is None
+        assert mirror.run(command.CmdListWorkers(u'node1')) is None
+        assert mirror.run(command.CmdListAllWorkers()) is None
+        assert mirror.run(command.CmdListWorkers(u'node2')) is not None
+        assert mirror.complete(u'worker', {u'node': u'node1'}) == [
+            u'container1', u'router1', u'router2'
+        ]
+
+        # only the stale node is fetched again: 1 list_workers, 2 show_worker,
+        # 2 list_components, 1 list_transports and 1 list_realms
+        calls = session.calls
+        await mirror._refreshing
+        assert session.calls == calls + 7
+        assert mirror.run(command.CmdListWorkers(u'node1')).result == [
+            u'container1', u'router1'
+        ]
+        assert mirror.run(command.CmdListAllWorkers()) is not None
+
+        # commands changing a node make it stale until fetched again
+        version = mirror.version
+        session.nodes.append(u'node3')
+        for procedure, args in command.CmdStartWorker(
+                u'node2', u'router2', u'router').invalidates():
+            mirror.invalidate(procedure, args)
+        assert mirror.run(command.CmdListTransports(u'node2', u'router1')) is None
+        assert mirror.run(command.CmdListNodes()) is not None
+        await mirror._refreshing
+        assert mirror.run(command.CmdListTransports(u'node2', u'router1')) is not None
+        assert mirror.version == version
+
+        # commands changing the set of nodes fetch all nodes again
+        for procedure, args in command.CmdPairNode(
+                u'realm1', u'pubkey', u'node3').invalidates():
+            mirror.invalidate(procedure, args)
+        assert mirror.run(command.CmdListNodes()) is None
+        await mirror._refreshing
+        assert mirror.run(command.CmdListNodes()).result == [
+            u'node1', u'node2', u'node3'
+        ]
+        assert mirror.version == version + 1
+
+        # nodes (and the set of nodes) older than max_age are fetched again
+        mirror._fetched[u'node1'] -= 2 * FabricMirror.MAX_AGE
+        assert mirror.run(command.CmdListWorkers(u'node1')) is None
+        assert mirror.run(command.CmdListWorkers(u'node2')) is not None
+        calls = session.calls
+        await mirror._refreshing
+        assert session.calls == calls + 7
+        assert mirror.run(command.CmdListWorkers(u'node1')) is not None
+
+        mirror._listed -= 2 * FabricMirror.MAX_AGE
+        assert mirror.run(command.CmdListNodes()) is None
+        await mirror._refreshing
+        assert mirror.run(command.CmdListNodes()) is not None
+
+        # nodes learned from events only are fetched first
+        session.publish(u'crossbarfabriccenter.mrealm.on_node_online', u'node4')
+        assert mirror.run(command.CmdListWorkers(u'node4')) is None
+        assert mirror.run(command.CmdListNodes()) is not None
+        await mirror._refreshing
+        assert mirror.run(command.CmdListWorkers(u'node4')) is not None
+
+        # nodes the seeding calls failed on are run remotely
+        class FailingSession(FakeFabricSession):
+            async def call(self, procedure, *args, **kwargs):
+                if args and args[0] == u'node2':
+                    raise ApplicationError(u'crossbar.error.no_such_object')
+                return await FakeFabricSession.call(self, procedure, *args, **kwargs)
+
+        mirror = FabricMirror()
+        await mirror.attach(FailingSession([u'node1', u'node2']))
+        assert mirror.run(command.CmdListWorkers(u'node1')) is not None
+        assert mirror.run(command.CmdListWorkers(u'node2')) is None
+        assert mirror.run(command.CmdListAllWorkers()) is None
+
+        # fetched again, and failing again
+        await mirror._refreshing
+        assert mirror.run(command.CmdListWorkers(u'node2')) is None
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main())
+    loop.close()
+
+
+def test_topology_snapshot(tmpdir):
+    snapshot = TopologySnapshot(u'default', u'mrealm/1', str(tmpdir))
+    assert snapshot.load() is None
+    assert os.path.basename(snapshot.path) == u'default@mrealm_1.snapshot'
+
+    session = FakeFabricSession([u'node1', u'node2'])
+    mirror = FabricMirror(snapshot=snapshot)
+    assert not mirror.restored
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(mirror.attach(session))
+    assert snapshot.load() == mirror.marshal()
+
+    # a new mirror is usable right away, before any session
+    restored = FabricMirror(snapshot=snapshot)
+    assert restored.restored and not restored.synced
+    assert restored.version == mirror.version
+    assert restored.run(command.CmdListNodes()).result == [u'node1', u'node2']
+    assert restored.run(command.CmdListRealms(u'node1', u'router1')).result == [
+        u'realm1'
+    ]
+    assert restored.complete(u'worker', {u'node': u'node2'}) == [
+        u'container1', u'router1'
+    ]
+
+    # snapshots older than max_age only complete arguments
+    aged = TopologySnapshot(u'aged', u'mrealm/1', str(tmpdir))
+    obj = snapshot.load()
+    obj[u'listed'] -= 2 * FabricMirror.MAX_AGE
+    obj[u'fetched'] = {
+        node_id: fetched - 2 * FabricMirror.MAX_AGE
+        for node_id, fetched in obj[u'fetched'].items()
+    }
+    aged.save(obj)
+    old = FabricMirror(snapshot=aged)
+    assert old.restored
+    assert old.run(command.CmdListNodes()) is None
+    assert old.run(command.CmdListRealms(u'node1', u'router1')) is None
+    assert old.complete(u'worker', {u'node': u'node2'}) == [
+        u'container1', u'router1'
+    ]
+
+    # reconciled with the fabric once attached: only changes bump the version
+    version = restored.version
+    assert loop.run_until_complete(restored.sync(session)) == 0
+    assert restored.version == version
+
+    session = FakeFabricSession([u'node1', u'node3'])
+    loop.run_until_complete(restored.attach(session))
+    loop.close()
+    assert restored.synced and not restored.restored
+    assert restored.version == version + 1
+    assert restored.run(command.CmdListNodes()).result == [u'node1', u'node3']
+    assert snapshot.load()[u'version'] == restored.version
+
+    # snapshots of another format are ignored
+    with open(snapshot.path, 'wb') as f:
+        f.write(b'garbage')
+    assert snapshot.load() is None
+    assert not FabricMirror(snapshot=snapshot).restored
@@ -73,6 +73,7 @@ setup(
     # packages=find_packages(),
     packages=[
         'cbsh',
+        'cbsh.idl',
     ],
     include_package_data=True,
     data_files=[